@@ -0,0 +1,169 @@
+"""Métricas do funil a partir dos leads, lendo os arquivos em streaming.
+
+Memória constante: as linhas são lidas uma a uma e só os agregados ficam
+guardados. Aceita o CSV atual e segmentos comprimidos (.gz, .zst); sem
+arquivos, lê os segmentos do manifest de data/leads.csv e o arquivo atual.
+
+    python analise_leads.py [arquivos...] [--processos 4] [--saida metricas.json]
+
+Com --processos > 1, cada arquivo sem compressão é dividido em pedaços por
+faixa de bytes e os pedaços (e os segmentos comprimidos) são processados em
+paralelo; os agregados parciais são somados no final.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from leads import LEADS_CAMPOS, abrir_texto, segmentos_leads
+from nutricao import calcular_imc
+
+TAMANHO_PEDACO = 64 * 1024 * 1024
+
+_I_TIMESTAMP = LEADS_CAMPOS.index('timestamp')
+_I_OBJETIVO = LEADS_CAMPOS.index('objetivo')
+_I_ATIVIDADE = LEADS_CAMPOS.index('atividade')
+_I_PESO = LEADS_CAMPOS.index('peso')
+_I_ALTURA = LEADS_CAMPOS.index('altura')
+
+
+def novos_agregados() -> dict:
+    return {
+        "total": 0,
+        "invalidos": 0,
+        "por_objetivo": Counter(),
+        "por_atividade": Counter(),
+        "imc_categorias": Counter(),
+        "imc_histograma": Counter(),
+        "imc_soma": 0.0,
+        "imc_contagem": 0,
+        "hora_do_dia": Counter(),
+        "por_hora": Counter(),
+    }
+
+
+def acumular(agregados: dict, linha: list):
+    if len(linha) != len(LEADS_CAMPOS) or linha == LEADS_CAMPOS:
+        if linha != LEADS_CAMPOS:
+            agregados["invalidos"] += 1
+        return
+    agregados["total"] += 1
+    agregados["por_objetivo"][linha[_I_OBJETIVO] or '-'] += 1
+    agregados["por_atividade"][linha[_I_ATIVIDADE] or '-'] += 1
+
+    try:
+        instante = datetime.datetime.fromisoformat(linha[_I_TIMESTAMP])
+        agregados["hora_do_dia"][instante.hour] += 1
+        agregados["por_hora"][instante.strftime('%Y-%m-%dT%H')] += 1
+    except ValueError:
+        pass
+
+    try:
+        imc = calcular_imc(float(linha[_I_PESO]), float(linha[_I_ALTURA]))
+    except (ValueError, ZeroDivisionError):
+        return
+    agregados["imc_categorias"][imc["categoria"]] += 1
+    agregados["imc_histograma"][int(imc["valor"] // 5 * 5)] += 1
+    agregados["imc_soma"] += imc["valor"]
+    agregados["imc_contagem"] += 1
+
+
+def somar(destino: dict, parcial: dict) -> dict:
+    for chave, valor in parcial.items():
+        destino[chave] += valor  # Counter + Counter, int + int, float + float
+    return destino
+
+
+def _linhas_do_pedaco(f, inicio: int, fim: int):
+    # Cada linha pertence ao pedaço em que ela começa: pula o resto da linha
+    # que atravessa `inicio` e lê até a linha que atravessa `fim`
+    if inicio > 0:
+        f.seek(inicio - 1)
+        f.readline()
+    while f.tell() < fim:
+        linha = f.readline()
+        if not linha:
+            break
+        yield linha.decode('utf-8', errors='replace')
+
+
+def processar_pedaco(path: str, inicio: int = 0, fim: int = None) -> dict:
+    """Agrega um arquivo inteiro (fim=None) ou um pedaço de um CSV sem compressão."""
+    agregados = novos_agregados()
+    if fim is None:
+        with abrir_texto(path) as f:
+            for linha in csv.reader(f):
+                acumular(agregados, linha)
+        return agregados
+    with open(path, 'rb') as f:
+        for linha in csv.reader(_linhas_do_pedaco(f, inicio, fim)):
+            acumular(agregados, linha)
+    return agregados
+
+
+def dividir(paths, tamanho_pedaco: int = TAMANHO_PEDACO) -> list:
+    """Unidades de trabalho (path, inicio, fim); comprimidos vão inteiros."""
+    tarefas = []
+    for path in paths:
+        if path.endswith(('.gz', '.zst')):
+            tarefas.append((path, 0, None))
+            continue
+        tamanho = os.path.getsize(path)
+        for inicio in range(0, max(tamanho, 1), tamanho_pedaco):
+            tarefas.append((path, inicio, min(inicio + tamanho_pedaco, tamanho)))
+    return tarefas
+
+
+def analisar(paths, processos: int = 1, tamanho_pedaco: int = TAMANHO_PEDACO) -> dict:
+    total = novos_agregados()
+    if processos <= 1:
+        for path in paths:
+            somar(total, processar_pedaco(path))
+    else:
+        tarefas = dividir(paths, tamanho_pedaco)
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            for parcial in pool.map(processar_pedaco, *zip(*tarefas)):
+                somar(total, parcial)
+    return relatorio(total)
+
+
+def relatorio(agregados: dict) -> dict:
+    contagem = agregados["imc_contagem"]
+    return {
+        "total": agregados["total"],
+        "invalidos": agregados["invalidos"],
+        "por_objetivo": dict(agregados["por_objetivo"].most_common()),
+        "por_atividade": dict(agregados["por_atividade"].most_common()),
+        "imc": {
+            "media": round(agregados["imc_soma"] / contagem, 1) if contagem else None,
+            "categorias": dict(agregados["imc_categorias"].most_common()),
+            "histograma": {f"{faixa}-{faixa + 5}": n for faixa, n in sorted(agregados["imc_histograma"].items())},
+        },
+        "hora_do_dia": {f"{h:02d}": agregados["hora_do_dia"][h] for h in range(24)},
+        "por_hora": dict(sorted(agregados["por_hora"].items())),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Métricas do funil a partir dos leads.")
+    parser.add_argument('arquivos', nargs='*')
+    parser.add_argument('--leads', default='data/leads.csv', help="CSV cujos segmentos são lidos quando nenhum arquivo é passado")
+    parser.add_argument('--processos', type=int, default=1)
+    parser.add_argument('--saida', default='-', help="arquivo JSON (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    resultado = analisar(args.arquivos or segmentos_leads(args.leads), args.processos)
+    if args.saida == '-':
+        json.dump(resultado, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
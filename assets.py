@@ -0,0 +1,100 @@
+"""Build dos assets estáticos (CSS/JS) das páginas.
+
+Os fontes ficam em static/src. Cada arquivo é minificado e recebe no nome um
+hash do conteúdo (index.css -> index.3f2a9c1e04b7.css), então pode ser
+cacheado para sempre: qualquer mudança gera outra URL.
+
+A aplicação monta os bundles em memória ao iniciar. Para servir pelo proxy/CDN,
+gere os arquivos (com variantes .gz/.br e um manifest.json) com:
+
+    python assets.py [destino]      # padrão: static/dist
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import NamedTuple
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele só as variantes .gz são geradas
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BASE_DIR, 'static', 'src')
+DIST_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+
+MIMETYPES = {'.css': 'text/css', '.js': 'text/javascript'}
+
+
+class Bundle(NamedTuple):
+    nome: str       # nome lógico usado nos templates, ex.: index.css
+    arquivo: str    # nome com hash, ex.: index.3f2a9c1e04b7.css
+    conteudo: bytes
+    mimetype: str
+
+
+def minificar_css(texto: str) -> str:
+    texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.S)
+    texto = re.sub(r'\s+', ' ', texto)
+    texto = re.sub(r'\s*([{};,>])\s*', r'\1', texto)
+    texto = re.sub(r':\s+', ':', texto)
+    return texto.replace(';}', '}').strip()
+
+
+def minificar_js(texto: str) -> str:
+    # Conservador de propósito: sem parser, só remove indentação, linhas vazias
+    # e comentários de linha inteira. As quebras de linha ficam (ASI).
+    linhas = (linha.strip() for linha in texto.splitlines())
+    return '\n'.join(l for l in linhas if l and not l.startswith('//')) + '\n'
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+def construir(src_dir: str = SRC_DIR) -> dict:
+    """Minifica e versiona os fontes; devolve {nome lógico: Bundle}."""
+    bundles = {}
+    for nome in sorted(os.listdir(src_dir)):
+        base, ext = os.path.splitext(nome)
+        minificar = MINIFICADORES.get(ext)
+        if minificar is None:
+            continue
+        with open(os.path.join(src_dir, nome), 'r', encoding='utf-8') as f:
+            conteudo = minificar(f.read()).encode('utf-8')
+        digest = hashlib.sha256(conteudo).hexdigest()[:12]
+        bundles[nome] = Bundle(nome, f"{base}.{digest}{ext}", conteudo, MIMETYPES[ext])
+    return bundles
+
+
+def escrever(bundles: dict, destino: str = DIST_DIR) -> str:
+    """Grava os bundles, as variantes comprimidas e o manifest.json."""
+    os.makedirs(destino, exist_ok=True)
+    for bundle in bundles.values():
+        caminho = os.path.join(destino, bundle.arquivo)
+        with open(caminho, 'wb') as f:
+            f.write(bundle.conteudo)
+        with open(caminho + '.gz', 'wb') as f:
+            f.write(gzip.compress(bundle.conteudo, 9, mtime=0))
+        if brotli is not None:
+            with open(caminho + '.br', 'wb') as f:
+                f.write(brotli.compress(bundle.conteudo))
+    manifest = os.path.join(destino, 'manifest.json')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        json.dump({b.nome: b.arquivo for b in bundles.values()}, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    destino = argv[0] if argv else DIST_DIR
+    bundles = construir()
+    escrever(bundles, destino)
+    for bundle in bundles.values():
+        print(f"{bundle.nome} -> {bundle.arquivo} ({len(bundle.conteudo)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
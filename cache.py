@@ -0,0 +1,250 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Entradas do ByteCache em disco: <sha256 hex> e as gravações em andamento
+# <sha256 hex>.<pid>.<thread>.tmp, dentro do shard <2 primeiros caracteres>
+_ENTRADA_RE = re.compile(r'^([0-9a-f]{64})(\.\d+\.\d+\.tmp)?$')
+_SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+
+
+class LRUCache:
+    """Cache LRU thread-safe com contadores de acertos e falhas.
+
+    `maxsize` é o número máximo de entradas; ao passar dele, a entrada usada há
+    mais tempo é descartada. `maxsize=0` desliga o cache.
+    """
+
+    _AUSENTE = object()
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            valor = self._dados.get(chave, self._AUSENTE)
+            if valor is self._AUSENTE:
+                self.misses += 1
+                return padrao
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def set(self, chave, valor):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._dados)
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "tamanho": len(self._dados), "maximo": self.maxsize}
+
+
+class ByteCache:
+    """Cache de blobs (bytes) em dois níveis: memória e, opcionalmente, disco.
+
+    Na memória é LRU limitado pelo total de bytes (`max_bytes`). No disco cada
+    entrada vira um arquivo em diretorio/<2 primeiros caracteres>/<chave>, que
+    sobrevive a reinícios e é compartilhado entre processos. As chaves devem
+    ser hashes hexadecimais.
+
+    O disco é limitado por limpar_disco() (ou pela thread de iniciar_limpeza):
+    saem as entradas sem uso há mais de `max_idade` segundos e, se o total
+    ainda passar de `max_bytes_disco`, as usadas há mais tempo. 0 desliga o
+    respectivo limite. A limpeza só reconhece chaves SHA-256 (64 caracteres
+    hex) e não toca em mais nada do diretório.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, diretorio: str = None,
+                 max_bytes_disco: int = 0, max_idade: float = 0):
+        self.max_bytes = max_bytes
+        self.diretorio = diretorio
+        self.max_bytes_disco = max_bytes_disco
+        self.max_idade = max_idade
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self._bytes = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self._limpeza = None
+        self._parar = threading.Event()
+
+    def caminho(self, chave: str) -> str:
+        """Onde a entrada fica (ou ficaria) no disco; exige `diretorio`."""
+        return os.path.join(self.diretorio, chave[:2], chave)
+
+    def get(self, chave: str, disco: bool = True):
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is not None:
+                self._dados.move_to_end(chave)
+                self.hits += 1
+                return valor
+        if disco and self.diretorio:
+            try:
+                with open(self.caminho(chave), 'rb') as f:
+                    valor = f.read()
+            except OSError:
+                valor = None
+            if valor is not None:
+                self._tocar(chave)
+                self._guardar(chave, valor)
+                with self._lock:
+                    self.hits_disco += 1
+                return valor
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def arquivo(self, chave: str):
+        """Caminho da entrada no disco, sem carregá-la na memória; None se não houver."""
+        caminho = self.caminho(chave) if self.diretorio else None
+        if caminho is not None and self._tocar(chave):
+            with self._lock:
+                self.hits_disco += 1
+            return caminho
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def buscar(self, chave: str):
+        """Os bytes, se estiverem na memória, senão o caminho no disco; None se não houver."""
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is not None:
+                self._dados.move_to_end(chave)
+                self.hits += 1
+                return valor
+        return self.arquivo(chave)
+
+    def _tocar(self, chave: str) -> bool:
+        # O mtime marca o último uso: é por ele que limpar_disco() escolhe
+        try:
+            os.utime(self.caminho(chave))
+            return True
+        except OSError:
+            return False
+
+    def set(self, chave: str, valor: bytes):
+        self._guardar(chave, valor)
+        if self.diretorio:
+            caminho = self.caminho(chave)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, 'wb') as f:
+                f.write(valor)
+            os.replace(temporario, caminho)
+
+    def limpar_disco(self) -> int:
+        """Aplica `max_idade` e `max_bytes_disco` ao disco; retorna quantos arquivos saíram."""
+        if not self.diretorio or not (self.max_idade or self.max_bytes_disco):
+            return 0
+        agora = time.time()
+        entradas, removidos = [], 0
+        try:
+            shards = [e.name for e in os.scandir(self.diretorio)
+                      if _SHARD_RE.match(e.name) and e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return 0
+        for shard in shards:
+            for nome in os.listdir(os.path.join(self.diretorio, shard)):
+                m = _ENTRADA_RE.match(nome)
+                if m is None or not m.group(1).startswith(shard):
+                    continue
+                caminho = os.path.join(self.diretorio, shard, nome)
+                try:
+                    st = os.stat(caminho, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                # .tmp é uma gravação em andamento; só sai se ficou órfão
+                if m.group(2):
+                    vencido = st.st_mtime < agora - 3600
+                else:
+                    vencido = bool(self.max_idade) and st.st_mtime < agora - self.max_idade
+                if vencido:
+                    removidos += self._remover(caminho)
+                elif not m.group(2):
+                    entradas.append((st.st_mtime, st.st_size, caminho))
+        if self.max_bytes_disco:
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            for _, tamanho, caminho in sorted(entradas):
+                if total <= self.max_bytes_disco:
+                    break
+                removidos += self._remover(caminho)
+                total -= tamanho
+        return removidos
+
+    @staticmethod
+    def _remover(caminho: str) -> int:
+        try:
+            os.remove(caminho)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def iniciar_limpeza(self, intervalo: float = 600) -> threading.Thread:
+        """Thread daemon que chama limpar_disco periodicamente, uma por processo."""
+        with self._lock:
+            if self._limpeza is not None and self._limpeza[0] == os.getpid():
+                return self._limpeza[1]
+            thread = threading.Thread(target=self._loop_limpeza, args=(intervalo,), name='pdf-cache-sweeper', daemon=True)
+            thread.start()
+            self._limpeza = (os.getpid(), thread)
+            return thread
+
+    def _loop_limpeza(self, intervalo):
+        while not self._parar.wait(intervalo):
+            try:
+                self.limpar_disco()
+            except Exception:
+                pass
+
+    def parar_limpeza(self):
+        self._parar.set()
+
+    def _guardar(self, chave: str, valor: bytes):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._dados.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._dados[chave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes:
+                _, removido = self._dados.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def clear(self):
+        """Esvazia a memória e zera os contadores; o disco é mantido."""
+        with self._lock:
+            self._dados.clear()
+            self._bytes = 0
+            self.hits = self.hits_disco = self.misses = 0
+
+    def __len__(self):
+        return len(self._dados)
+
+    def info(self) -> dict:
+        return {
+            "hits": self.hits, "hits_disco": self.hits_disco, "misses": self.misses,
+            "tamanho": len(self._dados), "bytes": self._bytes, "maximo_bytes": self.max_bytes,
+        }
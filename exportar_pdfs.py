@@ -0,0 +1,163 @@
+"""Exporta os PDFs de vários usuários num único ZIP, gerado em streaming.
+
+Os PDFs são renderizados num pool de processos e entram no ZIP na ordem dos
+ids, um de cada vez: a memória usada não cresce com o tamanho do lote. Sessões
+inexistentes ou PDFs que falharem não interrompem a exportação; vão para o
+erros.json dentro do ZIP.
+
+    python exportar_pdfs.py ids.txt campanha.zip [--processos 4] [--cache DIR]
+
+ids.txt tem um session_id por linha, ou é um CSV com a coluna session_id. Os
+PDFs renderizados ficam no cache em disco (padrão: <saida>.cache): se a
+exportação cair no meio, rodar o mesmo comando de novo só renderiza o que
+faltou e remonta o ZIP.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from cache import ByteCache
+
+
+def ler_ids(linhas) -> list:
+    """Ids de um arquivo texto (um por linha) ou CSV com a coluna session_id."""
+    linhas = [linha.strip() for linha in linhas if linha.strip()]
+    if linhas and 'session_id' in next(csv.reader([linhas[0]])):
+        return [linha['session_id'] for linha in csv.DictReader(linhas) if linha.get('session_id')]
+    return linhas
+
+
+class _Saida:
+    """Destino sem seek para o ZipFile: acumula os bytes até serem drenados."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def drenar(self) -> bytes:
+        dados, self._partes = b''.join(self._partes), []
+        return dados
+
+
+def _concluido(resultado=None, erro: Exception = None) -> Future:
+    futuro = Future()
+    if erro is not None:
+        futuro.set_exception(erro)
+    else:
+        futuro.set_result(resultado)
+    return futuro
+
+
+def renderizar(ids, carregar, processos: int = 2, cache: ByteCache = None):
+    """Gera (session_id, pdf, erro) na ordem de `ids`.
+
+    `carregar(session_id)` devolve os dados do PDF ({chave, plano, respostas,
+    metas}) ou None. No máximo 2 * `processos` PDFs ficam em andamento.
+    """
+    import pdf_plano
+
+    def enviar(pool, session_id):
+        try:
+            dados = carregar(session_id)
+        except Exception as e:
+            return None, _concluido(erro=e)
+        if dados is None:
+            return None, _concluido(erro=LookupError("sessão não encontrada"))
+        pdf = cache.get(dados['chave']) if cache is not None else None
+        if pdf is not None:
+            return None, _concluido((pdf, 0.0))
+        return dados['chave'], pool.submit(pdf_plano.renderizar, dados['plano'], dados['respostas'], dados['metas'])
+
+    def receber(session_id, chave, futuro):
+        try:
+            pdf, _ = futuro.result()
+        except Exception as e:
+            return session_id, None, str(e) or type(e).__name__
+        if chave is not None and cache is not None:
+            cache.set(chave, pdf)
+        return session_id, pdf, None
+
+    janela = deque()
+    with ProcessPoolExecutor(max(processos, 1)) as pool:
+        for session_id in ids:
+            janela.append((session_id, *enviar(pool, session_id)))
+            if len(janela) >= 2 * max(processos, 1):
+                yield receber(*janela.popleft())
+        while janela:
+            yield receber(*janela.popleft())
+
+
+def gerar_zip(ids, carregar, processos: int = 2, cache: ByteCache = None, progresso=None):
+    """Pedaços (bytes) do ZIP com um <session_id>.pdf por id.
+
+    `progresso(feitos, total, session_id, erro)` é chamado a cada PDF.
+    """
+    ids = list(dict.fromkeys(ids))
+    saida = _Saida()
+    erros = {}
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for feitos, (session_id, pdf, erro) in enumerate(renderizar(ids, carregar, processos, cache), 1):
+            if erro is None:
+                zf.writestr(f'{session_id}.pdf', pdf)
+            else:
+                erros[session_id] = erro
+            if progresso is not None:
+                progresso(feitos, len(ids), session_id, erro)
+            pedaco = saida.drenar()
+            if pedaco:
+                yield pedaco
+        if erros:
+            zf.writestr('erros.json', json.dumps(erros, ensure_ascii=False, indent=2))
+    yield saida.drenar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta os PDFs de vários usuários num ZIP.")
+    parser.add_argument('ids', help="arquivo com um session_id por linha, ou CSV com a coluna session_id ('-' = stdin)")
+    parser.add_argument('saida', help="arquivo .zip")
+    parser.add_argument('--processos', type=int, default=2)
+    parser.add_argument('--cache', default=None, help="diretório dos PDFs já renderizados (padrão: <saida>.cache)")
+    args = parser.parse_args(argv)
+
+    if args.ids == '-':
+        ids = ler_ids(sys.stdin)
+    else:
+        with open(args.ids, 'r', encoding='utf-8') as f:
+            ids = ler_ids(f)
+
+    import quiz
+    cache = ByteCache(max_bytes=0, diretorio=args.cache or args.saida + '.cache')
+    falhas = 0
+
+    def progresso(feitos, total, session_id, erro):
+        nonlocal falhas
+        falhas += erro is not None
+        print(f"[{feitos}/{total}] {session_id}: {erro or 'ok'}", file=sys.stderr)
+
+    temporario = args.saida + '.parcial'
+    with open(temporario, 'wb') as f:
+        for pedaco in gerar_zip(ids, quiz.dados_pdf_sessao, args.processos, cache, progresso):
+            f.write(pedaco)
+    os.replace(temporario, args.saida)
+    print(f"{len(set(ids)) - falhas} PDFs em {args.saida}, {falhas} com erro", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
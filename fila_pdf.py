@@ -0,0 +1,245 @@
+"""Fila de jobs de PDF: a requisição só enfileira, quem renderiza é um worker.
+
+Backends, escolhidos por URL em criar_fila_pdf():
+
+    memory://                  fila e jobs no próprio processo (um único worker web)
+    redis://host:6379/0        Redis compartilhado entre os workers (pacote redis)
+    fakeredis://               stand-in local compatível com Redis (pacote fakeredis)
+
+Com Redis, os jobs podem ser consumidos por processos dedicados:
+
+    python fila_pdf.py redis://localhost:6379/0 [--threads 2]
+"""
+import abc
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+from cache import ByteCache, LRUCache
+
+ESTADOS = ('na_fila', 'gerando', 'pronto', 'erro')
+
+
+class PdfFilaCheia(Exception):
+    pass
+
+
+class PdfJobQueue(abc.ABC):
+    """Interface comum: jobs ({estado, chave, ...}) e PDFs prontos expiram após `ttl`."""
+
+    def __init__(self, max_fila: int = 100, ttl: float = 3600):
+        self.max_fila = max_fila
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def enfileirar(self, job_id: str, dados: dict):
+        """Cria o job como 'na_fila'; levanta PdfFilaCheia se não houver vaga."""
+
+    @abc.abstractmethod
+    def proximo(self, timeout: float = 1):
+        """Próximo (job_id, dados) da fila, ou None se nada chegar em `timeout`."""
+
+    @abc.abstractmethod
+    def atualizar(self, job_id: str, **campos):
+        """Grava `campos` no job (criando-o se preciso) e renova a expiração."""
+
+    @abc.abstractmethod
+    def status(self, job_id: str):
+        """O job como dict, ou None se não existir/expirou."""
+
+    @abc.abstractmethod
+    def guardar_pdf(self, chave: str, pdf: bytes):
+        """Guarda o PDF pronto sob a chave de conteúdo."""
+
+    @abc.abstractmethod
+    def ler_pdf(self, chave: str):
+        """Os bytes do PDF, ou None."""
+
+    @abc.abstractmethod
+    def tem_pdf(self, chave: str) -> bool:
+        """Se o PDF já está pronto, sem transferi-lo."""
+
+    @abc.abstractmethod
+    def tamanho(self) -> int:
+        """Jobs esperando na fila."""
+
+
+class MemoryPdfJobQueue(PdfJobQueue):
+    def __init__(self, max_fila: int = 100, ttl: float = 3600, pdfs: ByteCache = None, max_jobs: int = 10000):
+        super().__init__(max_fila, ttl)
+        self._fila = queue.Queue(max_fila)
+        self._jobs = LRUCache(max_jobs)
+        self._pdfs = pdfs if pdfs is not None else ByteCache()
+        self._lock = threading.Lock()
+
+    def enfileirar(self, job_id, dados):
+        self.atualizar(job_id, estado='na_fila', chave=dados['chave'])
+        try:
+            self._fila.put_nowait((job_id, dados))
+        except queue.Full:
+            self.atualizar(job_id, estado='erro', erro='fila cheia')
+            raise PdfFilaCheia()
+
+    def proximo(self, timeout=1):
+        try:
+            return self._fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def atualizar(self, job_id, **campos):
+        with self._lock:
+            job = dict(self._jobs.get(job_id) or {"job_id": job_id, "criado_em": time.time()})
+            job.update(campos, atualizado_em=time.time())
+            self._jobs.set(job_id, job)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job['criado_em'] + self.ttl <= time.time():
+            return None
+        return dict(job)
+
+    def guardar_pdf(self, chave, pdf):
+        self._pdfs.set(chave, pdf)
+
+    def ler_pdf(self, chave):
+        return self._pdfs.get(chave)
+
+    def tem_pdf(self, chave):
+        return self._pdfs.buscar(chave) is not None
+
+    def tamanho(self):
+        return self._fila.qsize()
+
+
+class RedisPdfJobQueue(PdfJobQueue):
+    """Jobs em hashes `pdfjob:<id>`, fila em uma lista e PDFs em `pdf:<chave>`."""
+
+    FILA = 'pdfjobs:fila'
+
+    def __init__(self, cliente, max_fila: int = 100, ttl: float = 3600):
+        super().__init__(max_fila, ttl)
+        self.redis = cliente
+
+    def enfileirar(self, job_id, dados):
+        if self.redis.llen(self.FILA) >= self.max_fila:
+            raise PdfFilaCheia()
+        self.atualizar(job_id, estado='na_fila', chave=dados['chave'])
+        self.redis.lpush(self.FILA, json.dumps({"job_id": job_id, "dados": dados}, default=str))
+
+    def proximo(self, timeout=1):
+        item = self.redis.brpop(self.FILA, timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        mensagem = json.loads(item[1])
+        return mensagem['job_id'], mensagem['dados']
+
+    def atualizar(self, job_id, **campos):
+        chave = f'pdfjob:{job_id}'
+        agora = time.time()
+        with self.redis.pipeline() as pipe:
+            pipe.hsetnx(chave, 'criado_em', agora)
+            pipe.hset(chave, mapping={"job_id": job_id, "atualizado_em": agora, **campos})
+            pipe.expire(chave, int(self.ttl))
+            pipe.execute()
+
+    def status(self, job_id):
+        job = self.redis.hgetall(f'pdfjob:{job_id}')
+        if not job:
+            return None
+        job = {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v
+               for k, v in job.items()}
+        job['criado_em'] = float(job['criado_em'])
+        job['atualizado_em'] = float(job['atualizado_em'])
+        return job
+
+    def guardar_pdf(self, chave, pdf):
+        self.redis.set(f'pdf:{chave}', pdf, ex=int(self.ttl))
+
+    def ler_pdf(self, chave):
+        return self.redis.get(f'pdf:{chave}')
+
+    def tem_pdf(self, chave):
+        return bool(self.redis.exists(f'pdf:{chave}'))
+
+    def tamanho(self):
+        return self.redis.llen(self.FILA)
+
+
+def criar_fila_pdf(url: str, max_fila: int = 100, ttl: float = 3600, pdfs: ByteCache = None) -> PdfJobQueue:
+    """Cria o backend a partir de uma URL (memory://, redis://..., fakeredis://)."""
+    esquema = url.partition('://')[0]
+    if esquema == 'memory':
+        return MemoryPdfJobQueue(max_fila, ttl, pdfs)
+    if esquema in ('redis', 'rediss'):
+        import redis
+        return RedisPdfJobQueue(redis.Redis.from_url(url), max_fila, ttl)
+    if esquema == 'fakeredis':
+        import fakeredis
+        return RedisPdfJobQueue(fakeredis.FakeRedis(), max_fila, ttl)
+    raise ValueError(f"PDF_JOBS_QUEUE desconhecido: {url}")
+
+
+class PdfJobWorker:
+    """Threads que consomem a fila e chamam `renderizar(plano, respostas, metas)`."""
+
+    def __init__(self, fila: PdfJobQueue, renderizar, threads: int = 1):
+        self.fila = fila
+        self.renderizar = renderizar
+        self.threads = threads
+        self._parar = threading.Event()
+        self._threads = None
+        self._lock = threading.Lock()
+
+    def processar(self, job_id: str, dados: dict):
+        self.fila.atualizar(job_id, estado='gerando')
+        try:
+            pdf = self.renderizar(dados['plano'], dados['respostas'], dados['metas'])
+            self.fila.guardar_pdf(dados['chave'], pdf)
+        except Exception as e:
+            self.fila.atualizar(job_id, estado='erro', erro=str(e) or type(e).__name__)
+        else:
+            self.fila.atualizar(job_id, estado='pronto')
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                item = self.fila.proximo(timeout=1)
+            except Exception:
+                # Redis fora do ar: espera e tenta de novo
+                self._parar.wait(1)
+                continue
+            if item is not None:
+                self.processar(*item)
+
+    def iniciar(self) -> list:
+        """Sobe as threads, uma vez por processo (um filho de fork sobe as suas)."""
+        with self._lock:
+            if self._threads is not None and self._threads[0] == os.getpid():
+                return self._threads[1]
+            threads = [threading.Thread(target=self._loop, name=f'pdf-jobs-{i}', daemon=True) for i in range(self.threads)]
+            for thread in threads:
+                thread.start()
+            self._threads = (os.getpid(), threads)
+            return threads
+
+    def parar(self):
+        self._parar.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker dedicado da fila de PDFs.")
+    parser.add_argument('url', help="redis://host:6379/0")
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from pdf_plano import gerar_pdf
+    worker = PdfJobWorker(criar_fila_pdf(args.url), gerar_pdf, args.threads)
+    for thread in worker.iniciar():
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
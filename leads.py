@@ -0,0 +1,790 @@
+"""Gravação dos leads capturados no quiz.
+
+O request só enfileira a linha; uma thread do LeadWriter junta as linhas em
+lotes e grava no destino: o CSV em data/leads.csv (padrão) ou um banco SQLite.
+
+Exportar o SQLite no formato do CSV original:
+
+    python leads.py exportar data/leads.db leads.csv [--desde 2025-09-01] [--objetivo emagrecer]
+
+e para migrar um CSV existente para o banco:
+
+    python leads.py importar data/leads.csv data/leads.db
+
+Com rotação ligada (RotatingCsvLeadSink), o CSV é fechado por tamanho ou por
+dia e vira um segmento comprimido listado em data/leads.manifest.json. Passar
+o caminho do CSV para `exportar`, `importar` ou analise_leads.py lê todos os
+segmentos seguidos do arquivo atual, como um único arquivo.
+"""
+import argparse
+import atexit
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import math
+import mmap
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: a rotação fica sem trava entre processos
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # opcional: sem ele os segmentos são comprimidos com gzip
+    zstandard = None
+
+LEADS_CAMPOS = ['timestamp', 'nome', 'email', 'whatsapp', 'objetivo', 'atividade', 'peso', 'altura', 'idade']
+
+
+def linha_lead(respostas: dict, timestamp: str = None) -> list:
+    """Converte as respostas do quiz numa linha na ordem de LEADS_CAMPOS."""
+    return [timestamp or datetime.datetime.now().isoformat()] + [
+        respostas.get(campo, '') for campo in LEADS_CAMPOS[1:]
+    ]
+
+
+class CsvLeadSink:
+    """Acrescenta lotes de linhas ao CSV, com cabeçalho se o arquivo for novo."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._arquivo = None
+
+    def _abrir(self):
+        if self._arquivo is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._arquivo = open(self.path, 'a', newline='', encoding='utf-8')
+        return self._arquivo
+
+    def gravar(self, linhas: list):
+        f = self._abrir()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if f.tell() == 0:
+            writer.writerow(LEADS_CAMPOS)
+        writer.writerows(linhas)
+        # Uma única escrita por lote: com O_APPEND, lotes de processos
+        # diferentes não se misturam no meio de uma linha
+        f.write(buffer.getvalue())
+        f.flush()
+
+    def sincronizar(self):
+        if self._arquivo is not None:
+            os.fsync(self._arquivo.fileno())
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+
+def caminho_manifest(path: str) -> str:
+    return os.path.splitext(path)[0] + '.manifest.json'
+
+
+def ler_manifest(path: str) -> dict:
+    """Manifest dos segmentos já rotacionados do CSV `path`."""
+    try:
+        with open(caminho_manifest(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"segmentos": []}
+
+
+def _segmentos_fora_do_manifest(path: str, manifest: dict) -> list:
+    """Segmentos de uma rotação interrompida: já no disco, ainda fora do manifest.
+
+    Um por segmento: o CSV original quando ainda existe (só é apagado depois
+    que o comprimido entra no manifest), senão o comprimido. Um original cujo
+    comprimido já está no manifest é sobra e fica de fora.
+    """
+    pasta = os.path.dirname(path)
+    base, ext = os.path.splitext(os.path.basename(path))
+    padrao = re.compile(rf'^({re.escape(base)}-\d{{8}}-\d{{6}}(?:-\d+)?{re.escape(ext)})(\.gz|\.zst)?$')
+    registrados = {re.sub(r'\.(gz|zst)$', '', seg['arquivo']) for seg in manifest['segmentos']}
+    orfaos = {}
+    for nome in os.listdir(pasta or '.'):
+        m = padrao.match(nome)
+        if m is None or m.group(1) in registrados:
+            continue
+        if m.group(1) not in orfaos or m.group(2) is None:
+            orfaos[m.group(1)] = nome
+    return [os.path.join(pasta, orfaos[raiz]) for raiz in sorted(orfaos)]
+
+
+def segmentos_leads(path: str) -> list:
+    """Arquivos que formam o histórico de `path`, do mais antigo ao atual."""
+    pasta = os.path.dirname(path)
+    manifest = ler_manifest(path)
+    arquivos = [os.path.join(pasta, seg['arquivo']) for seg in manifest['segmentos']]
+    arquivos += _segmentos_fora_do_manifest(path, manifest)
+    if os.path.exists(path):
+        arquivos.append(path)
+    return arquivos
+
+
+def abrir_texto(path: str):
+    """Abre um segmento de leads para leitura em texto, descomprimindo se preciso."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path}: instale o pacote zstandard para ler arquivos .zst")
+        leitor = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(leitor, encoding='utf-8', newline='')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+
+def iterar_linhas(path: str):
+    """Linhas de todos os segmentos de `path` (sem os cabeçalhos), em ordem."""
+    for segmento in segmentos_leads(path):
+        with abrir_texto(segmento) as f:
+            for linha in csv.reader(f):
+                if linha != LEADS_CAMPOS:
+                    yield linha
+
+
+def filtrar_linhas(linhas, desde: str = None, ate: str = None, objetivo: str = None):
+    i_objetivo = LEADS_CAMPOS.index('objetivo')
+    for linha in linhas:
+        if desde and linha[0] < desde: continue
+        if ate and linha[0] >= ate: continue
+        if objetivo and linha[i_objetivo] != objetivo: continue
+        yield linha
+
+
+class RotatingCsvLeadSink(CsvLeadSink):
+    """CsvLeadSink que fecha o arquivo ao passar de `max_bytes` ou ao virar o dia.
+
+    O arquivo fechado é renomeado para leads-AAAAMMDD-HHMMSS.csv, comprimido
+    (gzip, ou zstd se o pacote zstandard estiver instalado) e registrado no
+    manifest com o número de linhas. Entre processos, a gravação usa uma trava
+    compartilhada e a rotação uma exclusiva (fcntl, quando disponível); quem
+    ainda estiver com o arquivo antigo aberto percebe pelo inode e reabre.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, diario: bool = False, compressao: str = 'gzip'):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.diario = diario
+        self.compressao = 'zstd' if compressao == 'zstd' and zstandard is not None else 'gzip'
+        self._dia = None
+
+    @contextmanager
+    def _trava(self, exclusiva: bool):
+        if fcntl is None:
+            yield
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _abrir(self):
+        if self._arquivo is not None:
+            try:
+                inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if inode != os.fstat(self._arquivo.fileno()).st_ino:
+                self.fechar()  # outro processo rotacionou
+        f = super()._abrir()
+        if self._dia is None:
+            mtime = os.fstat(f.fileno()).st_mtime
+            self._dia = datetime.date.fromtimestamp(mtime) if f.tell() else datetime.date.today()
+        return f
+
+    def fechar(self):
+        super().fechar()
+        self._dia = None
+
+    def _precisa_rotacionar(self) -> bool:
+        tamanho = self._abrir().tell()
+        if tamanho == 0:
+            return False
+        if self.max_bytes and tamanho >= self.max_bytes:
+            return True
+        return self.diario and datetime.date.today() != self._dia
+
+    def gravar(self, linhas: list):
+        with self._trava(exclusiva=False):
+            if not self._precisa_rotacionar():
+                return super().gravar(linhas)
+        with self._trava(exclusiva=True):
+            # Confere de novo: outro processo pode ter rotacionado enquanto esperávamos
+            if self._precisa_rotacionar():
+                self.rotacionar()
+            super().gravar(linhas)
+
+    def _nome_segmento(self) -> str:
+        base, ext = os.path.splitext(self.path)
+        carimbo = f"{self._dia:%Y%m%d}-{datetime.datetime.now():%H%M%S}"
+        nome, n = f"{base}-{carimbo}{ext}", 1
+        while os.path.exists(nome) or os.path.exists(nome + '.gz') or os.path.exists(nome + '.zst'):
+            n += 1
+            nome = f"{base}-{carimbo}-{n}{ext}"
+        return nome
+
+    def rotacionar(self):
+        """Fecha o arquivo atual como segmento. Chamar com a trava exclusiva.
+
+        O CSV original só é apagado depois que o comprimido está no manifest:
+        se o processo cair no meio, os leitores (segmentos_leads) ainda acham o
+        segmento, e a próxima rotação termina o registro.
+        """
+        destino = self._nome_segmento()
+        self.fechar()
+        os.replace(self.path, destino)
+
+        manifest = ler_manifest(self.path)
+        originais, comprimido = [], None
+        for segmento in _segmentos_fora_do_manifest(self.path, manifest):
+            with abrir_texto(segmento) as f:
+                linhas = sum(1 for linha in csv.reader(f) if linha != LEADS_CAMPOS)
+            if segmento.endswith(('.gz', '.zst')):
+                comprimido = segmento
+            else:
+                comprimido = comprimir_segmento(segmento, self.compressao, remover=False)
+                originais.append(segmento)
+            manifest['segmentos'].append({
+                "arquivo": os.path.basename(comprimido),
+                "linhas": linhas,
+                "bytes": os.path.getsize(comprimido),
+                "fechado_em": datetime.datetime.now().isoformat(),
+            })
+        temporario = caminho_manifest(self.path) + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho_manifest(self.path))
+
+        # Originais já registrados, inclusive sobras de uma rotação que caiu
+        # entre o manifest e a remoção
+        pasta = os.path.dirname(self.path)
+        for seg in manifest['segmentos']:
+            original = os.path.join(pasta, re.sub(r'\.(gz|zst)$', '', seg['arquivo']))
+            if original != os.path.join(pasta, seg['arquivo']) and os.path.exists(original):
+                originais.append(original)
+        for original in set(originais):
+            try:
+                os.remove(original)
+            except FileNotFoundError:
+                pass
+        return comprimido
+
+
+def comprimir_segmento(path: str, compressao: str = 'gzip', remover: bool = True) -> str:
+    """Comprime `path` (gzip ou zstd) e retorna o novo caminho; com `remover`, apaga o original.
+
+    O comprimido é gravado num .tmp e renomeado: no disco, ele está sempre inteiro.
+    """
+    destino = path + ('.zst' if compressao == 'zstd' else '.gz')
+    temporario = destino + '.tmp'
+    with open(path, 'rb') as origem:
+        if compressao == 'zstd':
+            with open(temporario, 'wb') as f:
+                zstandard.ZstdCompressor().copy_stream(origem, f)
+        else:
+            with gzip.open(temporario, 'wb') as f:
+                shutil.copyfileobj(origem, f, 1024 * 1024)
+    os.replace(temporario, destino)
+    if remover:
+        os.remove(path)
+    return destino
+
+
+class SQLiteLeadSink:
+    """Insere cada lote numa transação só, num banco em modo WAL.
+
+    As colunas não têm tipo declarado, então os valores voltam exatamente como
+    foram gravados (80 continua 80, "80" continua "80") e a exportação
+    reproduz o CSV.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._con = None
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Criada na thread do LeadWriter, a única que usa o sink
+        if self._con is None:
+            self._con = conectar_leads_db(self.path)
+        return self._con
+
+    def gravar(self, linhas: list):
+        con = self._conexao()
+        with con:
+            con.executemany(
+                f"INSERT INTO leads ({', '.join(LEADS_CAMPOS)}) VALUES ({', '.join('?' * len(LEADS_CAMPOS))})",
+                linhas,
+            )
+
+    def sincronizar(self):
+        if self._con is not None:
+            self._con.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def fechar(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+
+def conectar_leads_db(path: str) -> sqlite3.Connection:
+    """Abre (e cria, se preciso) o banco de leads com as tabelas e índices."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = sqlite3.connect(path, timeout=10)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY, {', '.join(LEADS_CAMPOS)})")
+    for campo in ('timestamp', 'email', 'objetivo'):
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_leads_{campo} ON leads ({campo})")
+    con.commit()
+    return con
+
+
+def iterar_leads_db(path: str, desde: str = None, ate: str = None, objetivo: str = None):
+    """Percorre os leads do banco em ordem de gravação, sem carregar tudo na memória.
+
+    `desde`/`ate` comparam com o timestamp ISO (ex.: '2025-09-01').
+    """
+    filtros, parametros = [], []
+    if desde:
+        filtros.append("timestamp >= ?")
+        parametros.append(desde)
+    if ate:
+        filtros.append("timestamp < ?")
+        parametros.append(ate)
+    if objetivo:
+        filtros.append("objetivo = ?")
+        parametros.append(objetivo)
+    where = f" WHERE {' AND '.join(filtros)}" if filtros else ""
+    con = conectar_leads_db(path)
+    try:
+        cursor = con.execute(f"SELECT {', '.join(LEADS_CAMPOS)} FROM leads{where} ORDER BY id", parametros)
+        while True:
+            linhas = cursor.fetchmany(1000)
+            if not linhas:
+                break
+            yield from linhas
+    finally:
+        con.close()
+
+
+def exportar_csv(linhas, saida) -> int:
+    """Escreve as linhas em `saida` no formato de data/leads.csv; retorna quantas."""
+    writer = csv.writer(saida)
+    writer.writerow(LEADS_CAMPOS)
+    total = 0
+    for linha in linhas:
+        writer.writerow(linha)
+        total += 1
+    return total
+
+
+def importar_csv(csv_path: str, db_path: str, tamanho_lote: int = 1000) -> int:
+    """Copia um CSV no formato de data/leads.csv para o banco; retorna quantas linhas."""
+    sink = SQLiteLeadSink(db_path)
+    total = 0
+    try:
+        lote = []
+        for linha in iterar_linhas(csv_path):
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                sink.gravar(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            sink.gravar(lote)
+            total += len(lote)
+    finally:
+        sink.fechar()
+    return total
+
+
+def criar_lead_sink(backend: str, csv_path: str, db_path: str, rotacao_bytes: int = 0,
+                    rotacao_diaria: bool = False, compressao: str = 'gzip'):
+    if backend == 'csv':
+        if rotacao_bytes or rotacao_diaria:
+            return RotatingCsvLeadSink(csv_path, rotacao_bytes, rotacao_diaria, compressao)
+        return CsvLeadSink(csv_path)
+    if backend == 'sqlite':
+        return SQLiteLeadSink(db_path)
+    raise ValueError(f"LEADS_BACKEND desconhecido: {backend}")
+
+
+def ler_cauda_csv(path: str, max_bytes: int = 1 << 20):
+    """Últimas linhas do CSV de leads (até `max_bytes` do fim do arquivo)."""
+    try:
+        with open(path, 'rb') as f:
+            tamanho = f.seek(0, os.SEEK_END)
+            inicio = max(0, tamanho - max_bytes)
+            f.seek(inicio)
+            bloco = f.read()
+    except OSError:
+        return []
+    texto = bloco.decode('utf-8', errors='replace')
+    if inicio > 0:
+        texto = texto.partition('\n')[2]  # descarta a linha cortada no meio
+    linhas = [l for l in csv.reader(io.StringIO(texto)) if len(l) == len(LEADS_CAMPOS)]
+    if linhas and inicio == 0 and linhas[0] == LEADS_CAMPOS:
+        linhas = linhas[1:]
+    return linhas
+
+
+def linhas_recentes(backend: str, csv_path: str, db_path: str, segundos: float) -> list:
+    """Leads gravados nos últimos `segundos` (aproximado no CSV: lê só o fim do arquivo)."""
+    if backend == 'sqlite':
+        if not os.path.exists(db_path):
+            return []
+        desde = (datetime.datetime.now() - datetime.timedelta(seconds=segundos)).isoformat()
+        return list(iterar_leads_db(db_path, desde=desde))
+    return ler_cauda_csv(csv_path)
+
+
+def _normalizar(valor) -> str:
+    # 80, 80.0 e "80" são a mesma resposta
+    try:
+        return repr(float(valor))
+    except (TypeError, ValueError):
+        return str(valor).strip().lower()
+
+
+def chave_lead(respostas: dict) -> bytes:
+    """Identidade de um envio: e-mail, whatsapp (só dígitos) e respostas, normalizados."""
+    partes = [
+        str(respostas.get('email', '')).strip().lower(),
+        re.sub(r'\D', '', str(respostas.get('whatsapp', ''))),
+    ] + [_normalizar(respostas.get(campo, '')) for campo in ('nome', 'objetivo', 'atividade', 'peso', 'altura', 'idade')]
+    return hashlib.sha256('\x1f'.join(partes).encode('utf-8')).digest()
+
+
+class BloomFilter:
+    """Bloom filter em duas gerações, em memória ou num arquivo mapeado (mmap).
+
+    Cada item entra numa `fatia` (ex.: a janela de tempo em que chegou). As
+    fatias pares e ímpares ficam em gerações separadas; gravar numa fatia mais
+    nova que a da sua geração zera só aquela geração, então o filtro não
+    satura com o tempo. `capacidade` é por fatia. No arquivo, os bits são
+    compartilhados pelos processos da mesma máquina, com flock em cada
+    leitura/escrita. Pode dar falso positivo (na taxa `taxa_erro`), nunca
+    falso negativo dentro das duas fatias mais recentes.
+    """
+
+    _CABECALHO = struct.Struct('<qq')  # fatia guardada em cada geração
+
+    def __init__(self, capacidade: int = 100000, taxa_erro: float = 0.0001, path: str = None):
+        self.bits = max(8, math.ceil(-capacidade * math.log(taxa_erro) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacidade * math.log(2)))
+        self._bytes_geracao = (self.bits + 7) // 8
+        tamanho = self._CABECALHO.size + 2 * self._bytes_geracao
+        self.path = path
+        self._arquivo = None
+        self._lock = threading.Lock()
+        if path is None:
+            self._dados = bytearray(tamanho)
+            return
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._arquivo = open(path, 'a+b')
+        with self._trava():
+            if os.fstat(self._arquivo.fileno()).st_size != tamanho:
+                self._arquivo.truncate(0)
+                self._arquivo.truncate(tamanho)
+        self._dados = mmap.mmap(self._arquivo.fileno(), tamanho)
+
+    @contextmanager
+    def _trava(self):
+        with self._lock:
+            if self._arquivo is None or fcntl is None:
+                yield
+                return
+            fcntl.flock(self._arquivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._arquivo, fcntl.LOCK_UN)
+
+    def _posicoes(self, item: bytes, geracao: int):
+        # Double hashing "melhorado" (Dillinger & Manolios): o simples ficava
+        # bem acima da taxa de erro prevista
+        digest = hashlib.sha256(item).digest()
+        h1 = int.from_bytes(digest[:8], 'little') % self.bits
+        h2 = int.from_bytes(digest[8:16], 'little') % self.bits
+        base = self._CABECALHO.size * 8 + geracao * self._bytes_geracao * 8
+        posicoes = []
+        for i in range(self.hashes):
+            posicoes.append(base + h1)
+            h1 = (h1 + h2) % self.bits
+            h2 = (h2 + i + 1) % self.bits
+        return posicoes
+
+    def _fatias(self) -> list:
+        return list(self._CABECALHO.unpack_from(self._dados))
+
+    def add(self, item: bytes, fatia: int = 0):
+        geracao = fatia % 2
+        with self._trava():
+            fatias = self._fatias()
+            if fatia < fatias[geracao]:
+                return  # fatia já descartada
+            if fatia > fatias[geracao]:
+                inicio = self._CABECALHO.size + geracao * self._bytes_geracao
+                self._dados[inicio:inicio + self._bytes_geracao] = bytes(self._bytes_geracao)
+                fatias[geracao] = fatia
+                self._CABECALHO.pack_into(self._dados, 0, *fatias)
+            for pos in self._posicoes(item, geracao):
+                self._dados[pos >> 3] |= 1 << (pos & 7)
+
+    def contem(self, item: bytes, fatia: int = 0) -> bool:
+        geracao = fatia % 2
+        with self._trava():
+            if self._fatias()[geracao] != fatia:
+                return False
+            return all(self._dados[pos >> 3] & (1 << (pos & 7)) for pos in self._posicoes(item, geracao))
+
+    def __contains__(self, item: bytes) -> bool:
+        return self.contem(item)
+
+    def limpar(self):
+        with self._trava():
+            self._dados[:] = bytes(len(self._dados))
+
+
+class LeadDeduplicator:
+    """Descarta envios repetidos da mesma pessoa dentro de `janela` segundos.
+
+    O índice em memória (chave -> horário do último lead aceito) é exato. Com
+    um BloomFilter em arquivo, os processos da máquina também enxergam os leads
+    uns dos outros: ali cada janela de tempo é uma fatia, e a fatia atual e a
+    anterior são consultadas (até duas janelas para trás).
+    """
+
+    def __init__(self, janela: float = 300, bloom: BloomFilter = None):
+        self.janela = janela
+        self.bloom = bloom
+        self.duplicados = 0
+        self._vistos = {}
+        self._lock = threading.Lock()
+        self._proxima_poda = 0.0
+
+    def _fatia(self, instante: float) -> int:
+        return int(instante // self.janela)
+
+    def registrar(self, respostas: dict, agora: float = None) -> bool:
+        """True se o lead é novo (e deve ser gravado), False se é repetido."""
+        agora = time.time() if agora is None else agora
+        chave = chave_lead(respostas)
+        with self._lock:
+            ultimo = self._vistos.get(chave)
+            repetido = ultimo is not None and agora - ultimo < self.janela
+            if not repetido and ultimo is None and self.bloom is not None:
+                fatia = self._fatia(agora)
+                repetido = self.bloom.contem(chave, fatia) or self.bloom.contem(chave, fatia - 1)
+            if repetido:
+                self.duplicados += 1
+                return False
+            self._marcar(chave, agora)
+            if agora >= self._proxima_poda:
+                self._vistos = {k: t for k, t in self._vistos.items() if agora - t < self.janela}
+                self._proxima_poda = agora + self.janela
+        return True
+
+    def _marcar(self, chave: bytes, instante: float):
+        self._vistos[chave] = instante
+        if self.bloom is not None:
+            self.bloom.add(chave, self._fatia(instante))
+
+    def carregar(self, linhas, agora: float = None) -> int:
+        """Reconstrói o índice a partir de linhas já gravadas.
+
+        O bloom compartilhado não é zerado (outros workers estão usando); as
+        linhas só são somadas a ele, o que não muda nada se já estavam lá.
+        """
+        agora = time.time() if agora is None else agora
+        carregadas = 0
+        with self._lock:
+            for linha in linhas:
+                try:
+                    instante = datetime.datetime.fromisoformat(str(linha[0])).timestamp()
+                except ValueError:
+                    continue
+                if agora - instante < 2 * self.janela:
+                    self._marcar(chave_lead(dict(zip(LEADS_CAMPOS, linha))), instante)
+                    carregadas += 1
+        return carregadas
+
+
+class _Marcador:
+    """Item especial da fila: pede um flush (ou o fim) e avisa quando concluir."""
+
+    def __init__(self, fim: bool = False):
+        self.fim = fim
+        self.concluido = threading.Event()
+
+
+class LeadWriter:
+    """Grava leads em segundo plano, em lotes.
+
+    O lote vai para o destino ao juntar `tamanho_lote` linhas ou quando a linha
+    mais antiga esperou `intervalo` segundos; fsync no máximo a cada
+    `intervalo_fsync` segundos. `fechar()` (também chamado no atexit) grava o
+    que estiver pendente antes de encerrar.
+
+    A thread só sobe no primeiro envio de cada processo: servidores que
+    importam o app antes do fork (gunicorn --preload) entregam aos workers o
+    objeto sem a thread, e ela é criada lá, com uma fila nova.
+    """
+
+    def __init__(self, destino, tamanho_lote: int = 100, intervalo: float = 1.0,
+                 intervalo_fsync: float = 5.0, max_fila: int = 10000):
+        self.destino = destino
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.intervalo_fsync = intervalo_fsync
+        self._max_fila = max_fila
+        self._fila = queue.Queue(max_fila)
+        self._fechado = False
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.fechar)
+
+    def _garantir_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Filho de um fork: a fila herdada (e o que havia nela) é do pai
+                self._fila = queue.Queue(self._max_fila)
+            self._thread = threading.Thread(target=self._loop, name='lead-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def enviar(self, linha: list):
+        if self._fechado:
+            raise RuntimeError("LeadWriter já foi fechado")
+        self._garantir_thread()
+        # Com a fila cheia o put bloqueia: o destino lento segura os requests
+        # em vez de acumular memória sem limite
+        self._fila.put(linha)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera gravar tudo o que foi enviado antes desta chamada."""
+        self._garantir_thread()
+        marcador = _Marcador()
+        self._fila.put(marcador)
+        return marcador.concluido.wait(timeout)
+
+    def fechar(self, timeout: float = 10.0):
+        if self._fechado:
+            return
+        self._fechado = True
+        if self._pid != os.getpid():
+            return  # nada foi enviado neste processo
+        marcador = _Marcador(fim=True)
+        self._fila.put(marcador)
+        marcador.concluido.wait(timeout)
+
+    def _gravar(self, pendentes: list, sincronizar: bool = False) -> list:
+        if pendentes:
+            try:
+                self.destino.gravar(pendentes)
+            except Exception:
+                return pendentes  # tenta de novo no próximo ciclo
+            self._sujo = True
+        if self._sujo and (sincronizar or time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync):
+            try:
+                self.destino.sincronizar()
+                self._sujo = False
+            except Exception:
+                pass
+            self._ultimo_fsync = time.monotonic()
+        return []
+
+    def _loop(self):
+        pendentes = []
+        inicio_lote = None
+        self._ultimo_fsync = time.monotonic()
+        self._sujo = False
+        while True:
+            espera = self.intervalo if inicio_lote is None else max(0, inicio_lote + self.intervalo - time.monotonic())
+            try:
+                item = self._fila.get(timeout=espera)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Marcador):
+                pendentes = self._gravar(pendentes, sincronizar=True)
+                inicio_lote = time.monotonic() if pendentes else None
+                if item.fim:
+                    self.destino.fechar()
+                    item.concluido.set()
+                    return
+                item.concluido.set()
+                continue
+
+            if item is not None:
+                pendentes.append(item)
+                if inicio_lote is None:
+                    inicio_lote = time.monotonic()
+
+            lote_cheio = len(pendentes) >= self.tamanho_lote
+            venceu = inicio_lote is not None and time.monotonic() - inicio_lote >= self.intervalo
+            if lote_cheio or venceu or item is None:
+                pendentes = self._gravar(pendentes)
+                inicio_lote = time.monotonic() if pendentes else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ferramentas dos leads do quiz.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    exportar = comandos.add_parser('exportar', help="Exporta os leads (banco SQLite ou CSV com segmentos) para um CSV")
+    exportar.add_argument('origem', help="data/leads.db ou data/leads.csv")
+    exportar.add_argument('saida', nargs='?', default='-', help="arquivo CSV (padrão: stdout)")
+    exportar.add_argument('--desde')
+    exportar.add_argument('--ate')
+    exportar.add_argument('--objetivo')
+    importar = comandos.add_parser('importar', help="Copia um CSV de leads para o banco SQLite")
+    importar.add_argument('csv')
+    importar.add_argument('db')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'importar':
+        print(f"{importar_csv(args.csv, args.db)} leads importados", file=sys.stderr)
+        return
+
+    if args.origem.endswith('.csv'):
+        linhas = filtrar_linhas(iterar_linhas(args.origem), args.desde, args.ate, args.objetivo)
+    else:
+        linhas = iterar_leads_db(args.origem, args.desde, args.ate, args.objetivo)
+    if args.saida == '-':
+        total = exportar_csv(linhas, sys.stdout)
+    else:
+        with open(args.saida, 'w', newline='', encoding='utf-8') as f:
+            total = exportar_csv(linhas, f)
+    print(f"{total} leads exportados", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Fórmulas nutricionais usadas pelo quiz, sem dependência do Flask."""
+
+
+def calcular_peso_ideal(altura_cm: float, sexo: str) -> float:
+    return (50 if sexo == 'masculino' else 45.5) + 2.3 * ((altura_cm - 152.4) / 2.54)
+
+def calcular_agua_diaria(peso_kg: float) -> float:
+    return peso_kg * 35
+
+def mifflin_st_jeor(sexo: str, peso_kg: float, altura_cm: float, idade: int) -> float:
+    s = 5 if sexo == 'masculino' else -161
+    return 10 * peso_kg + 6.25 * altura_cm - 5 * idade + s
+
+
+def calcular_imc(peso: float, altura_cm: float) -> dict:
+    imc = peso / ((altura_cm / 100) ** 2)
+    
+    if imc < 18.5: return {"valor": round(imc, 1), "categoria": "abaixo", "status": "Abaixo do Peso", "cor": "#3498db", "posicao": 15}
+    elif imc < 25: return {"valor": round(imc, 1), "categoria": "normal", "status": "Normal", "cor": "#27ae60", "posicao": 40}
+    elif imc < 30: return {"valor": round(imc, 1), "categoria": "sobrepeso", "status": "Sobrepeso", "cor": "#f39c12", "posicao": 70}
+    else: return {"valor": round(imc, 1), "categoria": "obeso", "status": "Obeso", "cor": "#e74c3c", "posicao": 90}
+
+def gerar_frase_motivacional(objetivo: str, imc_info: dict) -> str:
+    frases = {
+        "emagrecer": "Seu corpo pode se transformar e definir ao mesmo tempo",
+        "manter": "Seu corpo pode se manter equilibrado e saudável", 
+        "ganhar": "Seu corpo pode definir e crescer ao mesmo tempo"
+    }
+    return frases[objetivo]
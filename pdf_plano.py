@@ -0,0 +1,104 @@
+"""PDF do plano (ReportLab).
+
+O quiz só importa este módulo quando um PDF é pedido (ou no aquecimento), então
+workers que nunca geram PDF sobem sem carregar o ReportLab. Também é o que os
+processos do PdfPool e o worker da fila de PDFs executam.
+"""
+import io
+import os
+import threading
+import time
+
+_inicio_import = time.perf_counter()
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+from reportlab.lib.units import cm  # noqa: E402
+# Custo do import do ReportLab, pago por quem importou este módulo primeiro
+# (processos criados por fork herdam o valor do processo pai)
+TEMPO_IMPORT = time.perf_counter() - _inicio_import
+
+
+def escrever_pdf(plano: dict, respostas: dict, metas: dict, destino):
+    """Desenha o plano e grava o PDF em `destino` (caminho ou arquivo binário)."""
+    c = canvas.Canvas(destino, pagesize=A4)
+    width, height = A4
+
+    # Cabeçalho
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(2*cm, height - 2*cm, "Plano Personalizado")
+
+    # Dados principais
+    c.setFont("Helvetica", 11)
+    y = height - 3*cm
+    c.drawString(2*cm, y, f"Nome: {respostas.get('nome','-')}")
+    y -= 0.5*cm
+    c.drawString(2*cm, y, f"Objetivo: {respostas['objetivo'].title()} | Alvo: {metas['alvo']} kcal")
+    y -= 0.5*cm
+    c.drawString(2*cm, y, f"Peso: {respostas['peso']} kg | Altura: {respostas['altura']} cm | Idade: {respostas['idade']}")
+
+    # Refeições
+    titulos = {"cafe": "Café da Manhã", "almoco": "Almoço", "lanche": "Lanche", "jantar": "Jantar"}
+    for bloco in ["cafe", "almoco", "lanche", "jantar"]:
+        y -= 1*cm
+        if y < 4*cm: c.showPage(); y = height - 2*cm
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(2*cm, y, f"{titulos[bloco]} ({plano[bloco]['meta_kcal']} kcal)")
+        y -= 0.5*cm
+        c.setFont("Helvetica", 10)
+        for op in plano[bloco]['opcoes']:
+            c.drawString(2.2*cm, y, f"{op['descricao']} - {op['quantidade']} ({op['kcal']} kcal)")
+            y -= 0.4*cm
+
+    c.save()
+
+
+def gerar_pdf(plano: dict, respostas: dict, metas: dict) -> bytes:
+    buffer = io.BytesIO()
+    escrever_pdf(plano, respostas, metas, buffer)
+    return buffer.getvalue()
+
+
+def renderizar(plano: dict, respostas: dict, metas: dict):
+    # Roda no processo do pool: devolve também o tempo só de renderização
+    inicio = time.perf_counter()
+    pdf = gerar_pdf(plano, respostas, metas)
+    return pdf, time.perf_counter() - inicio
+
+
+def renderizar_arquivo(plano: dict, respostas: dict, metas: dict, caminho: str):
+    # Grava direto no arquivo (troca atômica): só o tamanho volta para quem pediu
+    inicio = time.perf_counter()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'wb') as f:
+        escrever_pdf(plano, respostas, metas, f)
+        tamanho = f.tell()
+    os.replace(temporario, caminho)
+    return tamanho, time.perf_counter() - inicio
+
+
+PLANO_AQUECIMENTO = {
+    bloco: {"meta_kcal": 500, "opcoes": [{"descricao": "Aquecimento", "quantidade": "100g", "kcal": 100}]}
+    for bloco in ("cafe", "almoco", "lanche", "jantar")
+}
+RESPOSTAS_AQUECIMENTO = {"nome": "-", "objetivo": "manter", "peso": 70, "altura": 170, "idade": 30}
+
+def aquecer() -> dict:
+    """Renderiza um plano descartável (métricas de fonte, canvas).
+
+    Assim o primeiro PDF de verdade de cada worker não paga esse custo.
+    """
+    _, duracao = renderizar(PLANO_AQUECIMENTO, RESPOSTAS_AQUECIMENTO, {"alvo": 2000})
+    return {
+        "pid": os.getpid(),
+        "import_ms": round(TEMPO_IMPORT * 1000, 1),
+        "render_ms": round(duracao * 1000, 1),
+        "total_ms": round((TEMPO_IMPORT + duracao) * 1000, 1),
+    }
+
+def aquecer_worker(relatorios):
+    # initializer do ProcessPoolExecutor: roda uma vez em cada processo novo
+    try:
+        relatorios.put(aquecer())
+    except Exception as e:
+        relatorios.put({"pid": os.getpid(), "erro": str(e)})
@@ -1,60 +1,282 @@
-from flask import Flask, request, jsonify, send_file, render_template_string, redirect
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-import io, os, uuid, json, datetime, csv
+from flask import Flask, Response, request, jsonify, send_file, render_template, redirect, session
+from jinja2 import DictLoader, FileSystemBytecodeCache
+import os, re, sys, hmac, uuid, json, threading, time, gzip, hashlib, tempfile, atexit, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_left
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
 from dotenv import load_dotenv
+from cache import ByteCache, LRUCache
+from nutricao import calcular_peso_ideal, calcular_agua_diaria, mifflin_st_jeor, calcular_imc, gerar_frase_motivacional
+import assets
+from sessoes import criar_session_store
+import exportar_pdfs
+from fila_pdf import PdfFilaCheia, PdfJobWorker, criar_fila_pdf
+from leads import LeadWriter, LeadDeduplicator, BloomFilter, criar_lead_sink, linha_lead, linhas_recentes
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele as páginas saem só em gzip
+    brotli = None
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'devsecret')
 
+SESSION_STORE = os.environ.get('SESSION_STORE', 'file://' + os.path.join(tempfile.gettempdir(), 'quiz_sessoes'))
+SESSION_TTL = float(os.environ.get('SESSION_TTL', str(7 * 24 * 3600)))
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', '600'))
+
+session_store = criar_session_store(SESSION_STORE, SESSION_TTL)
+
+
+@app.before_request
+def iniciar_threads():
+    # As threads de fundo sobem na primeira requisição de cada processo e não no
+    # import: com gunicorn --preload o import roda no mestre e o fork não as leva
+    if SESSION_SWEEP_INTERVAL > 0:
+        session_store.iniciar_limpeza(SESSION_SWEEP_INTERVAL)
+    pdf_worker.iniciar()
+    if pdf_cache.diretorio and PDF_CACHE_SWEEP_INTERVAL > 0:
+        pdf_cache.iniciar_limpeza(PDF_CACHE_SWEEP_INTERVAL)
+    if PDF_WARMUP:
+        pdf_pool.iniciar_em_segundo_plano()
+
+
 RULES = {
     "objetivos": {"emagrecer": -0.15, "manter": 0.0, "ganhar": 0.10},
     "atividade": {"sedentario": 1.2, "iniciante": 1.375, "intermediario": 1.55, "avancado": 1.725}
 }
 
+FOODS_PATH = 'data/foods.json'
+
+
+def _congelar(valor):
+    """Converte dicts/listas do JSON em estruturas somente leitura."""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+class _CatalogSnapshot:
+    """Versão imutável do catálogo de alimentos, com o JSON já serializado."""
+    __slots__ = ('versao', 'dados', 'raw', '_indice')
+
+    def __init__(self, versao, dados: dict):
+        self.versao = versao
+        self.dados = _congelar(dados)
+        self.raw = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        self._indice = None
+
+    @property
+    def indice(self) -> 'FoodIndex':
+        # Compilado na primeira consulta, uma única vez por versão do catálogo
+        if self._indice is None:
+            self._indice = FoodIndex(self.dados)
+        return self._indice
+
+
+class FoodCatalog:
+    """Catálogo de alimentos carregado uma vez e recarregado quando o arquivo muda.
+
+    A cada `snapshot()` o mtime/tamanho do arquivo é conferido (no máximo uma vez
+    a cada `intervalo` segundos); se mudou, o JSON é relido e a nova versão
+    substitui a anterior numa única atribuição, sem afetar quem já a está usando.
+    """
+
+    VAZIO = {"foods": {}, "alternatives": {}}
+
+    def __init__(self, path: str, intervalo: float = 1.0):
+        self.path = path
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._proxima_checagem = 0.0
+        self._atual = _CatalogSnapshot(None, self.VAZIO)
+        self.recarregar()
+
+    def _assinatura(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def recarregar(self) -> _CatalogSnapshot:
+        with self._lock:
+            versao = self._assinatura()
+            if versao is not None and versao == self._atual.versao:
+                return self._atual
+            if versao is None:
+                self._atual = _CatalogSnapshot(None, self.VAZIO)
+                return self._atual
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    dados = json.load(f)
+            except (OSError, ValueError):
+                # Arquivo sendo reescrito: mantém a última versão válida
+                return self._atual
+            self._atual = _CatalogSnapshot(versao, dados)
+            return self._atual
+
+    def snapshot(self) -> _CatalogSnapshot:
+        agora = time.monotonic()
+        if agora >= self._proxima_checagem:
+            self._proxima_checagem = agora + self.intervalo
+            if self._assinatura() != self._atual.versao:
+                return self.recarregar()
+        return self._atual
+
+
+catalogo = FoodCatalog(FOODS_PATH)
+
+
 def load_foods_data():
-    try:
-        with open('data/foods.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {"foods": {}, "alternatives": {}}
-
-def calcular_peso_porcao(alimento: str, calorias: int) -> str:
-    densidades = {
-        "Pão integral": 280, "Pão francês": 300, "Arroz": 130, "Feijão": 90,
-        "Frango": 165, "Carne bovina": 250, "Peixe": 180, "Ovo": 155,
-        "Batata-doce": 86, "Mandioca": 160, "Abóbora": 26, "Salada": 20,
-        "Iogurte": 60, "Fruta": 50, "Tapioca": 98, "Cuscuz": 112,
-        "Macarrão": 131, "Pizza": 266, "Hambúrguer": 295, "Frituras": 365
-    }
-    
-    densidade = 150
-    for key, val in densidades.items():
-        if key.lower() in alimento.lower():
-            densidade = val
-            break
-    
+    return catalogo.snapshot().dados
+
+DENSIDADES = {
+    "Pão integral": 280, "Pão francês": 300, "Arroz": 130, "Feijão": 90,
+    "Frango": 165, "Carne bovina": 250, "Peixe": 180, "Ovo": 155,
+    "Batata-doce": 86, "Mandioca": 160, "Abóbora": 26, "Salada": 20,
+    "Iogurte": 60, "Fruta": 50, "Tapioca": 98, "Cuscuz": 112,
+    "Macarrão": 131, "Pizza": 266, "Hambúrguer": 295, "Frituras": 365
+}
+DENSIDADE_PADRAO = 150
+
+# Todas as chaves numa única regex. O lookahead faz a busca testar cada posição
+# do nome, e em cada posição a alternância devolve a chave mais prioritária que
+# começa ali; o menor índice entre as posições reproduz o "primeiro da tabela vence".
+_PRIORIDADE_DENSIDADE = {}
+for _i, (_chave, _valor) in enumerate(DENSIDADES.items()):
+    _PRIORIDADE_DENSIDADE.setdefault(_chave.lower(), (_i, _valor))
+del _i, _chave, _valor
+_DENSIDADES_RE = re.compile(
+    '(?=(%s))' % '|'.join(re.escape(k) for k in _PRIORIDADE_DENSIDADE)
+)
+
+@lru_cache(maxsize=1024)
+def densidade_alimento(alimento: str) -> int:
+    melhor = None
+    for m in _DENSIDADES_RE.finditer(alimento.lower()):
+        candidato = _PRIORIDADE_DENSIDADE[m.group(1)]
+        if melhor is None or candidato < melhor:
+            melhor = candidato
+    return melhor[1] if melhor is not None else DENSIDADE_PADRAO
+
+class PortionScale:
+    """Tabela de medidas caseiras: cada faixa vale até o seu limite (inclusive)
+    em gramas, e `maior` cobre tudo acima do último limite.
+
+    Novas escalas (outro idioma, outro grupo de alimentos) são só outra
+    instância; os rótulos formatados ficam em cache por faixa e grama arredondado.
+    """
+
+    MAX_CACHE = 4096
+
+    def __init__(self, faixas, maior: str, formato: str = "{gramas}g ({medida})"):
+        self.limites = [limite for limite, _ in faixas]
+        self.medidas = [medida for _, medida in faixas] + [maior]
+        self.formato = formato
+        self._rotulos = {}
+
+    def medida(self, gramas: float) -> str:
+        return self.medidas[bisect_left(self.limites, gramas)]
+
+    def rotulo(self, gramas: float) -> str:
+        chave = (bisect_left(self.limites, gramas), round(gramas))
+        texto = self._rotulos.get(chave)
+        if texto is None:
+            texto = self.formato.format(gramas=chave[1], medida=self.medidas[chave[0]])
+            if len(self._rotulos) < self.MAX_CACHE:
+                self._rotulos[chave] = texto
+        return texto
+
+
+ESCALA_PORCAO = PortionScale(
+    [(20, "1 colher sopa"), (50, "1/2 xícara"), (100, "1 xícara"),
+     (150, "1 prato sobremesa"), (250, "1 prato raso")],
+    maior="1 prato fundo",
+)
+
+ESCALA_QUANTIDADE = PortionScale(
+    [(15, "1 colher sopa"), (30, "2 colheres sopa"), (50, "1/2 xícara"),
+     (100, "1 xícara"), (150, "1 prato sobremesa"), (200, "1 prato raso")],
+    maior="1 prato fundo",
+    formato="{gramas} g ({medida})",
+)
+
+def calcular_peso_porcao(alimento: str, calorias: int, escala: PortionScale = ESCALA_PORCAO) -> str:
+    densidade = densidade_alimento(alimento)
     gramas = (calorias * 100) / densidade
-    
-    if gramas <= 20:
-        return f"{round(gramas)}g (1 colher sopa)"
-    elif gramas <= 50:
-        return f"{round(gramas)}g (1/2 xícara)"
-    elif gramas <= 100:
-        return f"{round(gramas)}g (1 xícara)"
-    elif gramas <= 150:
-        return f"{round(gramas)}g (1 prato sobremesa)"
-    elif gramas <= 250:
-        return f"{round(gramas)}g (1 prato raso)"
-    else:
-        return f"{round(gramas)}g (1 prato fundo)"
+    return escala.rotulo(gramas)
+
+class FoodEntry(NamedTuple):
+    nome: str
+    calorias: int
+    categoria: str
+    densidade: int
+    porcao: str
+    alternativa: str = None
+    alternativa_calorias: int = None
+    alternativa_porcao: str = None
+    economia_calorias: int = None
+
+
+class FoodIndex:
+    """Campos derivados de cada alimento, calculados uma vez por versão do catálogo."""
+
+    PADRAO = {"calories": 300, "category": "medium"}
+    PADRAO_ALTERNATIVA = {"calories": 200, "category": "good"}
+
+    def __init__(self, foods_data):
+        foods = foods_data.get('foods', {})
+        alternatives = foods_data.get('alternatives', {})
+        self._entradas = {
+            nome: self._compilar(nome, foods, alternatives)
+            for nome in {*foods, *alternatives}
+        }
+
+    def _compilar(self, nome, foods, alternatives) -> FoodEntry:
+        info = foods.get(nome, self.PADRAO)
+        entrada = FoodEntry(
+            nome=nome,
+            calorias=info["calories"],
+            categoria=info["category"],
+            densidade=densidade_alimento(nome),
+            porcao=calcular_peso_porcao(nome, info["calories"]),
+        )
+        alternativas = alternatives.get(nome)
+        if not alternativas:
+            return entrada
+        alt = alternativas[0]
+        alt_info = foods.get(alt, self.PADRAO_ALTERNATIVA)
+        return entrada._replace(
+            alternativa=alt,
+            alternativa_calorias=alt_info["calories"],
+            alternativa_porcao=calcular_peso_porcao(alt, alt_info["calories"]),
+            economia_calorias=info["calories"] - alt_info["calories"],
+        )
+
+    def __contains__(self, nome) -> bool:
+        return nome in self._entradas
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def get(self, nome: str) -> FoodEntry:
+        entrada = self._entradas.get(nome)
+        if entrada is None:
+            # Alimento fora do catálogo: não é memorizado para não crescer sem limite
+            entrada = self._compilar(nome, {}, {})
+        return entrada
+
 
 def calcular_calorias_consumidas(alimentos_selecionados: dict) -> dict:
-    foods_data = load_foods_data()
-    foods = foods_data.get('foods', {})
+    indice = catalogo.snapshot().indice
     
     total_consumido = 0
     recomendacoes = []
@@ -68,185 +290,481 @@ def calcular_calorias_consumidas(alimentos_selecionados: dict) -> dict:
     
     for refeicao, alimentos in alimentos_selecionados.items():
         for alimento in alimentos:
-            food_info = foods.get(alimento, {"calories": 300, "category": "medium"})
-            total_consumido += food_info["calories"]
+            info = indice.get(alimento)
+            total_consumido += info.calorias
             
-            if food_info["category"] in ["bad", "medium"]:
-                alternativas = foods_data.get('alternatives', {}).get(alimento, [])
-                if alternativas:
-                    alt_principal = alternativas[0]
-                    alt_info = foods.get(alt_principal, {"calories": 200, "category": "good"})
-                    
-                    peso_original = calcular_peso_porcao(alimento, food_info["calories"])
-                    peso_alternativa = calcular_peso_porcao(alt_principal, alt_info["calories"])
-                    
-                    economia_calorias = food_info["calories"] - alt_info["calories"]
-                    
-                    recomendacoes.append({
-                        "refeicao": refeicoes_nomes.get(refeicao, refeicao.title()),
-                        "original": alimento,
-                        "original_calorias": food_info["calories"],
-                        "original_peso": peso_original,
-                        "alternativa": alt_principal,
-                        "alternativa_calorias": alt_info["calories"],
-                        "alternativa_peso": peso_alternativa,
-                        "economia_calorias": economia_calorias,
-                        "categoria_original": food_info["category"]
-                    })
+            if info.categoria in ["bad", "medium"] and info.alternativa is not None:
+                recomendacoes.append({
+                    "refeicao": refeicoes_nomes.get(refeicao, refeicao.title()),
+                    "original": alimento,
+                    "original_calorias": info.calorias,
+                    "original_peso": info.porcao,
+                    "alternativa": info.alternativa,
+                    "alternativa_calorias": info.alternativa_calorias,
+                    "alternativa_peso": info.alternativa_porcao,
+                    "economia_calorias": info.economia_calorias,
+                    "categoria_original": info.categoria
+                })
     
     return {"total_consumido": total_consumido, "recomendacoes": recomendacoes}
 
+LEADS_BACKEND = os.environ.get('LEADS_BACKEND', 'csv')
+LEADS_PATH = os.environ.get('LEADS_PATH', 'data/leads.csv')
+LEADS_DB_PATH = os.environ.get('LEADS_DB_PATH', 'data/leads.db')
+lead_writer = LeadWriter(
+    criar_lead_sink(
+        LEADS_BACKEND, LEADS_PATH, LEADS_DB_PATH,
+        rotacao_bytes=int(os.environ.get('LEADS_ROTATE_BYTES', '0')),
+        rotacao_diaria=os.environ.get('LEADS_ROTATE_DAILY', '').lower() in ('1', 'true', 'sim'),
+        compressao=os.environ.get('LEADS_COMPRESSION', 'gzip'),
+    ),
+    tamanho_lote=int(os.environ.get('LEADS_BATCH_SIZE', '100')),
+    intervalo=float(os.environ.get('LEADS_FLUSH_INTERVAL', '1.0')),
+    intervalo_fsync=float(os.environ.get('LEADS_FSYNC_INTERVAL', '5.0')),
+)
+
+# Envios repetidos (duplo clique, retry) dentro da janela não viram lead novo
+LEADS_DEDUP_WINDOW = float(os.environ.get('LEADS_DEDUP_WINDOW', '300'))
+LEADS_DEDUP_BLOOM = os.environ.get('LEADS_DEDUP_BLOOM')
+deduplicador = None
+if LEADS_DEDUP_WINDOW > 0:
+    deduplicador = LeadDeduplicator(
+        LEADS_DEDUP_WINDOW, BloomFilter(path=LEADS_DEDUP_BLOOM) if LEADS_DEDUP_BLOOM else None
+    )
+    deduplicador.carregar(linhas_recentes(LEADS_BACKEND, LEADS_PATH, LEADS_DB_PATH, 2 * LEADS_DEDUP_WINDOW))
+
 def salvar_lead(respostas: dict):
+    # Só enfileira; a gravação em disco fica com a thread do lead_writer
     try:
-        os.makedirs('data', exist_ok=True)
-        csv_path = 'data/leads.csv'
-        file_exists = os.path.exists(csv_path)
-        
-        with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(['timestamp', 'nome', 'email', 'whatsapp', 'objetivo', 'atividade', 'peso', 'altura', 'idade'])
-            writer.writerow([
-                datetime.datetime.now().isoformat(),
-                respostas.get('nome', ''), respostas.get('email', ''), respostas.get('whatsapp', ''),
-                respostas.get('objetivo', ''), respostas.get('atividade', ''),
-                respostas.get('peso', ''), respostas.get('altura', ''), respostas.get('idade', '')
-            ])
+        if deduplicador is not None and not deduplicador.registrar(respostas): return
+        lead_writer.enviar(linha_lead(respostas))
     except: pass
 
-def calcular_peso_ideal(altura_cm: float, sexo: str) -> float:
-    return (50 if sexo == 'masculino' else 45.5) + 2.3 * ((altura_cm - 152.4) / 2.54)
-
-def calcular_agua_diaria(peso_kg: float) -> float:
-    return peso_kg * 35
-
-def mifflin_st_jeor(sexo: str, peso_kg: float, altura_cm: float, idade: int) -> float:
-    s = 5 if sexo == 'masculino' else -161
-    return 10 * peso_kg + 6.25 * altura_cm - 5 * idade + s
+ALVO_KCAL_CACHE_SIZE = int(os.environ.get('ALVO_KCAL_CACHE_SIZE', '4096'))
 
-
-def calcular_imc(peso: float, altura_cm: float) -> dict:
-    imc = peso / ((altura_cm / 100) ** 2)
+@lru_cache(maxsize=ALVO_KCAL_CACHE_SIZE)
+def _calcular_alvo_kcal(sexo: str, peso: float, altura: float, idade: float, atividade: str, objetivo: str):
+    bmr = mifflin_st_jeor(sexo, peso, altura, idade)
+    tdee = bmr * RULES['atividade'].get(atividade, 1.2)
+    alvo = int(round(tdee * (1 + RULES['objetivos'][objetivo])))
+    imc_info = calcular_imc(peso, altura)
     
-    if imc < 18.5: return {"valor": round(imc, 1), "categoria": "abaixo", "status": "Abaixo do Peso", "cor": "#3498db", "posicao": 15}
-    elif imc < 25: return {"valor": round(imc, 1), "categoria": "normal", "status": "Normal", "cor": "#27ae60", "posicao": 40}
-    elif imc < 30: return {"valor": round(imc, 1), "categoria": "sobrepeso", "status": "Sobrepeso", "cor": "#f39c12", "posicao": 70}
-    else: return {"valor": round(imc, 1), "categoria": "obeso", "status": "Obeso", "cor": "#e74c3c", "posicao": 90}
-
-def gerar_frase_motivacional(objetivo: str, imc_info: dict) -> str:
-    frases = {
-        "emagrecer": "Seu corpo pode se transformar e definir ao mesmo tempo",
-        "manter": "Seu corpo pode se manter equilibrado e saudável", 
-        "ganhar": "Seu corpo pode definir e crescer ao mesmo tempo"
-    }
-    return frases[objetivo]
-
-def calcular_alvo_kcal(respostas: dict) -> dict:
-    bmr = mifflin_st_jeor(respostas['sexo'], respostas['peso'], respostas['altura'], respostas['idade'])
-    tdee = bmr * RULES['atividade'].get(respostas['atividade'], 1.2)
-    alvo = int(round(tdee * (1 + RULES['objetivos'][respostas['objetivo']])))
-    imc_info = calcular_imc(respostas['peso'], respostas['altura'])
-    
-    return {
+    return MappingProxyType({
         "bmr": int(bmr), 
         "tdee": int(tdee), 
         "alvo": alvo,
-        "imc": imc_info,
-        "frase_motivacional": gerar_frase_motivacional(respostas['objetivo'], imc_info)
-    }
+        "imc": MappingProxyType(imc_info),
+        "frase_motivacional": gerar_frase_motivacional(objetivo, imc_info)
+    })
+
+def calcular_alvo_kcal(respostas: dict) -> dict:
+    # Chave normalizada: "80", 80 e 80.0 caem na mesma entrada do cache
+    metas = _calcular_alvo_kcal(
+        str(respostas['sexo']), float(respostas['peso']), float(respostas['altura']),
+        float(respostas['idade']), respostas['atividade'], respostas['objetivo']
+    )
+    # O cache guarda versões somente leitura; quem chama recebe uma cópia
+    return {**metas, "imc": dict(metas["imc"])}
+
+calcular_alvo_kcal.cache_info = _calcular_alvo_kcal.cache_info
+calcular_alvo_kcal.cache_clear = _calcular_alvo_kcal.cache_clear
 
 
+@lru_cache(maxsize=None)
+def _numpy():
+    # Importado no primeiro lote, não com o quiz: o numpy pesa ~60 ms no cold start
+    try:
+        import numpy
+    except ImportError:  # opcional: só acelera calcular_metas_lote
+        return None
+    return numpy
+
+def _mapear_coluna(valores, tabela: dict, padrao=None):
+    np = _numpy()
+    unicos, inverso = np.unique(np.asarray(valores, dtype=str), return_inverse=True)
+    if padrao is None:
+        fatores = np.array([tabela[u] for u in unicos], dtype=float)
+    else:
+        fatores = np.array([tabela.get(u, padrao) for u in unicos], dtype=float)
+    return fatores[inverso.reshape(-1)]
+
+def _metas_lote_numpy(sexo, peso, altura, idade, atividade, objetivo) -> dict:
+    np = _numpy()
+    peso = np.asarray(peso, dtype=float)
+    altura = np.asarray(altura, dtype=float)
+    idade = np.asarray(idade, dtype=float)
+    s = np.where(np.asarray(sexo, dtype=str) == 'masculino', 5, -161)
+
+    # Mesma ordem de operações de mifflin_st_jeor/calcular_alvo_kcal, para
+    # que os floats (e os arredondamentos) sejam idênticos aos do cálculo escalar
+    bmr = 10 * peso + 6.25 * altura - 5 * idade + s
+    tdee = bmr * _mapear_coluna(atividade, RULES['atividade'], padrao=1.2)
+    fator_objetivo = {k: 1 + v for k, v in RULES['objetivos'].items()}
+    alvo = np.rint(tdee * _mapear_coluna(objetivo, fator_objetivo))
+    imc = peso / ((altura / 100) ** 2)
+
+    return {
+        "bmr": bmr.astype(np.int64),
+        "tdee": tdee.astype(np.int64),
+        "alvo": alvo.astype(np.int64),
+        # np.round(x, 1) escala por 10 e pode divergir de round() em casos de
+        # empate; o round do Python garante o mesmo valor de calcular_imc
+        "imc": np.array([round(v, 1) for v in imc.tolist()]),
+        "imc_categoria": np.select(
+            [imc < 18.5, imc < 25, imc < 30], ["abaixo", "normal", "sobrepeso"], "obeso"
+        ),
+    }
+
+def _metas_lote_python(sexo, peso, altura, idade, atividade, objetivo) -> dict:
+    resultado = {"bmr": [], "tdee": [], "alvo": [], "imc": [], "imc_categoria": []}
+    for linha in zip(sexo, peso, altura, idade, atividade, objetivo):
+        metas = calcular_alvo_kcal(dict(zip(('sexo', 'peso', 'altura', 'idade', 'atividade', 'objetivo'), linha)))
+        resultado["bmr"].append(metas["bmr"])
+        resultado["tdee"].append(metas["tdee"])
+        resultado["alvo"].append(metas["alvo"])
+        resultado["imc"].append(metas["imc"]["valor"])
+        resultado["imc_categoria"].append(metas["imc"]["categoria"])
+    return resultado
+
+def calcular_metas_lote(sexo, peso, altura, idade, atividade, objetivo) -> dict:
+    """Versão em colunas de calcular_alvo_kcal, para reprocessar muitos leads.
+
+    Recebe uma sequência por campo e devolve as colunas bmr, tdee, alvo, imc e
+    imc_categoria, com os mesmos valores do cálculo linha a linha. Usa NumPy
+    quando instalado (arrays) e cai para Python puro (listas) caso contrário.
+    """
+    if _numpy() is not None:
+        return _metas_lote_numpy(sexo, peso, altura, idade, atividade, objetivo)
+    return _metas_lote_python(sexo, peso, altura, idade, atividade, objetivo)
 
 
-def calcular_quantidade_alimento(alimento: str, kcal_desejadas: int, foods_data: dict) -> dict:
+def calcular_quantidade_alimento(alimento: str, kcal_desejadas: int, foods_data: dict,
+                                 escala: PortionScale = ESCALA_QUANTIDADE) -> dict:
     food_info = foods_data.get('foods', {}).get(alimento, {"calories": 300, "category": "medium"})
-    kcal_por_100g = food_info["calories"]
+    return calcular_quantidade_por_kcal(food_info["calories"], kcal_desejadas, escala)
+
+def calcular_quantidade_por_kcal(kcal_por_100g: int, kcal_desejadas: int,
+                                 escala: PortionScale = ESCALA_QUANTIDADE) -> dict:
     gramas_necessarias = (kcal_desejadas * 100) / kcal_por_100g
     
-    if gramas_necessarias <= 15:
-        quantidade = f"{round(gramas_necessarias)} g (1 colher sopa)"
-    elif gramas_necessarias <= 30:
-        quantidade = f"{round(gramas_necessarias)} g (2 colheres sopa)"
-    elif gramas_necessarias <= 50:
-        quantidade = f"{round(gramas_necessarias)} g (1/2 xícara)"
-    elif gramas_necessarias <= 100:
-        quantidade = f"{round(gramas_necessarias)} g (1 xícara)"
-    elif gramas_necessarias <= 150:
-        quantidade = f"{round(gramas_necessarias)} g (1 prato sobremesa)"
-    elif gramas_necessarias <= 200:
-        quantidade = f"{round(gramas_necessarias)} g (1 prato raso)"
-    else:
-        quantidade = f"{round(gramas_necessarias)} g (1 prato fundo)"
-    
     return {
         "gramas": round(gramas_necessarias),
-        "quantidade": quantidade,
+        "quantidade": escala.rotulo(gramas_necessarias),
         "kcal_real": round((gramas_necessarias * kcal_por_100g) / 100)
     }
 
+DISTRIBUICAO_REFEICOES = {"cafe": 0.25, "almoco": 0.35, "lanche": 0.15, "jantar": 0.25}
+PLANO_CACHE_SIZE = int(os.environ.get('PLANO_CACHE_SIZE', '2048'))
+planos_cache = LRUCache(PLANO_CACHE_SIZE)
+
 def montar_refeicoes(alvo_kcal: int, alimentos_selecionados: dict = None) -> dict:
-    distribuicao = {"cafe": 0.25, "almoco": 0.35, "lanche": 0.15, "jantar": 0.25}
-    foods_data = load_foods_data()
-    
+    snapshot = catalogo.snapshot()
+    if not isinstance(alimentos_selecionados, dict):  # JSON malformado (lista, texto): nenhuma seleção
+        alimentos_selecionados = {}
+    # Só os blocos da distribuição entram no plano; a ordem dos alimentos é mantida
+    selecao = tuple(tuple(alimentos_selecionados.get(bloco) or ()) for bloco in DISTRIBUICAO_REFEICOES)
+    chave = (snapshot.versao, alvo_kcal, selecao)
+    try:
+        plano = planos_cache.get(chave)
+    except TypeError:  # alimento não "hasheável" (JSON malformado): calcula sem cache
+        return _montar_refeicoes(snapshot.indice, alvo_kcal, selecao)
+    if plano is None:
+        plano = _montar_refeicoes(snapshot.indice, alvo_kcal, selecao)
+        planos_cache.set(chave, plano)
+    # Cópia rasa por opção: quem chama pode alterar o plano sem afetar o cache
+    return {
+        bloco: {"meta_kcal": dados["meta_kcal"], "opcoes": [dict(op) for op in dados["opcoes"]]}
+        for bloco, dados in plano.items()
+    }
+
+def _montar_refeicoes(indice: 'FoodIndex', alvo_kcal: int, selecao: tuple) -> dict:
     plano = {}
-    for bloco, pct in distribuicao.items():
+    for (bloco, pct), alimentos in zip(DISTRIBUICAO_REFEICOES.items(), selecao):
         meta = int(alvo_kcal * pct)
         opcoes = []
         
-        if alimentos_selecionados and bloco in alimentos_selecionados:
-            alimentos = alimentos_selecionados[bloco]
-            if alimentos:
-                kcal_por_alimento = meta // len(alimentos)
+        if alimentos:
+            kcal_por_alimento = meta // len(alimentos)
+            
+            for alimento in alimentos:
+                info = indice.get(alimento)
+                quantidade_info = calcular_quantidade_por_kcal(info.calorias, kcal_por_alimento)
                 
-                for alimento in alimentos:
-                    food_info = foods_data.get('foods', {}).get(alimento, {"calories": 300, "category": "medium"})
-                    quantidade_info = calcular_quantidade_alimento(alimento, kcal_por_alimento, foods_data)
-                    
-                    opcoes.append({
-                        "descricao": alimento,
-                        "kcal": quantidade_info["kcal_real"],
-                        "quantidade": quantidade_info["quantidade"],
-                        "gramas": quantidade_info["gramas"],
-                        "category": food_info["category"]
-                    })
+                opcoes.append({
+                    "descricao": alimento,
+                    "kcal": quantidade_info["kcal_real"],
+                    "quantidade": quantidade_info["quantidade"],
+                    "gramas": quantidade_info["gramas"],
+                    "category": info.categoria
+                })
         
         plano[bloco] = {"meta_kcal": meta, "opcoes": opcoes}
     return plano
 
 
+# Mudar sempre que o layout de gerar_pdf mudar: invalida os PDFs em cache
+PDF_TEMPLATE_VERSION = 1
+PDF_CAMPOS = ('nome', 'objetivo', 'peso', 'altura', 'idade')
+
+# Com o nível em disco, o PDF é renderizado direto no arquivo do cache e
+# enviado de lá em blocos, sem passar pela memória do worker web. O disco é
+# limitado por tamanho e por tempo sem uso (limpeza em thread, a cada
+# PDF_CACHE_SWEEP_INTERVAL segundos)
+pdf_cache = ByteCache(
+    int(os.environ.get('PDF_CACHE_BYTES', str(32 * 1024 * 1024))),
+    os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'quiz_pdfs')) or None,
+    max_bytes_disco=int(os.environ.get('PDF_CACHE_DISK_BYTES', str(512 * 1024 * 1024))),
+    max_idade=float(os.environ.get('PDF_CACHE_MAX_AGE', str(7 * 24 * 3600))),
+)
+PDF_CACHE_SWEEP_INTERVAL = float(os.environ.get('PDF_CACHE_SWEEP_INTERVAL', '600'))
+
+def chave_pdf(plano: dict, respostas: dict, metas: dict) -> str:
+    """Hash de tudo o que aparece no PDF; serve de chave do cache e de ETag."""
+    conteudo = {
+        "versao": PDF_TEMPLATE_VERSION,
+        "plano": plano,
+        "respostas": {campo: respostas.get(campo) for campo in PDF_CAMPOS},
+        "alvo": metas['alvo'],
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
 def gerar_pdf(plano: dict, respostas: dict, metas: dict) -> bytes:
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Cabeçalho
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(2*cm, height - 2*cm, "Plano Personalizado")
-
-    # Dados principais
-    c.setFont("Helvetica", 11)
-    y = height - 3*cm
-    c.drawString(2*cm, y, f"Nome: {respostas.get('nome','-')}")
-    y -= 0.5*cm
-    c.drawString(2*cm, y, f"Objetivo: {respostas['objetivo'].title()} | Alvo: {metas['alvo']} kcal")
-    y -= 0.5*cm
-    c.drawString(2*cm, y, f"Peso: {respostas['peso']} kg | Altura: {respostas['altura']} cm | Idade: {respostas['idade']}")
-
-    # Refeições
-    titulos = {"cafe": "Café da Manhã", "almoco": "Almoço", "lanche": "Lanche", "jantar": "Jantar"}
-    for bloco in ["cafe", "almoco", "lanche", "jantar"]:
-        y -= 1*cm
-        if y < 4*cm: c.showPage(); y = height - 2*cm
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(2*cm, y, f"{titulos[bloco]} ({plano[bloco]['meta_kcal']} kcal)")
-        y -= 0.5*cm
-        c.setFont("Helvetica", 10)
-        for op in plano[bloco]['opcoes']:
-            c.drawString(2.2*cm, y, f"{op['descricao']} - {op['quantidade']} ({op['kcal']} kcal)")
-            y -= 0.4*cm
-
-    c.save()
-    return buffer.getvalue()
+    # Import tardio: o ReportLab só é carregado quando o primeiro PDF é pedido
+    import pdf_plano
+    return pdf_plano.gerar_pdf(plano, respostas, metas)
+
+
+class PdfPoolSaturado(Exception):
+    pass
+
+
+class PdfPool:
+    """Renderiza PDFs fora do processo web, com concorrência e fila limitadas.
+
+    ReportLab é CPU-bound e segura o GIL; num processo separado um PDF lento
+    não trava as outras requisições. Até `processos + max_fila` PDFs podem
+    estar em andamento; além disso renderizar() levanta PdfPoolSaturado.
+    Com `processos=0` renderiza na própria thread (útil em testes).
+
+    Com `aquecer=True`, cada processo roda pdf_plano.aquecer() ao subir e o
+    resultado aparece em info()["aquecimento"].
+
+    O executor é de um processo só: num filho de fork (gunicorn --preload) o
+    herdado não tem a thread que o gerencia, e o filho monta o seu.
+    """
+
+    def __init__(self, processos: int = 2, max_fila: int = 8, aquecer: bool = False):
+        self.processos = processos
+        self.max_fila = max_fila
+        self.aquecer = aquecer
+        self.aquecimentos = []
+        self._relatorios = None
+        self._vagas = threading.BoundedSemaphore(max(processos, 1) + max_fila)
+        self._executor = None
+        self._pid = os.getpid()
+        self._herdados = []
+        self._aquecimento = None
+        self._lock = threading.Lock()
+        self.em_andamento = 0
+        self.recusados = 0
+        self.renderizados = 0
+        self.tempo_total = 0.0
+        self.tempo_max = 0.0
+
+    def _novo_processo(self):
+        # Chamado com o lock: o que veio do pai (executor, vagas ocupadas por
+        # PDFs dele, aquecimentos) não vale aqui. O executor herdado não pode ser
+        # fechado no filho, então só fica referenciado
+        if self._executor is not None:
+            self._herdados.append(self._executor)
+        self._executor = None
+        self._relatorios = None
+        self.aquecimentos = []
+        self._vagas = threading.BoundedSemaphore(max(self.processos, 1) + self.max_fila)
+        self.em_andamento = 0
+        self._pid = os.getpid()
+
+    def _pool(self):
+        # Criado no primeiro uso de cada processo
+        with self._lock:
+            if self._pid != os.getpid():
+                self._novo_processo()
+            if self._executor is None:
+                import pdf_plano
+                if self.aquecer:
+                    self._relatorios = multiprocessing.SimpleQueue()
+                    self._executor = ProcessPoolExecutor(
+                        self.processos, initializer=pdf_plano.aquecer_worker, initargs=(self._relatorios,))
+                else:
+                    self._executor = ProcessPoolExecutor(self.processos)
+            return self._executor
+
+    def iniciar(self) -> list:
+        """Sobe (e aquece) os processos agora, em vez de no primeiro PDF.
+
+        Retorna os relatórios de aquecimento, um por processo.
+        """
+        if self.processos <= 0:
+            if self.aquecer:
+                import pdf_plano
+                self.aquecimentos.append(pdf_plano.aquecer())
+            return list(self.aquecimentos)
+        pool = self._pool()
+        # Cada submit sem processo ocioso sobe um processo novo. os.getpid e não
+        # uma função deste módulo: se iniciar() rodar durante o import do quiz,
+        # o filho travaria tentando importá-lo de novo
+        for futuro in [pool.submit(os.getpid) for _ in range(self.processos)]:
+            futuro.result()
+        if self.aquecer:
+            # Um relatório por processo; um deles pode ainda estar aquecendo
+            with self._lock:
+                esperados = self.processos - len(self.aquecimentos)
+            for _ in range(esperados):
+                relatorio = self._relatorios.get()
+                with self._lock:
+                    self.aquecimentos.append(relatorio)
+        return self._coletar_aquecimentos()
+
+    def iniciar_em_segundo_plano(self) -> threading.Thread:
+        """iniciar() numa thread daemon, uma vez por processo; os relatórios vão para o stderr."""
+        with self._lock:
+            if self._aquecimento is not None and self._aquecimento[0] == os.getpid():
+                return self._aquecimento[1]
+            thread = threading.Thread(target=self._aquecer_e_relatar, name='pdf-warmup', daemon=True)
+            thread.start()
+            self._aquecimento = (os.getpid(), thread)
+            return thread
+
+    def _aquecer_e_relatar(self):
+        try:
+            for relatorio in self.iniciar():
+                print(f"Aquecimento do PDF: {relatorio}", file=sys.stderr)
+        except Exception as e:
+            print(f"Aquecimento do PDF falhou: {e}", file=sys.stderr)
+
+    def _coletar_aquecimentos(self) -> list:
+        with self._lock:
+            while self._relatorios is not None and not self._relatorios.empty():
+                self.aquecimentos.append(self._relatorios.get())
+            return list(self.aquecimentos)
+
+    def _ocupar(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._novo_processo()
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                self.recusados += 1
+            raise PdfPoolSaturado()
+        with self._lock:
+            self.em_andamento += 1
+
+    def _liberar(self, _futuro=None):
+        with self._lock:
+            self.em_andamento -= 1
+        self._vagas.release()
+
+    def _descartar(self, pool):
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _no_pool(self, funcao, args: tuple, timeout: float = None):
+        self._ocupar()
+        pool = self._pool()
+        try:
+            futuro = pool.submit(funcao, *args)
+        except BrokenProcessPool:
+            self._liberar()
+            self._descartar(pool)
+            raise
+        # A vaga só volta quando o processo termina, mesmo que quem pediu já
+        # tenha desistido no timeout: o executor nunca acumula além do limite
+        futuro.add_done_callback(self._liberar)
+        try:
+            return futuro.result(timeout)
+        except BrokenProcessPool:
+            self._descartar(pool)
+            raise
+
+    def _executar(self, funcao: str, args: tuple, timeout: float = None):
+        import pdf_plano
+        funcao = getattr(pdf_plano, funcao)
+        if self.processos <= 0:
+            self._ocupar()
+            try:
+                resultado, duracao = funcao(*args)
+            finally:
+                self._liberar()
+        else:
+            try:
+                resultado, duracao = self._no_pool(funcao, args, timeout)
+            except BrokenProcessPool:
+                # Um processo do pool morreu (OOM, kill): tenta uma vez num pool novo
+                resultado, duracao = self._no_pool(funcao, args, timeout)
+        with self._lock:
+            self.renderizados += 1
+            self.tempo_total += duracao
+            self.tempo_max = max(self.tempo_max, duracao)
+        return resultado
+
+    def renderizar(self, plano: dict, respostas: dict, metas: dict, timeout: float = None) -> bytes:
+        return self._executar('renderizar', (plano, respostas, metas), timeout)
+
+    def renderizar_arquivo(self, plano: dict, respostas: dict, metas: dict, caminho: str, timeout: float = None) -> int:
+        """Renderiza direto em `caminho`; do processo do pool só volta o tamanho."""
+        return self._executar('renderizar_arquivo', (plano, respostas, metas, caminho), timeout)
+
+    def fechar(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def info(self) -> dict:
+        aquecimento = self._coletar_aquecimentos()
+        with self._lock:
+            return {
+                "aquecimento": aquecimento,
+                "processos": self.processos,
+                "em_andamento": self.em_andamento,
+                "fila": max(0, self.em_andamento - max(self.processos, 1)),
+                "max_fila": self.max_fila,
+                "recusados": self.recusados,
+                "renderizados": self.renderizados,
+                "tempo_medio_ms": round(self.tempo_total / self.renderizados * 1000, 1) if self.renderizados else None,
+                "tempo_max_ms": round(self.tempo_max * 1000, 1),
+            }
+
+
+PDF_WARMUP = os.environ.get('PDF_WARMUP', '').lower() in ('1', 'true', 'sim')
+pdf_pool = PdfPool(int(os.environ.get('PDF_WORKERS', '2')), int(os.environ.get('PDF_QUEUE_SIZE', '8')), PDF_WARMUP)
+PDF_TIMEOUT = float(os.environ.get('PDF_TIMEOUT', '30'))
+PDF_RETRY_AFTER = os.environ.get('PDF_RETRY_AFTER', '5')
+atexit.register(pdf_pool.fechar)
+
+
+def _renderizar_job(plano: dict, respostas: dict, metas: dict) -> bytes:
+    # Jobs não recebem 503: esperam vaga no pool
+    while True:
+        try:
+            return pdf_pool.renderizar(plano, respostas, metas, PDF_TIMEOUT)
+        except PdfPoolSaturado:
+            time.sleep(0.2)
+
+
+# Jobs assíncronos de PDF; com Redis, PDF_JOBS_THREADS=0 deixa o consumo só
+# para os workers dedicados (python fila_pdf.py redis://...)
+fila_pdf = criar_fila_pdf(
+    os.environ.get('PDF_JOBS_QUEUE', 'memory://'),
+    int(os.environ.get('PDF_JOBS_QUEUE_SIZE', '100')),
+    float(os.environ.get('PDF_JOBS_TTL', '3600')),
+    pdfs=pdf_cache,
+)
+pdf_worker = PdfJobWorker(fila_pdf, _renderizar_job, int(os.environ.get('PDF_JOBS_THREADS', str(max(pdf_pool.processos, 1)))))
 
 
 # -------------------------
@@ -260,74 +778,7 @@ FINAL_PLAN_HTML = """
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1" />
   <title>Seu Plano Completo</title>
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-      background: linear-gradient(135deg, #f6f7f9 0%, #f1f3f6 100%);
-      margin: 0; padding: 20px; line-height: 1.6; color: #2c3e50;
-    }
-    .container { max-width: 1200px; margin: 0 auto; }
-    .card {
-      background: #fff; border-radius: 16px;
-      box-shadow: 0 8px 25px rgba(0,0,0,.1);
-      padding: 32px; margin-bottom: 24px;
-    }
-    .header {
-      text-align: center; margin-bottom: 32px;
-      padding: 24px; background: linear-gradient(135deg, #ff8c00, #ffa500);
-      border-radius: 16px; color: white;
-    }
-    .metrics {
-      display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-      gap: 16px; margin-bottom: 32px;
-    }
-    .metric {
-      text-align: center; padding: 20px;
-      background: linear-gradient(135deg, #f8f9fa, #e9ecef);
-      border-radius: 12px; border: 2px solid #ff8c00;
-    }
-    .metric-value { font-size: 24px; font-weight: bold; color: #ff8c00; }
-    .metric-label { font-size: 14px; color: #666; margin-top: 8px; }
-    .analysis-card {
-      background: linear-gradient(135deg, #fff6ea, #fef9f0);
-      border: 2px solid #ff8c00; border-radius: 16px;
-      padding: 24px; margin-bottom: 24px;
-    }
-    .meal-analysis {
-      display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-      gap: 20px; margin-bottom: 32px;
-    }
-    .meal-card {
-      background: #f8f9fa; border-radius: 12px;
-      padding: 20px; border-left: 4px solid #ff8c00;
-    }
-    .meal-title { font-weight: 600; color: #2c3e50; margin-bottom: 12px; }
-    .food-item {
-      display: flex; justify-content: space-between; align-items: center;
-      padding: 8px 12px; margin: 6px 0;
-      background: white; border-radius: 6px;
-    }
-    .food-item.good { border-left: 3px solid #28a745; }
-    .food-item.medium { border-left: 3px solid #ffc107; }
-    .food-item.bad { border-left: 3px solid #dc3545; }
-    .btn {
-      background: linear-gradient(135deg, #ff8c00, #ffa500);
-      color: white; padding: 16px 32px; border: none;
-      border-radius: 12px; font-size: 16px; font-weight: 600;
-      cursor: pointer; text-decoration: none; display: inline-block;
-      text-align: center; margin: 16px 8px;
-    }
-    .btn:hover { transform: translateY(-2px); }
-    .progress-bar {
-      background: #e9ecef; border-radius: 10px; height: 20px;
-      overflow: hidden; margin: 16px 0;
-    }
-    .progress-fill {
-      height: 100%; border-radius: 10px;
-      transition: width 0.3s ease;
-    }
-  </style>
+  <link rel="stylesheet" href="{{ asset_url('plano.css') }}" />
 </head>
 <body>
   <div class="container">
@@ -495,7 +946,7 @@ FINAL_PLAN_HTML = """
     <div class="card" style="text-align: center;">
       <h2>📄 Baixe seu Plano</h2>
       <p>Tenha sempre em mãos seu plano personalizado</p>
-      <a href="/gerar-pdf/current" class="btn">📄 Baixar PDF Completo</a>
+      <a href="/gerar-pdf/{{ session_id }}" class="btn">📄 Baixar PDF Completo</a>
       <a href="/" class="btn" style="background: #6c757d;">🏠 Criar Novo Plano</a>
     </div>
   </div>
@@ -510,623 +961,7 @@ INDEX_HTML = """
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1" />
   <title>Quiz → Plano → PDF</title>
-  <style>
-    * { box-sizing: border-box; }
-    body {
-      font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
-      background: linear-gradient(135deg, #f6f7f9 0%, #f1f3f6 100%);
-      margin: 0;
-      padding: 0;
-      line-height: 1.6;
-      color: #2c3e50;
-    }
-    .wrap {
-      max-width: 800px;
-      margin: 0 auto;
-      padding: 32px 24px;
-      min-height: 100vh;
-      display: flex;
-      align-items: center;
-      justify-content: center;
-    }
-    .card {
-      background: #fff;
-      border-radius: 24px;
-      box-shadow: 0 20px 60px rgba(0,0,0,.08), 0 8px 25px rgba(0,0,0,.06);
-      padding: 40px;
-      margin-bottom: 16px;
-      width: 100%;
-      position: relative;
-      overflow: hidden;
-      transition: all 0.3s ease;
-    }
-    .card::before {
-      content: '';
-      position: absolute;
-      top: 0;
-      left: 0;
-      right: 0;
-      height: 4px;
-      background: linear-gradient(90deg, #ff8c00, #ffa500);
-    }
-    .row { display: flex; gap: 20px; flex-wrap: wrap; margin-bottom: 24px; }
-    .col { flex: 1 1 200px; min-width: 200px; }
-    .btn {
-      background: linear-gradient(135deg, #ff8c00, #ffa500);
-      border: none;
-      color: #fff;
-      padding: 16px 24px;
-      border-radius: 12px;
-      font-weight: 600;
-      font-size: 16px;
-      cursor: pointer;
-      transition: all 0.3s ease;
-      box-shadow: 0 4px 15px rgba(255, 140, 0, 0.3);
-      position: relative;
-      overflow: hidden;
-    }
-    .btn:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 8px 25px rgba(255, 140, 0, 0.4);
-    }
-    .btn:active { transform: translateY(0); }
-    .btn.outline {
-      background: transparent;
-      color: #ff8c00;
-      border: 2px solid #ff8c00;
-      box-shadow: none;
-    }
-    .btn.outline:hover {
-      background: rgba(255, 140, 0, 0.05);
-      transform: translateY(-1px);
-    }
-    .hidden { display: none; }
-    input, select {
-      width: 100%;
-      padding: 16px 20px;
-      border-radius: 12px;
-      border: 2px solid #e3e6ec;
-      font-size: 16px;
-      transition: all 0.3s ease;
-      background: #fafbfc;
-      -webkit-appearance: none;
-      -moz-appearance: none;
-      appearance: none;
-      background-image: url('data:image/svg+xml;charset=US-ASCII,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 4 5"><path fill="%23666" d="M2 0L0 2h4zm0 5L0 3h4z"/></svg>');
-      background-repeat: no-repeat;
-      background-position: right 16px center;
-      background-size: 12px;
-      padding-right: 40px;
-    }
-    input:focus, select:focus {
-      outline: none;
-      border-color: #ff8c00;
-      background-color: #fff;
-      box-shadow: 0 0 0 3px rgba(255, 140, 0, 0.1);
-    }
-    select:focus {
-      background-image: url('data:image/svg+xml;charset=US-ASCII,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 4 5"><path fill="%23ff8c00" d="M2 0L0 2h4zm0 5L0 3h4z"/></svg>');
-    }
-    label {
-      display: block;
-      margin-bottom: 8px;
-      font-weight: 600;
-      color: #34495e;
-      font-size: 14px;
-      text-transform: uppercase;
-      letter-spacing: 0.5px;
-    }
-    h1 {
-      margin: 0 0 32px;
-      font-size: 32px;
-      font-weight: 700;
-      text-align: center;
-      background: linear-gradient(135deg, #2c3e50, #34495e);
-      -webkit-background-clip: text;
-      -webkit-text-fill-color: transparent;
-      background-clip: text;
-    }
-    h3 {
-      margin: 0 0 24px;
-      font-size: 24px;
-      font-weight: 600;
-      text-align: center;
-      color: #2c3e50;
-    }
-    small { color: #707786; font-size: 14px; }
-    .steps {
-      display: flex;
-      justify-content: center;
-      gap: 12px;
-      margin-bottom: 32px;
-      padding: 0 20px;
-    }
-    .dot {
-      width: 12px;
-      height: 12px;
-      border-radius: 50%;
-      background: #e3e6ec;
-      transition: all 0.3s ease;
-      position: relative;
-    }
-    .dot.active {
-      background: #ff8c00;
-      transform: scale(1.2);
-      box-shadow: 0 0 0 4px rgba(255, 140, 0, 0.2);
-    }
-    .dot.active::after {
-      content: '';
-      position: absolute;
-      top: 50%;
-      left: 50%;
-      transform: translate(-50%, -50%);
-      width: 6px;
-      height: 6px;
-      background: #fff;
-      border-radius: 50%;
-    }
-    .grid2 {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-      gap: 16px;
-      margin-bottom: 24px;
-    }
-    .option {
-      padding: 20px 24px;
-      border: 2px solid #e3e6ec;
-      border-radius: 16px;
-      cursor: pointer;
-      transition: all 0.3s ease;
-      text-align: center;
-      font-weight: 500;
-      font-size: 16px;
-      background: #fafbfc;
-      position: relative;
-      overflow: hidden;
-    }
-    .option:hover {
-      border-color: #ff8c00;
-      transform: translateY(-2px);
-      box-shadow: 0 8px 25px rgba(0,0,0,0.1);
-    }
-    .option.active {
-      border-color: #ff8c00;
-      background: #fff6ea;
-      transform: translateY(-2px);
-      box-shadow: 0 8px 25px rgba(255, 140, 0, 0.2);
-    }
-    .option.active::before {
-      content: '✓';
-      position: absolute;
-      top: 8px;
-      right: 12px;
-      color: #ff8c00;
-      font-weight: bold;
-      font-size: 18px;
-    }
-    .btn-group {
-      display: flex;
-      gap: 16px;
-      justify-content: center;
-      flex-wrap: wrap;
-      margin-top: 32px;
-    }
-    .fade-in {
-      animation: fadeIn 0.5s ease-in;
-    }
-    @keyframes fadeIn {
-      from { opacity: 0; transform: translateY(20px); }
-      to { opacity: 1; transform: translateY(0); }
-    }
-    .preview-card {
-      background: linear-gradient(135deg, #fff6ea, #fef9f0);
-      border: 2px solid #ff8c00;
-      border-radius: 16px;
-      padding: 24px;
-      margin: 20px 0;
-    }
-    .preview-card h4 {
-      color: #ff8c00;
-      margin: 0 0 16px;
-      font-size: 18px;
-      font-weight: 600;
-    }
-    .meal-section {
-      margin-bottom: 20px;
-      padding: 16px;
-      background: rgba(255, 255, 255, 0.7);
-      border-radius: 12px;
-    }
-    .meal-title {
-      font-weight: 600;
-      color: #2c3e50;
-      margin-bottom: 8px;
-      font-size: 16px;
-    }
-    .meal-options {
-      list-style: none;
-      padding: 0;
-      margin: 0;
-    }
-    .meal-options li {
-      padding: 4px 0;
-      color: #555;
-      font-size: 14px;
-    }
-    .meal-selection {
-      margin-bottom: 32px;
-      padding: 20px;
-      background: #f8f9fa;
-      border-radius: 16px;
-    }
-    .meal-selection h4 {
-      margin: 0 0 16px;
-      color: #2c3e50;
-      font-size: 18px;
-    }
-    .food-grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-      gap: 12px;
-    }
-    .food-item {
-      display: flex;
-      align-items: center;
-      padding: 12px 16px;
-      background: #fff;
-      border: 2px solid #e3e6ec;
-      border-radius: 12px;
-      cursor: pointer;
-      transition: all 0.3s ease;
-      font-weight: 500;
-      text-transform: none;
-      letter-spacing: normal;
-    }
-    .food-item:hover {
-      border-color: #ff8c00;
-      background: #fff6ea;
-    }
-    .food-item input {
-      margin-right: 12px;
-      width: auto;
-      padding: 0;
-    }
-    .food-item input:checked + span,
-    .food-item:has(input:checked) {
-      border-color: #ff8c00;
-      background: #fff6ea;
-      color: #ff8c00;
-    }
-    .food-categories {
-      display: flex;
-      flex-direction: column;
-      gap: 20px;
-    }
-    .category {
-      padding: 16px;
-      border-radius: 12px;
-      border: 2px solid;
-    }
-    .category.good {
-      border-color: #28a745;
-      background: linear-gradient(135deg, #f8fff9, #f0fff4);
-    }
-    .category.medium {
-      border-color: #ffc107;
-      background: linear-gradient(135deg, #fffef8, #fffbf0);
-    }
-    .category.bad {
-      border-color: #dc3545;
-      background: linear-gradient(135deg, #fff8f8, #fff0f0);
-    }
-    .category h5 {
-      margin: 0 0 12px;
-      font-size: 16px;
-      font-weight: 600;
-    }
-    .category.good h5 { color: #28a745; }
-    .category.medium h5 { color: #e67e22; }
-    .category.bad h5 { color: #dc3545; }
-    .food-item.good:hover {
-      border-color: #28a745;
-      background: #f0fff4;
-    }
-    .food-item.medium:hover {
-      border-color: #ffc107;
-      background: #fffbf0;
-    }
-    .food-item.bad:hover {
-      border-color: #dc3545;
-      background: #fff0f0;
-    }
-    .food-item.bad {
-      position: relative;
-    }
-    .food-item.bad::after {
-      content: '⚠️';
-      position: absolute;
-      right: 12px;
-      top: 50%;
-      transform: translateY(-50%);
-      font-size: 16px;
-    }
-    .alert {
-      position: fixed;
-      top: 20px;
-      right: 20px;
-      background: #dc3545;
-      color: white;
-      padding: 16px 20px;
-      border-radius: 12px;
-      box-shadow: 0 8px 25px rgba(220, 53, 69, 0.3);
-      z-index: 1000;
-      animation: slideIn 0.3s ease;
-      max-width: 300px;
-    }
-    .alert.warning {
-      background: #ffc107;
-      color: #333;
-    }
-    @keyframes slideIn {
-      from { transform: translateX(100%); opacity: 0; }
-      to { transform: translateX(0); opacity: 1; }
-    }
-    .calorie-calculator {
-      background: linear-gradient(135deg, #f8f9fa, #e9ecef);
-      border: 2px solid #ff8c00;
-      border-radius: 16px;
-      padding: 20px;
-      margin-bottom: 32px;
-      position: sticky;
-      top: 20px;
-      z-index: 100;
-    }
-    .calorie-calculator h4 {
-      margin: 0 0 16px;
-      color: #ff8c00;
-      text-align: center;
-      font-size: 18px;
-    }
-    .calorie-summary {
-      display: grid;
-      gap: 8px;
-    }
-    .calorie-item {
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      padding: 8px 12px;
-      background: rgba(255, 255, 255, 0.7);
-      border-radius: 8px;
-      font-size: 14px;
-    }
-    .calorie-total {
-      border-top: 2px solid #ff8c00;
-      margin-top: 8px;
-      padding-top: 12px;
-      font-weight: 600;
-      font-size: 16px;
-    }
-    .calorie-count {
-      font-weight: 600;
-      color: #2c3e50;
-    }
-    .calorie-count.total {
-      color: #ff8c00;
-      font-size: 18px;
-    }
-    .meal-name {
-      color: #555;
-    }
-    .motivation-section {
-      text-align: center;
-      margin-bottom: 32px;
-      padding: 24px;
-      background: linear-gradient(135deg, #fff6ea, #fef9f0);
-      border-radius: 16px;
-      border: 2px solid #ff8c00;
-    }
-    .motivation-text {
-      font-size: 16px;
-      line-height: 1.6;
-      color: #2c3e50;
-      margin: 16px 0 0;
-    }
-    .health-analysis {
-      background: #f8f9fa;
-      border-radius: 16px;
-      padding: 24px;
-      margin-bottom: 24px;
-      border: 2px solid #e9ecef;
-    }
-    .health-analysis h4 {
-      margin: 0 0 16px;
-      color: #2c3e50;
-      text-align: center;
-    }
-    .imc-info {
-      text-align: center;
-      margin-bottom: 20px;
-      font-size: 18px;
-    }
-    .health-bar {
-      margin: 20px 0;
-    }
-    .health-scale {
-      position: relative;
-      height: 12px;
-      border-radius: 6px;
-      overflow: hidden;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-      background: linear-gradient(to right, #3498db 25%, #27ae60 25% 50%, #f39c12 50% 75%, #e74c3c 75%);
-    }
-    .health-indicator {
-      position: absolute;
-      top: -4px;
-      width: 20px;
-      height: 20px;
-      background: #2c3e50;
-      border-radius: 50%;
-      border: 3px solid #fff;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-      transition: left 0.5s ease;
-      transform: translateX(-50%);
-    }
-    .scale-labels {
-      display: grid;
-      grid-template-columns: 1fr 1fr 1fr 1fr;
-      gap: 8px;
-      margin-top: 12px;
-      text-align: center;
-    }
-    .scale-label {
-      font-size: 11px;
-      font-weight: 600;
-      padding: 4px 8px;
-      border-radius: 8px;
-      color: white;
-      text-shadow: 0 1px 2px rgba(0,0,0,0.3);
-    }
-    .scale-label.abaixo { background: #3498db; }
-    .scale-label.normal { background: #27ae60; }
-    .scale-label.sobrepeso { background: #f39c12; }
-    .scale-label.obeso { background: #e74c3c; }
-    .profile-summary {
-      background: #fff;
-      border-radius: 16px;
-      padding: 24px;
-      margin-bottom: 24px;
-      border: 2px solid #e9ecef;
-    }
-    .profile-summary h4 {
-      margin: 0 0 20px;
-      color: #2c3e50;
-      text-align: center;
-    }
-    .profile-grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
-      gap: 16px;
-    }
-    .profile-item {
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      padding: 12px 16px;
-      background: #f8f9fa;
-      border-radius: 12px;
-      border: 1px solid #e9ecef;
-    }
-    .profile-label {
-      font-weight: 600;
-      color: #555;
-    }
-    .profile-value {
-      font-weight: 700;
-      color: #2c3e50;
-    }
-    .exclusive-plan {
-      background: linear-gradient(135deg, #fff6ea, #fef9f0);
-      border: 2px solid #ff8c00;
-      border-radius: 16px;
-      padding: 32px 24px;
-      margin: 24px 0;
-      text-align: center;
-    }
-    .plan-header h4 {
-      margin: 0 0 8px;
-      color: #ff8c00;
-      font-size: 24px;
-      font-weight: 700;
-    }
-    .plan-subtitle {
-      color: #666;
-      font-size: 16px;
-      margin: 0 0 32px;
-      line-height: 1.5;
-    }
-    .benefits-grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-      gap: 20px;
-      margin-bottom: 32px;
-    }
-    .benefit-item {
-      display: flex;
-      align-items: flex-start;
-      gap: 16px;
-      padding: 20px;
-      background: rgba(255, 255, 255, 0.8);
-      border-radius: 12px;
-      text-align: left;
-      border: 1px solid rgba(255, 140, 0, 0.2);
-    }
-    .benefit-icon {
-      font-size: 32px;
-      flex-shrink: 0;
-    }
-    .benefit-content h5 {
-      margin: 0 0 8px;
-      color: #2c3e50;
-      font-size: 16px;
-      font-weight: 600;
-    }
-    .benefit-content p {
-      margin: 0;
-      color: #666;
-      font-size: 14px;
-      line-height: 1.4;
-    }
-    .plan-highlight {
-      background: linear-gradient(135deg, #ff8c00, #ffa500);
-      color: white;
-      padding: 16px 24px;
-      border-radius: 12px;
-      font-size: 18px;
-      box-shadow: 0 4px 15px rgba(255, 140, 0, 0.3);
-    }
-    @media (max-width: 768px) {
-      .benefits-grid {
-        grid-template-columns: 1fr;
-        gap: 16px;
-      }
-      .benefit-item {
-        padding: 16px;
-      }
-      .exclusive-plan {
-        padding: 24px 16px;
-      }
-    }
-    .food-calories {
-      font-size: 12px;
-      color: #666;
-      font-weight: normal;
-      margin-left: auto;
-    }
-    .food-item {
-      display: flex;
-      align-items: center;
-      justify-content: space-between;
-      padding: 12px 16px;
-      background: #fff;
-      border: 2px solid #e3e6ec;
-      border-radius: 12px;
-      cursor: pointer;
-      transition: all 0.3s ease;
-      font-weight: 500;
-      text-transform: none;
-      letter-spacing: normal;
-    }
-    @media (max-width: 768px) {
-      .wrap { padding: 20px 16px; }
-      .card { padding: 24px 20px; }
-      .row { gap: 16px; }
-      .col { min-width: 100%; }
-      .btn-group { flex-direction: column; }
-      .btn { width: 100%; }
-      h1 { font-size: 28px; }
-    }
-  </style>
+  <link rel="stylesheet" href="{{ asset_url('index.css') }}" />
 </head>
 <body>
 <div class="wrap">
@@ -1488,358 +1323,185 @@ INDEX_HTML = """
     </div>
   </div>
 </div>
-<script>
-let respostas = {};
-
-// Toggle de opções
-for (const el of document.querySelectorAll('.option')){
-  el.addEventListener('click', () => {
-    const group = el.dataset.sexo? 'sexo' : (el.dataset.objetivo? 'objetivo' : null);
-    if(group){
-      document.querySelectorAll(`[data-${group}]`).forEach(x=>x.classList.remove('active'));
-      el.classList.add('active');
-      respostas[group] = el.dataset[group];
-    }
-  });
-}
-
-// Sistema de alerta para alimentos ruins
-function showAlert(message, type = 'error') {
-  const alert = document.createElement('div');
-  alert.className = `alert ${type}`;
-  alert.innerHTML = message;
-  document.body.appendChild(alert);
-  
-  setTimeout(() => {
-    alert.remove();
-  }, 4000);
-}
-
-// Carrega dados dos alimentos do servidor
-let foodsData = {};
-let dailyTarget = 0;
-
-async function loadFoodsData() {
-  try {
-    const response = await fetch('/api/foods');
-    foodsData = await response.json();
-  } catch (error) {
-    console.error('Erro ao carregar dados dos alimentos:', error);
-  }
-}
-
-// Carrega dados na inicialização
-loadFoodsData();
-
-// Função para atualizar calculadora de calorias
-function atualizarCalculadora() {
-  const refeicoes = ['cafe', 'almoco', 'lanche', 'jantar'];
-  let totalDia = 0;
-  let recomendacoes = [];
-  
-  refeicoes.forEach(refeicao => {
-    const checkboxes = document.querySelectorAll(`input[name="${refeicao}"]:checked`);
-    let totalRefeicao = 0;
-    
-    checkboxes.forEach(checkbox => {
-      const alimento = checkbox.value;
-      const foodInfo = foodsData.foods?.[alimento] || {calories: 300, category: 'medium'};
-      totalRefeicao += foodInfo.calories;
-      
-      // Gera recomendação para alimentos ruins
-      if (foodInfo.category === 'bad') {
-        const alternativas = foodsData.alternatives?.[alimento];
-        if (alternativas && alternativas.length > 0) {
-          const melhorAlternativa = alternativas[0];
-          const altInfo = foodsData.foods?.[melhorAlternativa] || {calories: 200};
-          recomendacoes.push(`Em vez de ${alimento} (${foodInfo.calories} kcal), experimente ${melhorAlternativa} (${altInfo.calories} kcal)`);
-        }
-      }
-    });
-    
-    document.getElementById(`cal-${refeicao}`).textContent = `${totalRefeicao} kcal`;
-    totalDia += totalRefeicao;
-  });
-  
-  document.getElementById('cal-total').textContent = `${totalDia} kcal`;
-  
-  // Calcula porcentagem do alvo diário
-  if (dailyTarget > 0) {
-    const porcentagem = Math.round((totalDia / dailyTarget) * 100);
-    document.getElementById('cal-percentage').textContent = `${porcentagem}% do alvo diário`;
-    
-    // Calcula calorias para queimar
-    const paraQueimar = Math.max(0, totalDia - dailyTarget);
-    if (paraQueimar > 0) {
-      document.getElementById('cal-burn').textContent = `Precisa queimar ${paraQueimar} kcal para manter o déficit`;
-    } else {
-      const restante = dailyTarget - totalDia;
-      document.getElementById('cal-burn').textContent = `Ainda pode consumir ${restante} kcal hoje`;
-    }
-  }
-  
-  // Mostra recomendações
-  const recDiv = document.getElementById('recommendations');
-  if (recomendacoes.length > 0) {
-    recDiv.innerHTML = '<h5>✨ Recomendações:</h5>' + recomendacoes.map(r => `<p style="color:#dc3545;font-size:12px;margin:4px 0;">${r}</p>`).join('');
-    recDiv.style.display = 'block';
-  } else {
-    recDiv.style.display = 'none';
-  }
-  
-  // Adiciona classe visual
-  const totalElement = document.getElementById('cal-total');
-  if (totalDia > dailyTarget * 1.2) {
-    totalElement.style.color = '#dc3545';
-  } else if (totalDia > dailyTarget) {
-    totalElement.style.color = '#ffc107';
-  } else {
-    totalElement.style.color = '#ff8c00';
-  }
-}
-
-// Monitor de seleção de alimentos
-document.addEventListener('change', (e) => {
-  if (e.target.type === 'checkbox' && e.target.name) {
-    // Atualiza calculadora
-    atualizarCalculadora();
-    
-    // Alerta para alimentos ruins
-    if (e.target.dataset.category === 'bad' && e.target.checked) {
-      showAlert('⚠️ Atenção! Este alimento não é recomendado para uma dieta saudável. Considere escolher opções mais nutritivas.', 'warning');
-    }
-  }
-});
+<script src="{{ asset_url('quiz.js') }}"></script>
+</body>
+</html>
+"""
 
-function setStep(i){
-  for(let s=1; s<=6; s++){
-    const step = document.getElementById('s'+s);
-    const dot = document.getElementById('d'+s);
-    
-    if(s === i) {
-      step.classList.remove('hidden');
-      step.classList.add('fade-in');
-    } else {
-      step.classList.add('hidden');
-      step.classList.remove('fade-in');
-    }
-    
-    dot.classList.toggle('active', s<=i);
-  }
-}
-function next(i){
-  if(i===2){
-    // Validação dos campos obrigatórios
-    const nome = document.getElementById('nome').value.trim();
-    const email = document.getElementById('email').value.trim();
-    const whatsapp = document.getElementById('whatsapp').value.trim();
-    const idade = parseInt(document.getElementById('idade').value||'0');
-    const peso = parseFloat(document.getElementById('peso').value||'0');
-    const altura = parseInt(document.getElementById('altura').value||'0');
-    
-    // Validação de email (regex simples)
-    const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
-    if (!emailRegex.test(email)) {
-      alert('Preencha um e-mail válido e um WhatsApp válido.');
-      return;
-    }
-    
-    // Validação de WhatsApp (10-13 dígitos)
-    const whatsappClean = whatsapp.replace(/[^0-9]/g, '');
-    if (whatsappClean.length < 10 || whatsappClean.length > 13) {
-      alert('Preencha um e-mail válido e um WhatsApp válido.');
-      return;
-    }
-    
-    // Validação dos outros campos
-    if (!nome || idade < 10 || peso < 30 || altura < 100) {
-      alert('Por favor, preencha todos os campos corretamente.');
-      return;
-    }
-    
-    respostas.nome = nome;
-    respostas.email = email;
-    respostas.whatsapp = whatsappClean;
-    respostas.idade = idade;
-    respostas.peso = peso;
-    respostas.altura = altura;
-    
-    console.log('Dados salvos no passo 1:', respostas);
-  }
-  
-  if(i===3){
-    // Verifica se objetivo foi selecionado
-    if(!respostas.objetivo){
-      alert('Por favor, selecione seu objetivo.');
-      return;
-    }
-  }
-  
-  if(i===4){
-    // Verifica se atividade foi selecionada
-    if(!document.getElementById('atividade').value){
-      alert('Por favor, selecione seu nível de atividade física.');
-      return;
-    }
-    respostas.atividade = document.getElementById('atividade').value;
-  }
-  
-  setStep(i);
+# Templates compilados uma vez pelo Environment do Flask (que guarda os
+# templates carregados) e com bytecode em disco para acelerar novos workers.
+TEMPLATES = {"index.html": INDEX_HTML, "final_plan.html": FINAL_PLAN_HTML}
+app.jinja_options = {
+    **app.jinja_options,
+    "bytecode_cache": FileSystemBytecodeCache(os.environ.get('JINJA_CACHE_DIR') or None),
 }
-function back(i){ setStep(i); }
-
-async function buildPreview(){
-  try {
-    // Debug: mostra todos os dados coletados
-    console.log('Dados atuais em respostas:', respostas);
-    
-    // Verifica campos obrigatórios um por um
-    const camposObrigatorios = ['nome', 'idade', 'peso', 'altura', 'sexo', 'objetivo'];
-    const camposFaltando = [];
-    
-    camposObrigatorios.forEach(campo => {
-      if (!respostas[campo]) {
-        camposFaltando.push(campo);
-      }
-    });
-    
-    if (camposFaltando.length > 0) {
-      console.error('Campos faltando:', camposFaltando);
-      alert(`Campos faltando: ${camposFaltando.join(', ')}. Por favor, volte e preencha todos os dados.`);
-      return;
-    }
-    
-    // Coleta atividade física
-    respostas.atividade = document.getElementById('atividade').value;
-    
-    // Coleta alimentos selecionados
-    const alimentosSelecionados = {};
-    ['cafe', 'almoco', 'lanche', 'jantar'].forEach(meal => {
-      const checkboxes = document.querySelectorAll(`input[name="${meal}"]:checked`);
-      alimentosSelecionados[meal] = Array.from(checkboxes).map(cb => cb.value);
-    });
-    
-    respostas.alimentos = alimentosSelecionados;
-    
-    console.log('Enviando dados:', respostas); // Debug
-    
-    const r = await fetch('/api/plan', {
-      method: 'POST', 
-      headers: {'Content-Type': 'application/json'}, 
-      body: JSON.stringify(respostas)
-    });
-    
-    if (!r.ok) {
-      const errorData = await r.json().catch(() => ({}));
-      console.error('Erro do servidor:', errorData);
-      throw new Error(`Erro HTTP: ${r.status} - ${errorData.error || 'Erro desconhecido'}`);
-    }
-    
-    const data = await r.json();
-    console.log('Resposta recebida:', data); // Debug
-    
-    if (!data.metas || !data.metas.imc) {
-      throw new Error('Dados incompletos recebidos do servidor');
-    }
-    
-    window._plan = data;
-    dailyTarget = data.metas.alvo; // Define o alvo diário
-    
-    // Atualiza calculadora com o novo alvo
-    atualizarCalculadora();
-    
-    // Atualiza informações motivacionais e de saúde
-    document.getElementById('motivation-text').textContent = data.metas.frase_motivacional;
-    document.getElementById('imc-value').textContent = data.metas.imc.valor;
-    
-    // Atualiza barra de saúde
-    const indicator = document.getElementById('health-indicator');
-    indicator.style.left = `${data.metas.imc.posicao}%`;
-    indicator.style.background = data.metas.imc.cor;
-    
-    // Atualiza resumo do perfil
-    document.getElementById('profile-altura').textContent = `${respostas.altura} cm`;
-    document.getElementById('profile-peso').textContent = `${respostas.peso} kg`;
-    document.getElementById('profile-idade').textContent = `${respostas.idade} anos`;
-    
-    const nivelTreino = {
-      'sedentario': 'Sedentário',
-      'iniciante': 'Iniciante',
-      'intermediario': 'Intermediário', 
-      'avancado': 'Avançado'
-    };
-    document.getElementById('profile-treino').textContent = nivelTreino[respostas.atividade];
-    
-    setStep(5);
-  } catch (error) {
-    console.error('Erro detalhado:', error);
-    alert(`Erro ao gerar prévia: ${error.message}`);
-  }
+app.jinja_loader = DictLoader(TEMPLATES)
+
+def verificar_templates():
+    """Compila todos os templates; erro de sintaxe derruba a inicialização."""
+    for nome in TEMPLATES:
+        app.jinja_env.get_template(nome)
+
+verificar_templates()
+
+
+class PreRenderedPage:
+    """Conteúdo fixo servido já comprimido (gzip/brotli), com ETag forte e 304."""
+
+    def __init__(self, conteudo: bytes, mimetype: str = 'text/html', cache_control: str = 'public, max-age=300'):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variantes = {'identity': conteudo, 'gzip': gzip.compress(conteudo, 9, mtime=0)}
+        if brotli is not None:
+            self.variantes['br'] = brotli.compress(conteudo)
+        digest = hashlib.sha256(conteudo).hexdigest()[:32]
+        # Cada codificação é uma representação diferente, então tem ETag própria
+        self.etags = {enc: digest if enc == 'identity' else f"{digest}-{enc}" for enc in self.variantes}
+
+    def _codificacao(self) -> str:
+        candidatas = [enc for enc in ('br', 'gzip') if enc in self.variantes]
+        return request.accept_encodings.best_match(candidatas) or 'identity'
+
+    def resposta(self):
+        encoding = self._codificacao()
+        etag = self.etags[encoding]
+        if request.if_none_match.contains_weak(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(self.variantes[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = self.cache_control
+        resp.vary.add('Accept-Encoding')
+        return resp
+
+
+# CSS/JS das páginas: nomes com hash do conteúdo, então o cache pode ser eterno
+ASSETS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+bundles = assets.construir()
+paginas_assets = {
+    b.arquivo: PreRenderedPage(b.conteudo, b.mimetype, ASSETS_CACHE_CONTROL) for b in bundles.values()
 }
 
+@app.template_global()
+def asset_url(nome: str) -> str:
+    return f"/assets/{bundles[nome].arquivo}"
 
+@app.get('/assets/<nome>')
+def asset(nome):
+    pagina = paginas_assets.get(nome)
+    if pagina is None: return "Arquivo não encontrado.", 404
+    return pagina.resposta()
 
-async function goToFinalPlan() {
-  try {
-    // Garante que os dados estão processados
-    if (!window._plan) {
-      await buildPreview();
-    }
-    
-    // Salva dados e gera PDF diretamente
-    const r = await fetch('/gerar-plano', {
-      method: 'POST',
-      headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify(respostas)
-    });
-    
-    if (r.ok) {
-      // Redireciona para página de sucesso
-      window.location = '/plano-completo';
-    } else {
-      throw new Error('Erro ao processar plano');
-    }
-  } catch (error) {
-    console.error('Erro:', error);
-    alert('Erro ao processar dados. Tente novamente.');
-  }
-}
 
+INDEX_MAX_AGE = int(os.environ.get('INDEX_MAX_AGE', '300'))
 
-</script>
-</body>
-</html>
-"""
+# A página inicial não tem variáveis: renderiza uma vez na inicialização
+with app.app_context():
+    pagina_inicial = PreRenderedPage(
+        render_template('index.html').encode('utf-8'),
+        cache_control=f'public, max-age={INDEX_MAX_AGE}',
+    )
 
 
 @app.route('/')
 def index():
-    return render_template_string(INDEX_HTML)
+    return pagina_inicial.resposta()
+
+def estatisticas_caches() -> dict:
+    alvo = calcular_alvo_kcal.cache_info()
+    return {
+        "alvo_kcal": {"hits": alvo.hits, "misses": alvo.misses, "tamanho": alvo.currsize, "maximo": alvo.maxsize},
+        "planos": planos_cache.info(),
+        "leads_duplicados": deduplicador.duplicados if deduplicador is not None else 0,
+        "pdf": pdf_cache.info(),
+        "pdf_pool": pdf_pool.info(),
+        "pdf_jobs_na_fila": fila_pdf.tamanho(),
+    }
+
+@app.get('/api/metrics')
+def api_metrics():
+    return jsonify(estatisticas_caches())
 
 @app.get('/api/foods')
 def api_foods():
     """Retorna dados dos alimentos em JSON."""
-    return jsonify(load_foods_data())
+    return app.response_class(catalogo.snapshot().raw, mimetype='application/json')
+
+
+CAMPOS_OBRIGATORIOS = ['nome', 'idade', 'peso', 'altura', 'sexo', 'objetivo', 'atividade']
+PLAN_BATCH_MAX = int(os.environ.get('PLAN_BATCH_MAX', '1000'))
 
+def validar_respostas(respostas) -> str:
+    """Retorna a mensagem de erro das respostas, ou None se estiverem válidas."""
+    if not respostas: return "Dados ausentes"
+    if not isinstance(respostas, dict): return "Formato inválido"
+    missing = [f for f in CAMPOS_OBRIGATORIOS if not respostas.get(f)]
+    if missing: return f"Campos ausentes: {', '.join(missing)}"
+    return None
+
+def calcular_plano(respostas: dict) -> dict:
+    metas = calcular_alvo_kcal(respostas)
+    plano = montar_refeicoes(metas['alvo'], respostas.get('alimentos', {}))
+    return {"metas": metas, "plano": plano}
 
 @app.post('/api/plan')
 def api_plan():
     try:
         respostas = request.get_json(force=True)
-        if not respostas: return jsonify({"error": "Dados ausentes"}), 400
-        
-        required = ['nome', 'idade', 'peso', 'altura', 'sexo', 'objetivo', 'atividade']
-        missing = [f for f in required if not respostas.get(f)]
-        if missing: return jsonify({"error": f"Campos ausentes: {', '.join(missing)}"}), 400
-        
-        metas = calcular_alvo_kcal(respostas)
-        plano = montar_refeicoes(metas['alvo'], respostas.get('alimentos', {}))
+        erro = validar_respostas(respostas)
+        if erro: return jsonify({"error": erro}), 400
         
-        return jsonify({"metas": metas, "plano": plano})
+        return jsonify(calcular_plano(respostas))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _ler_lote():
+    """Lê o corpo de /api/plan/batch: array JSON ou NDJSON (uma resposta por linha)."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        itens = []
+        for linha in request.get_data(as_text=True).splitlines():
+            if not linha.strip(): continue
+            try:
+                itens.append(json.loads(linha))
+            except ValueError:
+                itens.append(ValueError("JSON inválido"))
+        return itens
+    return request.get_json(force=True)
+
+@app.post('/api/plan/batch')
+def api_plan_batch():
+    """Calcula vários planos por requisição; erros de um item não afetam os outros."""
+    try:
+        itens = _ler_lote()
+    except Exception:
+        return jsonify({"error": "JSON inválido"}), 400
+    if not isinstance(itens, list): return jsonify({"error": "Envie uma lista de respostas"}), 400
+    if len(itens) > PLAN_BATCH_MAX:
+        return jsonify({"error": f"Máximo de {PLAN_BATCH_MAX} itens por lote"}), 413
+
+    # Respostas idênticas no mesmo lote são calculadas uma única vez
+    calculados = {}
+    resultados = []
+    for item in itens:
+        erro = str(item) if isinstance(item, Exception) else validar_respostas(item)
+        if erro:
+            resultados.append({"error": erro})
+            continue
+        chave = json.dumps(item, sort_keys=True, default=str)
+        if chave not in calculados:
+            try:
+                calculados[chave] = calcular_plano(item)
+            except Exception as e:
+                calculados[chave] = {"error": str(e)}
+        resultados.append(calculados[chave])
+
+    erros = sum(1 for r in resultados if "error" in r)
+    return jsonify({"resultados": resultados, "total": len(resultados), "erros": erros})
+
+
 @app.post('/api/save-session')
 def save_session():
     data = request.get_json(force=True)
@@ -1847,18 +1509,14 @@ def save_session():
     salvar_lead(respostas)
     
     session_id = str(uuid.uuid4())
-    with open(f"/tmp/{session_id}.json", 'w', encoding='utf-8') as f:
-        json.dump({'respostas': respostas, 'plan': data.get('plan', {})}, f)
+    session_store.set(session_id, {'respostas': respostas, 'plan': data.get('plan', {})})
     
     return jsonify({"session_id": session_id})
 
 @app.get('/resultados/<session_id>')
 def resultados(session_id):
-    session_path = f"/tmp/{session_id}.json"
-    if not os.path.exists(session_path): return "Sessão expirada.", 404
-    
-    with open(session_path, 'r', encoding='utf-8') as f:
-        session_data = json.load(f)
+    session_data = session_store.get(session_id)
+    if session_data is None: return "Sessão expirada.", 404
     
     respostas = session_data['respostas']
     metas = calcular_alvo_kcal(respostas)
@@ -1878,19 +1536,8 @@ def resultados(session_id):
     </div></body></html>
     """
 
-@app.get('/final-plan/<session_id>')
-def final_plan(session_id):
-    """Página final com análise completa e recomendações."""
-    session_path = f"/tmp/{session_id}.json"
-    if not os.path.exists(session_path):
-        return "Sessão expirada.", 404
-    
-    with open(session_path, 'r', encoding='utf-8') as f:
-        session_data = json.load(f)
-    
-    respostas = session_data['respostas']
-    plan_data = session_data['plan']
-    
+def contexto_plano_final(respostas: dict) -> dict:
+    """Dados usados pelo template final_plan.html."""
     # Recalcula dados para garantir consistência
     metas = calcular_alvo_kcal(respostas)
     alimentos = respostas.get('alimentos', {})
@@ -1903,10 +1550,10 @@ def final_plan(session_id):
     peso_ideal = calcular_peso_ideal(respostas['altura'], respostas['sexo'])
     agua_diaria = calcular_agua_diaria(respostas['peso'])
     
-    porcentagem_consumo = round((analise_calorias['total_consumido'] / metas['alvo']) * 100)
+    porcentagem_consumo = round((analise_calorias['total_consumido'] / metas['alvo']) * 100) if metas['alvo'] > 0 else 0
     calorias_para_queimar = max(0, analise_calorias['total_consumido'] - metas['alvo'])
     
-    return render_template_string(FINAL_PLAN_HTML, 
+    return dict(
         respostas=respostas,
         metas=metas,
         plano=plano,
@@ -1915,65 +1562,208 @@ def final_plan(session_id):
         agua_diaria=agua_diaria,
         porcentagem_consumo=porcentagem_consumo,
         calorias_para_queimar=calorias_para_queimar,
-        session_id=session_id
     )
 
+@app.get('/final-plan/<session_id>')
+def final_plan(session_id):
+    """Página final com análise completa e recomendações."""
+    session_data = session_store.get(session_id)
+    if session_data is None:
+        return "Sessão expirada.", 404
+    
+    return render_template('final_plan.html', session_id=session_id,
+                           **contexto_plano_final(session_data['respostas']))
+
 
+def _resolver_session_id(session_id: str = None) -> str:
+    # 'current' (links antigos) e /plano-completo sem id usam o cookie do navegador
+    if not session_id or session_id == 'current':
+        return session.get('plano_id')
+    return session_id
 
-last_user_data = {}
+def carregar_respostas(session_id: str = None) -> dict:
+    """Respostas gravadas para a sessão, ou None se não existir/expirou."""
+    session_id = _resolver_session_id(session_id)
+    session_data = session_store.get(session_id) if session_id else None
+    return session_data['respostas'] if session_data else None
 
 @app.post('/gerar-plano')
 def gerar_plano():
-    global last_user_data
     try:
         respostas = request.get_json(force=True)
         if not respostas: return jsonify({"error": "Dados ausentes"}), 400
         salvar_lead(respostas)
-        last_user_data = respostas
-        return jsonify({"success": True})
+        session_id = str(uuid.uuid4())
+        session_store.set(session_id, {'respostas': respostas, 'plan': {}})
+        session['plano_id'] = session_id
+        return jsonify({"success": True, "session_id": session_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.get('/plano-completo')
-def plano_completo():
-    global last_user_data
-    if not last_user_data: return redirect('/')
+@app.get('/plano-completo/<session_id>')
+def plano_completo(session_id=None):
+    session_id = _resolver_session_id(session_id)
+    respostas = carregar_respostas(session_id)
+    if not respostas: return redirect('/')
     
     try:
-        metas = calcular_alvo_kcal(last_user_data)
-        alimentos = last_user_data.get('alimentos', {})
-        plano = montar_refeicoes(metas['alvo'], alimentos)
-        analise_calorias = calcular_calorias_consumidas(alimentos)
-        peso_ideal = calcular_peso_ideal(last_user_data['altura'], last_user_data['sexo'])
-        agua_diaria = calcular_agua_diaria(last_user_data['peso'])
-        
-        porcentagem_consumo = round((analise_calorias['total_consumido'] / metas['alvo']) * 100) if metas['alvo'] > 0 else 0
-        calorias_para_queimar = max(0, analise_calorias['total_consumido'] - metas['alvo'])
-        
-        return render_template_string(FINAL_PLAN_HTML, 
-            respostas=last_user_data, metas=metas, plano=plano,
-            analise_calorias=analise_calorias, peso_ideal=peso_ideal,
-            agua_diaria=agua_diaria, porcentagem_consumo=porcentagem_consumo,
-            calorias_para_queimar=calorias_para_queimar, session_id='current'
-        )
+        return render_template('final_plan.html', session_id=session_id, **contexto_plano_final(respostas))
     except Exception as e:
         return f"Erro ao gerar plano: {str(e)}", 500
 
+def enviar_pdf(pdf, chave: str):
+    """`pdf` em bytes (cache em memória) ou caminho no disco, enviado em blocos."""
+    if isinstance(pdf, bytes):
+        resposta = Response(pdf, mimetype='application/pdf', headers={
+            'Content-Disposition': 'attachment; filename=plano_personalizado.pdf'})
+        resposta.set_etag(chave)
+    else:
+        resposta = send_file(pdf, as_attachment=True, download_name='plano_personalizado.pdf', mimetype='application/pdf', etag=chave)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def dados_pdf(respostas: dict) -> dict:
+    metas = calcular_alvo_kcal(respostas)
+    plano = montar_refeicoes(metas['alvo'], respostas.get('alimentos', {}))
+    return {"chave": chave_pdf(plano, respostas, metas), "plano": plano, "respostas": respostas, "metas": metas}
+
+def dados_pdf_sessao(session_id: str) -> dict:
+    session_data = session_store.get(session_id)
+    return dados_pdf(session_data['respostas']) if session_data else None
+
 @app.get('/gerar-pdf/<session_id>')
 def gerar_pdf_route(session_id):
-    global last_user_data
-    if not last_user_data: return "Dados não encontrados.", 404
+    respostas = carregar_respostas(session_id)
+    if not respostas: return "Dados não encontrados.", 404
     
     try:
-        metas = calcular_alvo_kcal(last_user_data)
-        plano = montar_refeicoes(metas['alvo'], last_user_data.get('alimentos', {}))
-        pdf_bytes = gerar_pdf(plano, last_user_data, metas)
-        return send_file(io.BytesIO(pdf_bytes), as_attachment=True, download_name='plano_personalizado.pdf', mimetype='application/pdf')
+        dados = dados_pdf(respostas)
+        chave = dados['chave']
+        if request.if_none_match.contains(chave):
+            return '', 304, {'ETag': f'"{chave}"', 'Cache-Control': 'private, no-cache'}
+        pdf = pdf_cache.buscar(chave)
+        if pdf is None:
+            try:
+                if pdf_cache.diretorio:
+                    pdf = pdf_cache.caminho(chave)
+                    pdf_pool.renderizar_arquivo(dados['plano'], respostas, dados['metas'], pdf, PDF_TIMEOUT)
+                else:
+                    pdf = pdf_pool.renderizar(dados['plano'], respostas, dados['metas'], PDF_TIMEOUT)
+                    pdf_cache.set(chave, pdf)
+            except (PdfPoolSaturado, FuturoTimeout):
+                return "Muitos PDFs sendo gerados agora, tente novamente em instantes.", 503, {'Retry-After': PDF_RETRY_AFTER}
+        return enviar_pdf(pdf, chave)
     except Exception as e:
         return f"Erro ao gerar PDF: {str(e)}", 500
 
+def status_job(job: dict) -> dict:
+    status = {"job_id": job['job_id'], "estado": job['estado'], "status_url": f"/api/pdf/jobs/{job['job_id']}"}
+    if job['estado'] == 'pronto':
+        status["download_url"] = f"/api/pdf/jobs/{job['job_id']}/download"
+    if job.get('erro'):
+        status["erro"] = job['erro']
+    return status
+
+@app.post('/api/pdf/<session_id>')
+def criar_job_pdf(session_id):
+    respostas = carregar_respostas(session_id)
+    if not respostas: return jsonify({"error": "Dados não encontrados."}), 404
+    # A sessão guarda o que /gerar-plano recebeu, sem validação
+    erro = validar_respostas(respostas)
+    if erro: return jsonify({"error": erro}), 400
+    try:
+        dados = dados_pdf(respostas)
+    except Exception as e:
+        return jsonify({"error": f"Erro ao gerar PDF: {str(e) or type(e).__name__}"}), 500
 
-
+    job_id = uuid.uuid4().hex
+    if fila_pdf.tem_pdf(dados['chave']):
+        # Mesmo conteúdo já renderizado: o job nasce pronto
+        fila_pdf.atualizar(job_id, estado='pronto', chave=dados['chave'])
+    else:
+        dados['respostas'] = {campo: respostas.get(campo) for campo in PDF_CAMPOS}
+        try:
+            fila_pdf.enfileirar(job_id, dados)
+        except PdfFilaCheia:
+            return jsonify({"error": "Fila de PDFs cheia, tente novamente em instantes."}), 503, {'Retry-After': PDF_RETRY_AFTER}
+    status = status_job(fila_pdf.status(job_id))
+    return jsonify(status), 202, {'Location': status['status_url']}
+
+@app.get('/api/pdf/jobs/<job_id>')
+def status_job_pdf(job_id):
+    job = fila_pdf.status(job_id)
+    if job is None: return jsonify({"error": "Job não encontrado."}), 404
+    return jsonify(status_job(job))
+
+@app.get('/api/pdf/jobs/<job_id>/download')
+def baixar_job_pdf(job_id):
+    job = fila_pdf.status(job_id)
+    if job is None: return "Job não encontrado.", 404
+    if job['estado'] != 'pronto':
+        return jsonify(status_job(job)), 409
+    if request.if_none_match.contains(job['chave']):
+        return '', 304, {'ETag': f'"{job["chave"]}"', 'Cache-Control': 'private, no-cache'}
+    pdf_bytes = fila_pdf.ler_pdf(job['chave'])
+    if pdf_bytes is None: return "PDF expirou, gere novamente.", 410
+    return enviar_pdf(pdf_bytes, job['chave'])
+
+# Exportação em lote (parceiros): exige ADMIN_TOKEN no header Authorization
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PDF_EXPORT_WORKERS = int(os.environ.get('PDF_EXPORT_WORKERS', '2'))
+# Cada exportação sobe PDF_EXPORT_WORKERS processos; além deste limite (por
+# worker web) a próxima recebe 503
+PDF_EXPORTS_MAX = int(os.environ.get('PDF_EXPORTS_MAX', '1'))
+vagas_exportacao = threading.BoundedSemaphore(max(PDF_EXPORTS_MAX, 1))
+
+def admin_autorizado() -> bool:
+    enviado = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(enviado, ADMIN_TOKEN)
+
+@app.post('/api/admin/exportar-pdfs')
+def exportar_pdfs_route():
+    if not admin_autorizado(): return jsonify({"error": "Não autorizado"}), 403
+    corpo = request.get_json(silent=True)
+    if isinstance(corpo, dict):
+        ids = [str(i) for i in corpo.get('session_ids') or []]
+    else:
+        ids = exportar_pdfs.ler_ids(request.get_data(as_text=True).splitlines())
+    if not ids: return jsonify({"error": "Nenhum session_id"}), 400
+    if not vagas_exportacao.acquire(blocking=False):
+        return jsonify({"error": "Outra exportação em andamento, tente novamente depois"}), 503, {'Retry-After': PDF_RETRY_AFTER}
+
+    # O progresso fica no session_store: o GET de acompanhamento pode cair em
+    # outro worker (com memory:// só funciona com um worker)
+    exportacao_id = uuid.uuid4().hex
+    chave = f'exportacao-{exportacao_id}'
+    estado = {"feitos": 0, "total": len(set(ids)), "erros": {}, "concluido": False}
+    session_store.set(chave, estado)
+
+    def progresso(feitos, total, session_id, erro):
+        estado["feitos"] = feitos
+        if erro is not None:
+            estado["erros"][session_id] = erro
+        session_store.set(chave, estado)
+
+    def gerar():
+        yield from exportar_pdfs.gerar_zip(ids, dados_pdf_sessao, PDF_EXPORT_WORKERS, pdf_cache, progresso)
+        estado["concluido"] = True
+        session_store.set(chave, estado)
+
+    response = Response(gerar(), mimetype='application/zip', headers={
+        'Content-Disposition': 'attachment; filename=planos.zip',
+        'X-Exportacao-Id': exportacao_id,
+    })
+    # Libera a vaga quando o ZIP termina ou o cliente desiste (close do WSGI)
+    response.call_on_close(vagas_exportacao.release)
+    return response
+
+@app.get('/api/admin/exportar-pdfs/<exportacao_id>')
+def progresso_exportacao(exportacao_id):
+    if not admin_autorizado(): return jsonify({"error": "Não autorizado"}), 403
+    estado = session_store.get(f'exportacao-{exportacao_id}') if re.fullmatch(r'[0-9a-f]{32}', exportacao_id) else None
+    if estado is None: return jsonify({"error": "Exportação não encontrada"}), 404
+    return jsonify(estado)
 
 
 if __name__ == '__main__':
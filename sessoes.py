@@ -0,0 +1,275 @@
+"""Armazenamento das sessões do quiz (respostas + plano) com expiração.
+
+Backends disponíveis, escolhidos por URL em criar_session_store():
+
+    memory://                  dicionário LRU no processo (um único worker)
+    sqlite:///caminho/db       arquivo SQLite compartilhado entre processos
+    file:///diretorio          um JSON por sessão em subdiretórios (sharding)
+
+Caminhos relativos e absolutos:
+
+    sqlite:///data/sessoes.db        data/sessoes.db (relativo ao diretório de trabalho, como no SQLAlchemy)
+    sqlite:////var/lib/sessoes.db    /var/lib/sessoes.db
+    file://data/sessoes              data/sessoes (relativo ao diretório de trabalho)
+    file:///var/lib/sessoes          /var/lib/sessoes
+"""
+import abc
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Arquivos do FileSessionStore dentro de um shard: <id>.json e as gravações
+# em andamento <id>.json.<pid>.<thread>.tmp
+_ARQUIVO_SESSAO_RE = re.compile(r'^([A-Za-z0-9_-]{1,64})\.json(\.\d+\.\d+\.tmp)?$')
+
+
+def session_id_valido(session_id) -> bool:
+    return isinstance(session_id, str) and bool(SESSION_ID_RE.match(session_id))
+
+
+class SessionStore(abc.ABC):
+    """Interface comum: sessões expiram `ttl` segundos após a última gravação."""
+
+    def __init__(self, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        self._parar = threading.Event()
+        self._limpeza = None
+        self._lock_limpeza = threading.Lock()
+
+    @abc.abstractmethod
+    def get(self, session_id: str):
+        """Dados da sessão, ou None se não existir/expirou."""
+
+    @abc.abstractmethod
+    def set(self, session_id: str, dados: dict):
+        """Grava a sessão e renova a expiração."""
+
+    @abc.abstractmethod
+    def delete(self, session_id: str):
+        """Remove a sessão, se existir."""
+
+    @abc.abstractmethod
+    def limpar_expirados(self) -> int:
+        """Remove as sessões vencidas e retorna quantas foram removidas."""
+
+    def iniciar_limpeza(self, intervalo: float = 600) -> threading.Thread:
+        """Inicia uma thread daemon que chama limpar_expirados periodicamente.
+
+        Uma thread por processo: chamar de novo devolve a que já está rodando,
+        e num filho de fork (que não herda a thread do pai) sobe outra.
+        """
+        with self._lock_limpeza:
+            if self._limpeza is not None and self._limpeza[0] == os.getpid():
+                return self._limpeza[1]
+            thread = threading.Thread(target=self._loop_limpeza, args=(intervalo,), name='session-sweeper', daemon=True)
+            thread.start()
+            self._limpeza = (os.getpid(), thread)
+            return thread
+
+    def _loop_limpeza(self, intervalo):
+        while not self._parar.wait(intervalo):
+            try:
+                self.limpar_expirados()
+            except Exception:
+                pass
+
+    def parar_limpeza(self):
+        self._parar.set()
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl: float = 7 * 24 * 3600, maxsize: int = 10000):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            item = self._dados.get(session_id)
+            if item is None:
+                return None
+            expira_em, dados = item
+            if expira_em <= time.time():
+                del self._dados[session_id]
+                return None
+            self._dados.move_to_end(session_id)
+            return json.loads(dados)
+
+    def set(self, session_id, dados):
+        # Guardado serializado: quem chama não consegue alterar a sessão por referência
+        item = (time.time() + self.ttl, json.dumps(dados))
+        with self._lock:
+            self._dados[session_id] = item
+            self._dados.move_to_end(session_id)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._dados.pop(session_id, None)
+
+    def limpar_expirados(self):
+        agora = time.time()
+        with self._lock:
+            vencidas = [sid for sid, (expira_em, _) in self._dados.items() if expira_em <= agora]
+            for sid in vencidas:
+                del self._dados[sid]
+        return len(vencidas)
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._herdadas = []
+        # Conexão própria, fechada em seguida: o store costuma ser criado no
+        # import, antes do fork dos workers, e nenhum deles deve herdá-la
+        con = self._conectar()
+        try:
+            with con:
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS sessoes ("
+                    " id TEXT PRIMARY KEY, dados TEXT NOT NULL, expira_em REAL NOT NULL)"
+                )
+                con.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_expira_em ON sessoes (expira_em)")
+        finally:
+            con.close()
+
+    def _conectar(self) -> sqlite3.Connection:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=10)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread; WAL permite leituras enquanto outro processo grava
+        pid, con = getattr(self._local, 'con', (None, None))
+        if pid != os.getpid():
+            if con is not None:
+                # Herdada de um fork: usá-la ou fechá-la no filho mexe nos locks
+                # do SQLite que são do pai e perde gravações; fica só referenciada
+                self._herdadas.append(con)
+            con = self._conectar()
+            self._local.con = (os.getpid(), con)
+        return con
+
+    def get(self, session_id):
+        row = self._conexao().execute(
+            "SELECT dados FROM sessoes WHERE id = ? AND expira_em > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id, dados):
+        with self._conexao() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO sessoes (id, dados, expira_em) VALUES (?, ?, ?)",
+                (session_id, json.dumps(dados), time.time() + self.ttl),
+            )
+
+    def delete(self, session_id):
+        with self._conexao() as con:
+            con.execute("DELETE FROM sessoes WHERE id = ?", (session_id,))
+
+    def limpar_expirados(self):
+        with self._conexao() as con:
+            return con.execute("DELETE FROM sessoes WHERE expira_em <= ?", (time.time(),)).rowcount
+
+
+class FileSessionStore(SessionStore):
+    """Um JSON por sessão em base_dir/<2 primeiros caracteres>/<id>.json.
+
+    A expiração usa o mtime do arquivo, então funciona entre processos e hosts
+    que compartilham o diretório.
+    """
+
+    def __init__(self, base_dir: str, ttl: float = 7 * 24 * 3600):
+        super().__init__(ttl)
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _caminho(self, session_id):
+        if not session_id_valido(session_id):
+            return None
+        return os.path.join(self.base_dir, session_id[:2], f"{session_id}.json")
+
+    def get(self, session_id):
+        caminho = self._caminho(session_id)
+        if caminho is None:
+            return None
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                if os.fstat(f.fileno()).st_mtime + self.ttl <= time.time():
+                    dados = None
+                else:
+                    return json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.delete(session_id)
+        return dados
+
+    def set(self, session_id, dados):
+        caminho = self._caminho(session_id)
+        if caminho is None:
+            raise ValueError(f"session_id inválido: {session_id!r}")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        os.replace(temporario, caminho)
+
+    def delete(self, session_id):
+        caminho = self._caminho(session_id)
+        if caminho is None:
+            return
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+    def limpar_expirados(self):
+        # Só mexe no que este store grava (base_dir/<shard>/<id>.json e seus
+        # .tmp): o diretório pode ser compartilhado com outros arquivos
+        agora = time.time()
+        removidos = 0
+        try:
+            shards = [e.path for e in os.scandir(self.base_dir)
+                      if len(e.name) == 2 and session_id_valido(e.name) and e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return 0
+        for shard in shards:
+            for nome in os.listdir(shard):
+                m = _ARQUIVO_SESSAO_RE.match(nome)
+                if m is None or m.group(1)[:2] != os.path.basename(shard):
+                    continue
+                # Um .tmp só sai se ficou órfão, nunca no meio de uma gravação
+                limite = agora - (max(self.ttl, 3600) if m.group(2) else self.ttl)
+                caminho = os.path.join(shard, nome)
+                try:
+                    if os.stat(caminho, follow_symlinks=False).st_mtime <= limite:
+                        os.remove(caminho)
+                        removidos += 1
+                except FileNotFoundError:
+                    pass
+        return removidos
+
+
+def criar_session_store(url: str, ttl: float = 7 * 24 * 3600) -> SessionStore:
+    """Cria o backend a partir de uma URL (memory://, sqlite:///..., file:///...)."""
+    esquema, _, caminho = url.partition('://')
+    if esquema == 'memory':
+        return MemorySessionStore(ttl)
+    if esquema == 'sqlite':
+        # Como no SQLAlchemy: a terceira barra separa o caminho, e uma quarta o torna absoluto
+        return SQLiteSessionStore(caminho.removeprefix('/'), ttl)
+    if esquema == 'file':
+        return FileSessionStore(caminho, ttl)
+    raise ValueError(f"SESSION_STORE desconhecido: {url}")
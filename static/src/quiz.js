@@ -0,0 +1,316 @@
+let respostas = {};
+
+// Toggle de opções
+for (const el of document.querySelectorAll('.option')){
+  el.addEventListener('click', () => {
+    const group = el.dataset.sexo? 'sexo' : (el.dataset.objetivo? 'objetivo' : null);
+    if(group){
+      document.querySelectorAll(`[data-${group}]`).forEach(x=>x.classList.remove('active'));
+      el.classList.add('active');
+      respostas[group] = el.dataset[group];
+    }
+  });
+}
+
+// Sistema de alerta para alimentos ruins
+function showAlert(message, type = 'error') {
+  const alert = document.createElement('div');
+  alert.className = `alert ${type}`;
+  alert.innerHTML = message;
+  document.body.appendChild(alert);
+  
+  setTimeout(() => {
+    alert.remove();
+  }, 4000);
+}
+
+// Carrega dados dos alimentos do servidor
+let foodsData = {};
+let dailyTarget = 0;
+
+async function loadFoodsData() {
+  try {
+    const response = await fetch('/api/foods');
+    foodsData = await response.json();
+  } catch (error) {
+    console.error('Erro ao carregar dados dos alimentos:', error);
+  }
+}
+
+// Carrega dados na inicialização
+loadFoodsData();
+
+// Função para atualizar calculadora de calorias
+function atualizarCalculadora() {
+  const refeicoes = ['cafe', 'almoco', 'lanche', 'jantar'];
+  let totalDia = 0;
+  let recomendacoes = [];
+  
+  refeicoes.forEach(refeicao => {
+    const checkboxes = document.querySelectorAll(`input[name="${refeicao}"]:checked`);
+    let totalRefeicao = 0;
+    
+    checkboxes.forEach(checkbox => {
+      const alimento = checkbox.value;
+      const foodInfo = foodsData.foods?.[alimento] || {calories: 300, category: 'medium'};
+      totalRefeicao += foodInfo.calories;
+      
+      // Gera recomendação para alimentos ruins
+      if (foodInfo.category === 'bad') {
+        const alternativas = foodsData.alternatives?.[alimento];
+        if (alternativas && alternativas.length > 0) {
+          const melhorAlternativa = alternativas[0];
+          const altInfo = foodsData.foods?.[melhorAlternativa] || {calories: 200};
+          recomendacoes.push(`Em vez de ${alimento} (${foodInfo.calories} kcal), experimente ${melhorAlternativa} (${altInfo.calories} kcal)`);
+        }
+      }
+    });
+    
+    document.getElementById(`cal-${refeicao}`).textContent = `${totalRefeicao} kcal`;
+    totalDia += totalRefeicao;
+  });
+  
+  document.getElementById('cal-total').textContent = `${totalDia} kcal`;
+  
+  // Calcula porcentagem do alvo diário
+  if (dailyTarget > 0) {
+    const porcentagem = Math.round((totalDia / dailyTarget) * 100);
+    document.getElementById('cal-percentage').textContent = `${porcentagem}% do alvo diário`;
+    
+    // Calcula calorias para queimar
+    const paraQueimar = Math.max(0, totalDia - dailyTarget);
+    if (paraQueimar > 0) {
+      document.getElementById('cal-burn').textContent = `Precisa queimar ${paraQueimar} kcal para manter o déficit`;
+    } else {
+      const restante = dailyTarget - totalDia;
+      document.getElementById('cal-burn').textContent = `Ainda pode consumir ${restante} kcal hoje`;
+    }
+  }
+  
+  // Mostra recomendações
+  const recDiv = document.getElementById('recommendations');
+  if (recomendacoes.length > 0) {
+    recDiv.innerHTML = '<h5>✨ Recomendações:</h5>' + recomendacoes.map(r => `<p style="color:#dc3545;font-size:12px;margin:4px 0;">${r}</p>`).join('');
+    recDiv.style.display = 'block';
+  } else {
+    recDiv.style.display = 'none';
+  }
+  
+  // Adiciona classe visual
+  const totalElement = document.getElementById('cal-total');
+  if (totalDia > dailyTarget * 1.2) {
+    totalElement.style.color = '#dc3545';
+  } else if (totalDia > dailyTarget) {
+    totalElement.style.color = '#ffc107';
+  } else {
+    totalElement.style.color = '#ff8c00';
+  }
+}
+
+// Monitor de seleção de alimentos
+document.addEventListener('change', (e) => {
+  if (e.target.type === 'checkbox' && e.target.name) {
+    // Atualiza calculadora
+    atualizarCalculadora();
+    
+    // Alerta para alimentos ruins
+    if (e.target.dataset.category === 'bad' && e.target.checked) {
+      showAlert('⚠️ Atenção! Este alimento não é recomendado para uma dieta saudável. Considere escolher opções mais nutritivas.', 'warning');
+    }
+  }
+});
+
+function setStep(i){
+  for(let s=1; s<=6; s++){
+    const step = document.getElementById('s'+s);
+    const dot = document.getElementById('d'+s);
+    
+    if(s === i) {
+      step.classList.remove('hidden');
+      step.classList.add('fade-in');
+    } else {
+      step.classList.add('hidden');
+      step.classList.remove('fade-in');
+    }
+    
+    dot.classList.toggle('active', s<=i);
+  }
+}
+function next(i){
+  if(i===2){
+    // Validação dos campos obrigatórios
+    const nome = document.getElementById('nome').value.trim();
+    const email = document.getElementById('email').value.trim();
+    const whatsapp = document.getElementById('whatsapp').value.trim();
+    const idade = parseInt(document.getElementById('idade').value||'0');
+    const peso = parseFloat(document.getElementById('peso').value||'0');
+    const altura = parseInt(document.getElementById('altura').value||'0');
+    
+    // Validação de email (regex simples)
+    const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+    if (!emailRegex.test(email)) {
+      alert('Preencha um e-mail válido e um WhatsApp válido.');
+      return;
+    }
+    
+    // Validação de WhatsApp (10-13 dígitos)
+    const whatsappClean = whatsapp.replace(/[^0-9]/g, '');
+    if (whatsappClean.length < 10 || whatsappClean.length > 13) {
+      alert('Preencha um e-mail válido e um WhatsApp válido.');
+      return;
+    }
+    
+    // Validação dos outros campos
+    if (!nome || idade < 10 || peso < 30 || altura < 100) {
+      alert('Por favor, preencha todos os campos corretamente.');
+      return;
+    }
+    
+    respostas.nome = nome;
+    respostas.email = email;
+    respostas.whatsapp = whatsappClean;
+    respostas.idade = idade;
+    respostas.peso = peso;
+    respostas.altura = altura;
+    
+    console.log('Dados salvos no passo 1:', respostas);
+  }
+  
+  if(i===3){
+    // Verifica se objetivo foi selecionado
+    if(!respostas.objetivo){
+      alert('Por favor, selecione seu objetivo.');
+      return;
+    }
+  }
+  
+  if(i===4){
+    // Verifica se atividade foi selecionada
+    if(!document.getElementById('atividade').value){
+      alert('Por favor, selecione seu nível de atividade física.');
+      return;
+    }
+    respostas.atividade = document.getElementById('atividade').value;
+  }
+  
+  setStep(i);
+}
+function back(i){ setStep(i); }
+
+async function buildPreview(){
+  try {
+    // Debug: mostra todos os dados coletados
+    console.log('Dados atuais em respostas:', respostas);
+    
+    // Verifica campos obrigatórios um por um
+    const camposObrigatorios = ['nome', 'idade', 'peso', 'altura', 'sexo', 'objetivo'];
+    const camposFaltando = [];
+    
+    camposObrigatorios.forEach(campo => {
+      if (!respostas[campo]) {
+        camposFaltando.push(campo);
+      }
+    });
+    
+    if (camposFaltando.length > 0) {
+      console.error('Campos faltando:', camposFaltando);
+      alert(`Campos faltando: ${camposFaltando.join(', ')}. Por favor, volte e preencha todos os dados.`);
+      return;
+    }
+    
+    // Coleta atividade física
+    respostas.atividade = document.getElementById('atividade').value;
+    
+    // Coleta alimentos selecionados
+    const alimentosSelecionados = {};
+    ['cafe', 'almoco', 'lanche', 'jantar'].forEach(meal => {
+      const checkboxes = document.querySelectorAll(`input[name="${meal}"]:checked`);
+      alimentosSelecionados[meal] = Array.from(checkboxes).map(cb => cb.value);
+    });
+    
+    respostas.alimentos = alimentosSelecionados;
+    
+    console.log('Enviando dados:', respostas); // Debug
+    
+    const r = await fetch('/api/plan', {
+      method: 'POST', 
+      headers: {'Content-Type': 'application/json'}, 
+      body: JSON.stringify(respostas)
+    });
+    
+    if (!r.ok) {
+      const errorData = await r.json().catch(() => ({}));
+      console.error('Erro do servidor:', errorData);
+      throw new Error(`Erro HTTP: ${r.status} - ${errorData.error || 'Erro desconhecido'}`);
+    }
+    
+    const data = await r.json();
+    console.log('Resposta recebida:', data); // Debug
+    
+    if (!data.metas || !data.metas.imc) {
+      throw new Error('Dados incompletos recebidos do servidor');
+    }
+    
+    window._plan = data;
+    dailyTarget = data.metas.alvo; // Define o alvo diário
+    
+    // Atualiza calculadora com o novo alvo
+    atualizarCalculadora();
+    
+    // Atualiza informações motivacionais e de saúde
+    document.getElementById('motivation-text').textContent = data.metas.frase_motivacional;
+    document.getElementById('imc-value').textContent = data.metas.imc.valor;
+    
+    // Atualiza barra de saúde
+    const indicator = document.getElementById('health-indicator');
+    indicator.style.left = `${data.metas.imc.posicao}%`;
+    indicator.style.background = data.metas.imc.cor;
+    
+    // Atualiza resumo do perfil
+    document.getElementById('profile-altura').textContent = `${respostas.altura} cm`;
+    document.getElementById('profile-peso').textContent = `${respostas.peso} kg`;
+    document.getElementById('profile-idade').textContent = `${respostas.idade} anos`;
+    
+    const nivelTreino = {
+      'sedentario': 'Sedentário',
+      'iniciante': 'Iniciante',
+      'intermediario': 'Intermediário', 
+      'avancado': 'Avançado'
+    };
+    document.getElementById('profile-treino').textContent = nivelTreino[respostas.atividade];
+    
+    setStep(5);
+  } catch (error) {
+    console.error('Erro detalhado:', error);
+    alert(`Erro ao gerar prévia: ${error.message}`);
+  }
+}
+
+
+
+async function goToFinalPlan() {
+  try {
+    // Garante que os dados estão processados
+    if (!window._plan) {
+      await buildPreview();
+    }
+    
+    // Salva dados e gera PDF diretamente
+    const r = await fetch('/gerar-plano', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify(respostas)
+    });
+    
+    if (r.ok) {
+      // Redireciona para o plano desta sessão
+      const data = await r.json();
+      window.location = `/plano-completo/${data.session_id}`;
+    } else {
+      throw new Error('Erro ao processar plano');
+    }
+  } catch (error) {
+    console.error('Erro:', error);
+    alert('Erro ao processar dados. Tente novamente.');
+  }
+}
@@ -0,0 +1,80 @@
+"""Tempo de import (cold start) de um módulo, medido com `python -X importtime`.
+
+Roda o import num processo novo e resume a saída do importtime: o total e os
+imports diretos do módulo que mais pesam. Com --max-ms, sai com erro se o
+total passar do limite (para acompanhar regressões no CI).
+
+    python tempo_import.py [quiz] [--top 15] [--max-ms 1500] [--saida tempo.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# import time: self [us] | cumulative | imported package
+_LINHA_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def medir(modulo: str = 'quiz', python: str = sys.executable) -> dict:
+    processo = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {modulo}'],
+        capture_output=True, text=True, cwd=BASE_DIR,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"import {modulo} falhou:\n{processo.stderr[-2000:]}")
+
+    entradas = []
+    for linha in processo.stderr.splitlines():
+        m = _LINHA_RE.match(linha)
+        if m:
+            entradas.append((len(m.group(3)), m.group(4), int(m.group(2)) / 1000))
+
+    # O importtime lista os filhos antes do pai: os imports diretos do módulo
+    # são as entradas um nível abaixo dele, logo antes da sua linha
+    total, pacotes = 0.0, {}
+    for i in range(len(entradas) - 1, -1, -1):
+        nivel, nome, ms = entradas[i]
+        if nivel == 1 and nome == modulo:
+            total = ms
+            for nivel_filho, filho, ms_filho in reversed(entradas[:i]):
+                if nivel_filho == 1:
+                    break
+                if nivel_filho == 3:
+                    raiz = filho.split('.')[0]
+                    pacotes[raiz] = pacotes.get(raiz, 0) + ms_filho
+            break
+    return {
+        "modulo": modulo,
+        "total_ms": round(total, 1),
+        "pacotes": {nome: round(ms, 1) for nome, ms in sorted(pacotes.items(), key=lambda p: -p[1])},
+        "importados": [nome for _, nome, _ in entradas],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de import de um módulo (python -X importtime).")
+    parser.add_argument('modulo', nargs='?', default='quiz')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-ms', type=float, default=None, help="falha se o total passar deste limite")
+    parser.add_argument('--saida', default=None, help="grava o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    resultado = medir(args.modulo)
+    print(f"import {resultado['modulo']}: {resultado['total_ms']:.1f} ms ({len(resultado['importados'])} módulos)")
+    for nome, ms in list(resultado['pacotes'].items())[:args.top]:
+        print(f"  {ms:9.1f} ms  {nome}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    if args.max_ms is not None and resultado['total_ms'] > args.max_ms:
+        print(f"acima do limite de {args.max_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
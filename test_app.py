@@ -1,6 +1,11 @@
 import pytest
 import json
-from quiz_→_pagamento_→_pdf_flask_mvp import app, mifflin_st_jeor, calcular_alvo_kcal, montar_refeicoes
+import itertools
+import os
+import time
+import quiz
+from quiz import app, mifflin_st_jeor, calcular_alvo_kcal, montar_refeicoes, FoodCatalog, FoodIndex, calcular_peso_porcao, densidade_alimento, DENSIDADES, DENSIDADE_PADRAO, load_foods_data, \
+    ESCALA_PORCAO, ESCALA_QUANTIDADE, PortionScale, calcular_metas_lote
 
 @pytest.fixture
 def client():
@@ -32,6 +37,49 @@ def test_calcular_alvo_kcal():
     assert 'alvo' in resultado
     assert resultado['alvo'] > 0
 
+CASOS_METAS = [
+    {'sexo': sexo, 'peso': peso, 'altura': altura, 'idade': idade, 'atividade': atividade, 'objetivo': objetivo}
+    for sexo, peso, altura, idade, atividade, objetivo in itertools.product(
+        ['masculino', 'feminino'], [45, 60.5, 80, 123.4], [150, 165, 180, 199.5], [18, 30, 47, 70],
+        ['sedentario', 'iniciante', 'intermediario', 'avancado', 'outro'], ['emagrecer', 'manter', 'ganhar'])
+]
+
+@pytest.mark.parametrize('usar_numpy', [
+    False, pytest.param(True, marks=pytest.mark.skipif(quiz._numpy() is None, reason='numpy não instalado'))
+])
+def test_calcular_metas_lote_igual_ao_escalar(monkeypatch, usar_numpy):
+    if not usar_numpy:
+        monkeypatch.setattr(quiz, '_numpy', lambda: None)
+    colunas = {campo: [caso[campo] for caso in CASOS_METAS] for campo in CASOS_METAS[0]}
+    lote = calcular_metas_lote(**colunas)
+
+    for i, caso in enumerate(CASOS_METAS):
+        metas = calcular_alvo_kcal(caso)
+        assert int(lote['bmr'][i]) == metas['bmr']
+        assert int(lote['tdee'][i]) == metas['tdee']
+        assert int(lote['alvo'][i]) == metas['alvo']
+        assert float(lote['imc'][i]) == metas['imc']['valor']
+        assert str(lote['imc_categoria'][i]) == metas['imc']['categoria']
+
+def test_calcular_alvo_kcal_memoizado():
+    calcular_alvo_kcal.cache_clear()
+    respostas = {'sexo': 'feminino', 'peso': 60, 'altura': 165, 'idade': 30,
+                 'atividade': 'iniciante', 'objetivo': 'manter'}
+    primeiro = calcular_alvo_kcal(respostas)
+    primeiro['imc']['valor'] = 0
+    primeiro['alvo'] = 0
+
+    segundo = calcular_alvo_kcal(dict(respostas, peso=60.0, altura='165'))
+    assert segundo['alvo'] > 0
+    assert segundo['imc']['valor'] == 22.0
+    info = calcular_alvo_kcal.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+def test_api_metrics(client):
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert 'hits' in response.get_json()['alvo_kcal']
+
 def test_montar_refeicoes():
     plano = montar_refeicoes(2000)
     assert 'cafe' in plano
@@ -40,6 +88,208 @@ def test_montar_refeicoes():
     assert 'jantar' in plano
     assert plano['cafe']['meta_kcal'] == 500
 
+def test_montar_refeicoes_ignora_selecao_que_nao_e_dict(client):
+    vazio = montar_refeicoes(2000)
+    assert montar_refeicoes(2000, ['x']) == vazio and montar_refeicoes(2000, 'x') == vazio
+    response = client.post('/api/plan', json=dict(RESPOSTAS_VALIDAS, alimentos=['x']))
+    assert response.status_code == 200
+    assert all(not bloco['opcoes'] for bloco in response.get_json()['plano'].values())
+
+def test_montar_refeicoes_usa_cache_e_devolve_copia():
+    quiz.planos_cache.clear()
+    selecao = {'cafe': ['Pão integral', 'Ovo cozido ou mexido'], 'jantar': [], 'outro': ['Pizza']}
+    primeiro = montar_refeicoes(1800, selecao)
+    primeiro['cafe']['opcoes'][0]['kcal'] = -1
+    primeiro['cafe']['opcoes'].clear()
+
+    segundo = montar_refeicoes(1800, {'cafe': ['Pão integral', 'Ovo cozido ou mexido']})
+    assert [op['descricao'] for op in segundo['cafe']['opcoes']] == ['Pão integral', 'Ovo cozido ou mexido']
+    assert segundo['cafe']['opcoes'][0]['kcal'] > 0
+    assert (quiz.planos_cache.hits, quiz.planos_cache.misses) == (1, 1)
+
+    montar_refeicoes(1800, {'cafe': ['Ovo cozido ou mexido', 'Pão integral']})
+    assert quiz.planos_cache.misses == 2
+
+def test_lru_cache_descarta_menos_usado():
+    from cache import LRUCache
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+def test_byte_cache_limita_bytes_e_usa_disco(tmp_path):
+    from cache import ByteCache
+    cache = ByteCache(max_bytes=10, diretorio=str(tmp_path))
+    cache.set('aa01', b'12345')
+    cache.set('bb02', b'67890')
+    cache.set('cc03', b'abc')
+    assert len(cache) == 2 and cache.info()['bytes'] == 8
+    assert cache.get('aa01') == b'12345'  # volta do disco
+    assert ByteCache(diretorio=str(tmp_path)).get('bb02') == b'67890'
+    assert cache.info()['hits_disco'] == 1 and cache.get('zz99') is None
+
+def test_byte_cache_limita_o_disco(tmp_path):
+    from cache import ByteCache
+    cache = ByteCache(max_bytes=0, diretorio=str(tmp_path), max_bytes_disco=10, max_idade=3600)
+    a, b, c = ('aa' + '1' * 62, 'bb' + '2' * 62, 'cc' + '3' * 62)
+    for i, chave in enumerate([a, b, c]):
+        cache.set(chave, b'12345')
+        os.utime(cache.caminho(chave), (time.time() - 100 + i, time.time() - 100 + i))
+    (tmp_path / 'aa' / f'{a}.1.2.tmp').write_bytes(b'x')  # gravação em andamento
+    # Outros arquivos no mesmo diretório não são do cache: nunca saem
+    alheios = [tmp_path / 'importante.txt', tmp_path / 'aa' / 'notas.txt', tmp_path / 'dd' / ('ee' + '4' * 62)]
+    for caminho in alheios:
+        caminho.parent.mkdir(exist_ok=True)
+        caminho.write_bytes(b'x' * 100)
+        os.utime(caminho, (time.time() - 99999, time.time() - 99999))
+    assert cache.arquivo(a)  # usado agora: o mais antigo passa a ser o b
+    assert cache.limpar_disco() == 1
+    assert cache.arquivo(b) is None and cache.arquivo(c)
+    assert (tmp_path / 'aa' / f'{a}.1.2.tmp').exists()
+
+    os.utime(cache.caminho(c), (time.time() - 7200, time.time() - 7200))
+    assert cache.limpar_disco() == 1 and cache.arquivo(c) is None
+    assert all(caminho.exists() for caminho in alheios)
+
+    # buscar conta uma única falha (memória e disco juntos)
+    cache = ByteCache(diretorio=str(tmp_path))
+    assert cache.buscar('dd04') is None and cache.info()['misses'] == 1
+    cache.set('dd04', b'pdf')
+    assert cache.buscar('dd04') == b'pdf' and cache.info()['hits'] == 1
+
+def test_food_catalog_recarrega_quando_arquivo_muda(tmp_path):
+    path = tmp_path / 'foods.json'
+    path.write_text(json.dumps({"foods": {"Ovo": {"calories": 150, "category": "good"}}, "alternatives": {}}), encoding='utf-8')
+    catalogo = FoodCatalog(str(path), intervalo=0)
+
+    primeiro = catalogo.snapshot()
+    assert catalogo.snapshot() is primeiro
+    assert primeiro.dados['foods']['Ovo']['calories'] == 150
+    with pytest.raises(TypeError):
+        primeiro.dados['foods']['Ovo']['calories'] = 0
+
+    path.write_text(json.dumps({"foods": {"Ovo": {"calories": 155, "category": "good"}}, "alternatives": {}}), encoding='utf-8')
+    segundo = catalogo.snapshot()
+    assert segundo is not primeiro
+    assert segundo.dados['foods']['Ovo']['calories'] == 155
+    assert primeiro.dados['foods']['Ovo']['calories'] == 150
+
+def test_food_catalog_arquivo_ausente(tmp_path):
+    catalogo = FoodCatalog(str(tmp_path / 'nao_existe.json'))
+    assert dict(catalogo.snapshot().dados) == {"foods": {}, "alternatives": {}}
+
+def test_food_index_campos_derivados():
+    indice = FoodIndex({
+        "foods": {
+            "Biscoito recheado": {"calories": 450, "category": "bad"},
+            "Iogurte natural": {"calories": 150, "category": "good"},
+        },
+        "alternatives": {"Biscoito recheado": ["Iogurte natural", "Fruta"]},
+    })
+    entrada = indice.get("Biscoito recheado")
+    assert entrada.calorias == 450
+    assert entrada.categoria == "bad"
+    assert entrada.porcao == calcular_peso_porcao("Biscoito recheado", 450)
+    assert entrada.alternativa == "Iogurte natural"
+    assert entrada.alternativa_porcao == calcular_peso_porcao("Iogurte natural", 150)
+    assert entrada.economia_calorias == 300
+    assert indice.get("Iogurte natural").alternativa is None
+
+    desconhecido = indice.get("Prato inventado")
+    assert (desconhecido.calorias, desconhecido.categoria) == (300, "medium")
+    assert "Prato inventado" not in indice
+
+def test_densidade_alimento_primeira_chave_da_tabela_vence():
+    def referencia(alimento):
+        for key, val in DENSIDADES.items():
+            if key.lower() in alimento.lower():
+                return val
+        return DENSIDADE_PADRAO
+
+    nomes = list(load_foods_data()['foods']) + [
+        "Ovo com pão integral", "Salada de frango", "FEIJÃO com ARROZ",
+        "Hambúrguer com batata-doce", "Água", "",
+    ]
+    for nome in nomes:
+        assert densidade_alimento(nome) == referencia(nome), nome
+
+def test_escalas_de_porcao_respeitam_limites_inclusivos():
+    assert ESCALA_PORCAO.rotulo(20) == "20g (1 colher sopa)"
+    assert ESCALA_PORCAO.rotulo(20.3) == "20g (1/2 xícara)"
+    assert ESCALA_PORCAO.rotulo(250) == "250g (1 prato raso)"
+    assert ESCALA_PORCAO.rotulo(251) == "251g (1 prato fundo)"
+    assert ESCALA_QUANTIDADE.rotulo(15) == "15 g (1 colher sopa)"
+    assert ESCALA_QUANTIDADE.rotulo(29.6) == "30 g (2 colheres sopa)"
+    assert ESCALA_QUANTIDADE.rotulo(201) == "201 g (1 prato fundo)"
+
+def test_escala_de_porcao_configuravel():
+    escala = PortionScale([(30, "1 tbsp"), (240, "1 cup")], maior="1 plate", formato="{gramas} g - {medida}")
+    assert escala.rotulo(10) == "10 g - 1 tbsp"
+    assert escala.rotulo(500) == "500 g - 1 plate"
+    assert calcular_peso_porcao("Arroz", 130, escala) == "100 g - 1 cup"
+
+def test_index_em_brotli_quando_aceito(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert b'Quiz' in brotli.decompress(response.data)
+
+def test_index_comprimido_com_etag(client):
+    import gzip
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'Quiz' in gzip.decompress(response.data)
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'max-age' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_assets_com_hash_e_cache_imutavel(client):
+    html = client.get('/').data.decode('utf-8')
+    url = quiz.asset_url('quiz.js')
+    assert f'src="{url}"' in html
+    assert quiz.asset_url('index.css') in html
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert b'function goToFinalPlan' in response.data
+    assert client.get('/assets/quiz.00000000.js').status_code == 404
+
+def test_build_de_assets(tmp_path):
+    import assets
+    assert assets.minificar_css("a , b {\n  color: red ;\n}\n/* x */") == "a,b{color:red}"
+    assets.escrever(assets.construir(), str(tmp_path))
+    manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert set(manifest) == {'index.css', 'plano.css', 'quiz.js'}
+    for arquivo in manifest.values():
+        assert (tmp_path / arquivo).exists()
+        assert (tmp_path / (arquivo + '.gz')).exists()
+
+def test_api_foods(client):
+    response = client.get('/api/foods')
+    assert response.status_code == 200
+    assert 'foods' in response.get_json()
+
+def test_templates_compilados_uma_vez():
+    assert app.jinja_env.get_template('index.html') is app.jinja_env.get_template('index.html')
+
+def test_verificar_templates_falha_com_erro_de_sintaxe(monkeypatch):
+    from jinja2 import TemplateSyntaxError
+    monkeypatch.setitem(quiz.TEMPLATES, 'quebrado.html', '{% if %}')
+    with pytest.raises(TemplateSyntaxError):
+        quiz.verificar_templates()
+
 def test_index_route(client):
     response = client.get('/')
     assert response.status_code == 200
@@ -62,5 +312,715 @@ def test_api_plan(client):
     assert 'metas' in result
     assert 'plano' in result
 
+RESPOSTAS_VALIDAS = {
+    'nome': 'Ana',
+    'sexo': 'feminino',
+    'peso': 60,
+    'altura': 165,
+    'idade': 30,
+    'atividade': 'iniciante',
+    'objetivo': 'emagrecer',
+    'alimentos': {'cafe': ['Pão integral'], 'almoco': ['Arroz com feijão']}
+}
+
+def test_api_plan_batch(client):
+    lote = [RESPOSTAS_VALIDAS, {'nome': 'Sem dados'}, dict(RESPOSTAS_VALIDAS, objetivo='voar'), RESPOSTAS_VALIDAS]
+    response = client.post('/api/plan/batch', json=lote)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['total'] == 4
+    assert result['erros'] == 2
+    resultados = result['resultados']
+    assert resultados[0] == resultados[3]
+    assert resultados[0]['metas'] == calcular_alvo_kcal(RESPOSTAS_VALIDAS)
+    assert resultados[1]['error'].startswith('Campos ausentes')
+    assert 'error' in resultados[2]
+
+def test_api_plan_batch_ndjson(client):
+    corpo = json.dumps(RESPOSTAS_VALIDAS) + '\n{invalido\n\n' + json.dumps(RESPOSTAS_VALIDAS) + '\n'
+    response = client.post('/api/plan/batch', data=corpo, content_type='application/x-ndjson')
+    resultados = response.get_json()['resultados']
+    assert len(resultados) == 3
+    assert 'plano' in resultados[0] and 'plano' in resultados[2]
+    assert resultados[1] == {'error': 'JSON inválido'}
+
+def test_api_plan_batch_rejeita_objeto(client):
+    response = client.post('/api/plan/batch', json=RESPOSTAS_VALIDAS)
+    assert response.status_code == 400
+
+@pytest.fixture(params=['memory', 'sqlite', 'file'])
+def session_store(request, tmp_path):
+    from sessoes import criar_session_store
+    urls = {'memory': 'memory://', 'sqlite': f'sqlite:///{tmp_path}/sessoes.db', 'file': f'file://{tmp_path}/sessoes'}
+    return lambda ttl=60: criar_session_store(urls[request.param], ttl)
+
+def test_session_store_grava_le_e_remove(session_store):
+    store = session_store()
+    assert store.get('inexistente') is None
+    store.set('abc123', {'respostas': {'nome': 'Ana'}})
+    assert store.get('abc123') == {'respostas': {'nome': 'Ana'}}
+    store.delete('abc123')
+    assert store.get('abc123') is None
+
+def test_session_store_expira_e_limpa(session_store):
+    import time
+    store = session_store(ttl=0.05)
+    store.set('velha', {'x': 1})
+    store.set('outra', {'x': 2})
+    time.sleep(0.1)
+    assert store.get('velha') is None
+    assert store.limpar_expirados() >= 1
+    assert store.limpar_expirados() == 0
+
+def test_limpeza_de_sessoes_uma_thread_por_processo(tmp_path):
+    from sessoes import FileSessionStore
+    store = FileSessionStore(str(tmp_path), ttl=0.01)
+    thread = store.iniciar_limpeza(0.02)
+    assert store.iniciar_limpeza(0.02) is thread
+    leitura, escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # O filho do fork não herda a thread do pai: a chamada sobe outra
+        novo = store.iniciar_limpeza(0.02)
+        os.write(escrita, b'1' if novo is not thread and novo.is_alive() else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(leitura, 1) == b'1'
+    store.set('velha', {'x': 1})
+    for _ in range(100):
+        if not list(tmp_path.rglob('*.json')):
+            break
+        time.sleep(0.01)
+    assert not list(tmp_path.rglob('*.json'))
+    store.parar_limpeza()
+
+def test_sqlite_session_store_nao_usa_conexao_herdada_do_fork(tmp_path):
+    from sessoes import SQLiteSessionStore
+    store = SQLiteSessionStore(str(tmp_path / 'sessoes.db'))
+    store.set('pai', {'x': 1})
+    conexao_do_pai = store._conexao()
+    leitura, escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            store.set('filho', {'x': 2})
+            os.write(escrita, b'1' if store._conexao() is not conexao_do_pai else b'0')
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(leitura, 1) == b'1'
+    assert store.get('filho') == {'x': 2} and store.get('pai') == {'x': 1}
+
+def test_criar_session_store_caminhos_relativos_e_absolutos(tmp_path, monkeypatch):
+    from sessoes import SessionStore, criar_session_store
+    monkeypatch.chdir(tmp_path)
+    assert criar_session_store('sqlite:///data/sessoes.db').path == 'data/sessoes.db'
+    assert (tmp_path / 'data' / 'sessoes.db').exists()
+    assert criar_session_store(f'sqlite:///{tmp_path}/abs.db').path == f'{tmp_path}/abs.db'
+    assert criar_session_store('file://sessoes').base_dir == 'sessoes'
+    assert criar_session_store(f'file://{tmp_path}/arquivos').base_dir == f'{tmp_path}/arquivos'
+    from fila_pdf import PdfJobQueue
+    for interface in (SessionStore, PdfJobQueue):
+        with pytest.raises(TypeError):
+            interface()
+
+def test_file_session_store_limpa_so_os_proprios_arquivos(tmp_path):
+    from sessoes import FileSessionStore
+    store = FileSessionStore(str(tmp_path), ttl=0.01)
+    store.set('abc123', {'x': 1})
+    alheios = [tmp_path / 'important.txt', tmp_path / 'sub' / 'other.db', tmp_path / 'ab' / 'notas.txt',
+               tmp_path / 'xy' / 'abc999.json']  # shard errado para o id
+    for caminho in alheios:
+        caminho.parent.mkdir(exist_ok=True)
+        caminho.write_text('x')
+    orfao = tmp_path / 'ab' / 'abc123.json.1.2.tmp'
+    orfao.write_text('{}')
+    antigo = time.time() - 7200
+    for caminho in [*alheios, orfao, tmp_path / 'ab' / 'abc123.json']:
+        os.utime(caminho, (antigo, antigo))
+    assert store.limpar_expirados() == 2
+    assert all(caminho.exists() for caminho in alheios)
+    assert not orfao.exists() and store.get('abc123') is None
+
+def test_file_session_store_rejeita_id_com_caminho(tmp_path):
+    from sessoes import FileSessionStore
+    store = FileSessionStore(str(tmp_path))
+    assert store.get('../../etc/passwd') is None
+    with pytest.raises(ValueError):
+        store.set('../fora', {})
+
+def test_fluxo_de_sessao(client, monkeypatch):
+    monkeypatch.setattr(quiz, 'salvar_lead', lambda respostas: None)
+    response = client.post('/api/save-session', json={'respostas': RESPOSTAS_VALIDAS})
+    session_id = response.get_json()['session_id']
+    assert quiz.session_store.get(session_id)['respostas'] == RESPOSTAS_VALIDAS
+    assert client.get(f'/resultados/{session_id}').status_code == 200
+    assert client.get(f'/final-plan/{session_id}').status_code == 200
+    assert client.get('/final-plan/nao-existe').status_code == 404
+
+@pytest.fixture
+def memoria(monkeypatch):
+    """Sessões em memória e sem gravar leads durante o teste."""
+    from sessoes import MemorySessionStore
+    monkeypatch.setattr(quiz, 'session_store', MemorySessionStore())
+    monkeypatch.setattr(quiz, 'salvar_lead', lambda respostas: None)
+
+def test_gerar_plano_por_sessao(client, memoria):
+    response = client.post('/gerar-plano', json=RESPOSTAS_VALIDAS)
+    session_id = response.get_json()['session_id']
+    assert client.get(f'/plano-completo/{session_id}').status_code == 200
+    assert client.get('/plano-completo').status_code == 200
+    response = client.get(f'/gerar-pdf/{session_id}')
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+    with app.test_client() as outro:
+        assert outro.get('/plano-completo').status_code == 302
+        assert outro.get('/gerar-pdf/current').status_code == 404
+        assert outro.get(f'/plano-completo/{session_id}').status_code == 200
+
+def test_pdf_em_cache_com_etag(client, memoria, monkeypatch):
+    from cache import ByteCache
+    monkeypatch.setattr(quiz, 'pdf_cache', ByteCache())
+    monkeypatch.setattr(quiz, 'pdf_pool', quiz.PdfPool(processos=0))
+    import pdf_plano
+    renderizados = []
+    gerar_pdf = pdf_plano.gerar_pdf
+    monkeypatch.setattr(pdf_plano, 'gerar_pdf', lambda *a: renderizados.append(1) or gerar_pdf(*a))
+
+    ids = [client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id'] for _ in range(2)]
+    primeira = client.get(f'/gerar-pdf/{ids[0]}')
+    segunda = client.get(f'/gerar-pdf/{ids[1]}')
+    assert primeira.data == segunda.data and primeira.headers['ETag'] == segunda.headers['ETag']
+    assert len(renderizados) == 1
+
+    revalidada = client.get(f'/gerar-pdf/{ids[0]}', headers={'If-None-Match': primeira.headers['ETag']})
+    assert revalidada.status_code == 304 and not revalidada.data
+    outro_nome = client.post('/gerar-plano', json=dict(RESPOSTAS_VALIDAS, nome='Bia')).get_json()['session_id']
+    assert client.get(f'/gerar-pdf/{outro_nome}').headers['ETag'] != primeira.headers['ETag']
+
+def _usuarios_concorrentes(url, usuarios):
+    # Roda num processo do pool (fork) ou no próprio teste: cada processo tem
+    # o seu store, apontando para o mesmo armazenamento quando não é memory://
+    from concurrent.futures import ThreadPoolExecutor
+    from sessoes import criar_session_store
+    quiz.session_store = criar_session_store(url)
+    quiz.salvar_lead = lambda respostas: None
+    app.config['TESTING'] = True
+
+    def usuario(i):
+        with app.test_client() as c:
+            respostas = dict(RESPOSTAS_VALIDAS, nome=f'Usuario {i}', peso=40 + i)
+            session_id = c.post('/gerar-plano', json=respostas).get_json()['session_id']
+            html = c.get('/plano-completo').data.decode('utf-8')
+            return session_id, i, f'{40 + i} kg' in html and f'{40 + i + 1} kg' not in html
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(usuario, usuarios))
+
+@pytest.mark.parametrize('tipo', ['memory', 'sqlite', 'file'])
+def test_gerar_plano_isolado_entre_usuarios_concorrentes(tipo, monkeypatch, tmp_path):
+    import multiprocessing
+    from sessoes import criar_session_store
+    monkeypatch.setattr(quiz, 'session_store', quiz.session_store)
+    monkeypatch.setattr(quiz, 'salvar_lead', quiz.salvar_lead)
+    url = {'memory': 'memory://', 'sqlite': f'sqlite:///{tmp_path}/sessoes.db', 'file': f'file://{tmp_path}/sessoes'}[tipo]
+    criar_session_store(url)  # cria o schema antes dos processos disputarem o arquivo
+
+    if tipo == 'memory':
+        resultados = _usuarios_concorrentes(url, range(300))
+    else:
+        # Vários processos gravando no mesmo store, como os workers do gunicorn
+        lotes = [range(i, 300, 4) for i in range(4)]
+        with multiprocessing.get_context('fork').Pool(len(lotes)) as pool:
+            resultados = [r for lote in pool.starmap(_usuarios_concorrentes, [(url, lote) for lote in lotes]) for r in lote]
+    assert len(resultados) == 300 and all(ok for _, _, ok in resultados)
+    assert len({session_id for session_id, _, _ in resultados}) == 300
+
+    store = quiz.session_store if tipo == 'memory' else criar_session_store(url)
+    for session_id, i, _ in resultados:
+        assert store.get(session_id)['respostas']['peso'] == 40 + i
+
+def test_lead_writer_grava_em_lotes_e_drena_ao_fechar(tmp_path):
+    import csv
+    from concurrent.futures import ThreadPoolExecutor
+    from leads import LeadWriter, CsvLeadSink, linha_lead, LEADS_CAMPOS
+
+    path = tmp_path / 'leads.csv'
+    writer = LeadWriter(CsvLeadSink(str(path)), tamanho_lote=50, intervalo=60)
+
+    def enviar(i):
+        writer.enviar(linha_lead(dict(RESPOSTAS_VALIDAS, nome=f'Lead {i}, "aspas"')))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(enviar, range(120)))
+    writer.fechar()
+
+    with open(path, newline='', encoding='utf-8') as f:
+        linhas = list(csv.reader(f))
+    assert linhas[0] == LEADS_CAMPOS
+    assert sorted(l[1] for l in linhas[1:]) == sorted(f'Lead {i}, "aspas"' for i in range(120))
+    with pytest.raises(RuntimeError):
+        writer.enviar(linha_lead(RESPOSTAS_VALIDAS))
+
+def test_lead_writer_grava_por_tempo(tmp_path):
+    from leads import LeadWriter, CsvLeadSink, linha_lead
+    import time
+    path = tmp_path / 'leads.csv'
+    writer = LeadWriter(CsvLeadSink(str(path)), tamanho_lote=1000, intervalo=0.05)
+    writer.enviar(linha_lead(RESPOSTAS_VALIDAS))
+    for _ in range(100):
+        if path.exists() and path.read_text(encoding='utf-8').count('\n') == 2:
+            break
+        time.sleep(0.01)
+    assert path.read_text(encoding='utf-8').count('\n') == 2
+    writer.fechar()
+
+def test_lead_writer_sobe_a_thread_em_cada_processo(tmp_path):
+    # gunicorn --preload: o writer é criado no mestre e usado nos filhos do fork
+    from leads import LeadWriter, CsvLeadSink, linha_lead
+    path = tmp_path / 'leads.csv'
+    writer = LeadWriter(CsvLeadSink(str(path)), tamanho_lote=1000, intervalo=60)
+    assert writer._thread is None
+    pid = os.fork()
+    if pid == 0:
+        try:
+            writer.enviar(linha_lead(RESPOSTAS_VALIDAS))
+            writer.fechar()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert path.read_text(encoding='utf-8').count('\n') == 2
+    writer.enviar(linha_lead(RESPOSTAS_VALIDAS))
+    writer.fechar()
+    assert path.read_text(encoding='utf-8').count('\n') == 3
+
+def test_sqlite_lead_sink_e_exportacao_csv(tmp_path):
+    import io
+    from leads import LeadWriter, SQLiteLeadSink, linha_lead, iterar_leads_db, exportar_csv, LEADS_CAMPOS
+
+    db = str(tmp_path / 'leads.db')
+    writer = LeadWriter(SQLiteLeadSink(db), tamanho_lote=10)
+    writer.enviar(linha_lead(RESPOSTAS_VALIDAS, timestamp='2025-09-01T10:00:00'))
+    writer.enviar(linha_lead(dict(RESPOSTAS_VALIDAS, objetivo='ganhar', peso=72.5), timestamp='2025-09-03T10:00:00'))
+    writer.fechar()
+
+    saida = io.StringIO()
+    assert exportar_csv(iterar_leads_db(db), saida) == 2
+    linhas = saida.getvalue().splitlines()
+    assert linhas[0] == ','.join(LEADS_CAMPOS)
+    assert linhas[1] == '2025-09-01T10:00:00,Ana,,,emagrecer,iniciante,60,165,30'
+
+    assert [l[4] for l in iterar_leads_db(db, desde='2025-09-02')] == ['ganhar']
+    assert [l[6] for l in iterar_leads_db(db, objetivo='ganhar')] == [72.5]
+
+def test_lead_deduplicator_janela_e_normalizacao():
+    from leads import LeadDeduplicator
+    dedup = LeadDeduplicator(janela=300)
+    lead = dict(RESPOSTAS_VALIDAS, email='Ana@Exemplo.com ', whatsapp='(27) 99999-0000')
+    assert dedup.registrar(lead, agora=1000)
+    assert not dedup.registrar(dict(lead, email='ana@exemplo.com', whatsapp='27999990000', peso='60'), agora=1002)
+    assert dedup.registrar(dict(lead, peso=61), agora=1003)
+    assert dedup.registrar(lead, agora=1400)
+    assert dedup.duplicados == 1
+
+def test_lead_deduplicator_reconstroi_do_csv_e_compartilha_bloom(tmp_path):
+    import datetime
+    from leads import LeadDeduplicator, BloomFilter, CsvLeadSink, linha_lead, ler_cauda_csv
+    agora = datetime.datetime.now()
+    path = str(tmp_path / 'leads.csv')
+    sink = CsvLeadSink(path)
+    sink.gravar([
+        linha_lead(dict(RESPOSTAS_VALIDAS, nome='Antigo'), (agora - datetime.timedelta(hours=2)).isoformat()),
+        linha_lead(RESPOSTAS_VALIDAS, (agora - datetime.timedelta(seconds=30)).isoformat()),
+    ])
+    sink.fechar()
+
+    dedup = LeadDeduplicator(janela=300)
+    assert dedup.carregar(ler_cauda_csv(path)) == 1
+    assert not dedup.registrar(RESPOSTAS_VALIDAS)
+    assert dedup.registrar(dict(RESPOSTAS_VALIDAS, nome='Antigo'))
+
+    bloom_path = str(tmp_path / 'leads.bloom')
+    worker_a = LeadDeduplicator(janela=300, bloom=BloomFilter(1000, path=bloom_path))
+    worker_b = LeadDeduplicator(janela=300, bloom=BloomFilter(1000, path=bloom_path))
+    assert worker_a.registrar(RESPOSTAS_VALIDAS)
+    assert not worker_b.registrar(RESPOSTAS_VALIDAS)
+
+    # Um worker que (re)inicia não apaga o que os outros já marcaram
+    worker_c = LeadDeduplicator(janela=300, bloom=BloomFilter(1000, path=bloom_path))
+    worker_c.carregar([])
+    assert not worker_c.registrar(RESPOSTAS_VALIDAS)
+
+def test_bloom_por_geracoes_nao_satura(tmp_path):
+    from leads import LeadDeduplicator, BloomFilter
+    dedup = LeadDeduplicator(janela=300, bloom=BloomFilter(1000, path=str(tmp_path / 'leads.bloom')))
+    aceitos = sum(
+        dedup.registrar(dict(RESPOSTAS_VALIDAS, email=f'{janela}-{i}@x.com'), agora=janela * 300 + i * 0.5)
+        for janela in range(30) for i in range(500)
+    )
+    assert aceitos == 15000 and dedup.duplicados == 0
+    # Duas janelas depois, a geração antiga já foi reaproveitada
+    assert dedup.registrar(dict(RESPOSTAS_VALIDAS, email='0-0@x.com'), agora=29 * 300 + 260)
+
+def test_salvar_lead_descarta_repetido(monkeypatch):
+    from leads import LeadDeduplicator
+    enviados = []
+    monkeypatch.setattr(quiz, 'deduplicador', LeadDeduplicator(janela=300))
+    monkeypatch.setattr(quiz.lead_writer, 'enviar', enviados.append)
+    quiz.salvar_lead(RESPOSTAS_VALIDAS)
+    quiz.salvar_lead(dict(RESPOSTAS_VALIDAS))
+    assert len(enviados) == 1
+
+def test_analise_leads_agrega_segmentos_e_pedacos(tmp_path):
+    import gzip, shutil
+    import analise_leads
+    from leads import CsvLeadSink, linha_lead
+
+    path = str(tmp_path / 'leads.csv')
+    sink = CsvLeadSink(path)
+    sink.gravar([
+        linha_lead(dict(RESPOSTAS_VALIDAS, objetivo=objetivo, peso=peso), f'2025-09-0{dia}T{hora:02d}:15:00')
+        for dia, hora, objetivo, peso in [(1, 9, 'emagrecer', 90), (1, 9, 'manter', 60), (2, 21, 'emagrecer', 45)]
+    ])
+    sink.fechar()
+    with open(path, 'rb') as origem, gzip.open(str(tmp_path / 'leads.1.csv.gz'), 'wb') as destino:
+        shutil.copyfileobj(origem, destino)
+
+    resultado = analise_leads.analisar([path, str(tmp_path / 'leads.1.csv.gz')])
+    assert resultado['total'] == 6
+    assert resultado['por_objetivo'] == {'emagrecer': 4, 'manter': 2}
+    assert resultado['imc']['categorias'] == {'obeso': 2, 'normal': 2, 'abaixo': 2}
+    assert resultado['hora_do_dia']['09'] == 4
+    assert resultado['por_hora']['2025-09-02T21'] == 2
+
+    assert analise_leads.analisar([path], processos=2, tamanho_pedaco=50) == analise_leads.analisar([path])
+
+def test_rotacao_do_csv_por_tamanho(tmp_path):
+    import json
+    import analise_leads
+    from leads import RotatingCsvLeadSink, caminho_manifest, filtrar_linhas, iterar_linhas, linha_lead, segmentos_leads
+
+    path = str(tmp_path / 'leads.csv')
+    sink = RotatingCsvLeadSink(path, max_bytes=200)
+    for i in range(6):
+        sink.gravar([linha_lead(dict(RESPOSTAS_VALIDAS, nome=f'Ana {i}'), f'2025-09-01T10:0{i}:00')])
+    sink.fechar()
+
+    with open(caminho_manifest(path), encoding='utf-8') as f:
+        segmentos = json.load(f)['segmentos']
+    assert segmentos and all(seg['arquivo'].endswith('.gz') for seg in segmentos)
+    assert sorted(p.name for p in tmp_path.glob('*.csv')) == ['leads.csv']
+
+    linhas = list(iterar_linhas(path))
+    assert [linha[1] for linha in linhas] == [f'Ana {i}' for i in range(6)]
+    with open(path, encoding='utf-8') as f:
+        ativas = len(f.readlines()) - 1
+    assert sum(seg['linhas'] for seg in segmentos) + ativas == 6
+    assert len(list(filtrar_linhas(linhas, desde='2025-09-01T10:03'))) == 3
+    assert analise_leads.analisar(segmentos_leads(path))['total'] == 6
+
+def test_rotacao_interrompida_nao_perde_segmento(tmp_path):
+    import gzip
+    import json
+    from leads import RotatingCsvLeadSink, caminho_manifest, comprimir_segmento, iterar_linhas, linha_lead
+
+    def nomes(path):
+        return [linha[1] for linha in iterar_linhas(path)]
+
+    path = str(tmp_path / 'leads.csv')
+    sink = RotatingCsvLeadSink(path, max_bytes=10 ** 6)
+    sink.gravar([linha_lead(dict(RESPOSTAS_VALIDAS, nome=f'Ana {i}'), f'2025-09-01T10:0{i}:00') for i in range(2)])
+    sink.fechar()
+
+    # Queda depois de comprimir e antes do manifest: o .gz e o original no disco, fora do manifest
+    segmento = str(tmp_path / 'leads-20250901-100000.csv')
+    os.replace(path, segmento)
+    comprimir_segmento(segmento, remover=False)
+    assert nomes(path) == ['Ana 0', 'Ana 1']
+    # ... e sem o original (queda de uma versão que apagava antes do manifest)
+    os.remove(segmento)
+    assert nomes(path) == ['Ana 0', 'Ana 1']
+
+    # A próxima rotação registra o órfão no manifest
+    sink.gravar([linha_lead(dict(RESPOSTAS_VALIDAS, nome='Ana 2'), '2025-09-01T10:02:00')])
+    sink.rotacionar()
+    sink.fechar()
+    with open(caminho_manifest(path), encoding='utf-8') as f:
+        segmentos = json.load(f)['segmentos']
+    assert [seg['arquivo'] for seg in segmentos][0] == 'leads-20250901-100000.csv.gz'
+    assert sum(seg['linhas'] for seg in segmentos) == 3
+    assert nomes(path) == ['Ana 0', 'Ana 1', 'Ana 2']
+
+    # Queda entre o manifest e a remoção: o original que sobrou não é lido duas vezes
+    with gzip.open(segmento + '.gz', 'rb') as origem, open(segmento, 'wb') as f:
+        f.write(origem.read())
+    assert nomes(path) == ['Ana 0', 'Ana 1', 'Ana 2']
+    sink.gravar([linha_lead(dict(RESPOSTAS_VALIDAS, nome='Ana 3'), '2025-09-01T10:03:00')])
+    sink.rotacionar()
+    sink.fechar()
+    assert not os.path.exists(segmento)
+    assert nomes(path) == ['Ana 0', 'Ana 1', 'Ana 2', 'Ana 3']
+
+def test_pdf_pool_renderiza_em_processo_e_recusa_quando_cheio(client, memoria, monkeypatch):
+    from cache import ByteCache
+    monkeypatch.setattr(quiz, 'pdf_cache', ByteCache(max_bytes=0))
+    pool = quiz.PdfPool(processos=1, max_fila=0)
+    monkeypatch.setattr(quiz, 'pdf_pool', pool)
+    session_id = client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id']
+    try:
+        assert client.get(f'/gerar-pdf/{session_id}').data.startswith(b'%PDF')
+        assert pool.info()['renderizados'] == 1 and pool.info()['em_andamento'] == 0
+
+        assert pool._vagas.acquire(blocking=False)  # ocupa a única vaga
+        response = client.get(f'/gerar-pdf/{session_id}')
+        pool._vagas.release()
+        assert response.status_code == 503 and response.headers['Retry-After']
+        assert client.get('/api/metrics').get_json()['pdf_pool']['recusados'] == 1
+    finally:
+        pool.fechar()
+
+@pytest.fixture
+def fila_pdf(request, monkeypatch):
+    from cache import ByteCache
+    from fila_pdf import PdfJobWorker, criar_fila_pdf
+    url = getattr(request, 'param', 'memory://')
+    if url.startswith('fakeredis'):
+        pytest.importorskip('fakeredis')
+    pdfs = ByteCache()
+    fila = criar_fila_pdf(url, max_fila=2, pdfs=pdfs)
+    if url.startswith('fakeredis'):
+        fila.redis.flushall()
+    monkeypatch.setattr(quiz, 'pdf_cache', pdfs)
+    monkeypatch.setattr(quiz, 'fila_pdf', fila)
+    worker = PdfJobWorker(fila, quiz.PdfPool(processos=0).renderizar)
+    yield fila, worker
+    worker.parar()
+
+@pytest.mark.parametrize('fila_pdf', ['memory://', 'fakeredis://'], indirect=True)
+def test_job_de_pdf_assincrono(client, memoria, fila_pdf):
+    fila, worker = fila_pdf
+    session_id = client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id']
+    response = client.post(f'/api/pdf/{session_id}')
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['estado'] == 'na_fila' and response.headers['Location'] == job['status_url']
+    assert client.get(f"/api/pdf/jobs/{job['job_id']}/download").status_code == 409
+
+    worker.processar(*fila.proximo(timeout=0))
+    status = client.get(job['status_url']).get_json()
+    assert status['estado'] == 'pronto'
+    download = client.get(status['download_url'])
+    assert download.data.startswith(b'%PDF') and download.headers['ETag']
+    # Mesma chave do /gerar-pdf (os bytes só coincidem quando a fila usa o pdf_cache)
+    assert client.get(f'/gerar-pdf/{session_id}').headers['ETag'] == download.headers['ETag']
+
+    # Mesmo conteúdo: o segundo job já nasce pronto, sem passar pela fila
+    assert client.post(f'/api/pdf/{session_id}').get_json()['estado'] == 'pronto'
+    assert fila.tamanho() == 0
+    assert client.get('/api/pdf/jobs/inexistente').status_code == 404
+    assert client.post('/api/pdf/inexistente').status_code == 404
+
+def test_job_de_pdf_com_erro_sempre_tem_mensagem(client, memoria, fila_pdf):
+    from concurrent.futures import TimeoutError as FuturoTimeout
+    fila, worker = fila_pdf
+    incompleta = dict(RESPOSTAS_VALIDAS)
+    del incompleta['objetivo']
+    session_id = client.post('/gerar-plano', json=incompleta).get_json()['session_id']
+    response = client.post(f'/api/pdf/{session_id}')
+    assert response.status_code == 400 and 'objetivo' in response.get_json()['error']
+
+    def expira(plano, respostas, metas):
+        raise FuturoTimeout()
+    worker.renderizar = expira
+    session_id = client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id']
+    job = client.post(f'/api/pdf/{session_id}').get_json()
+    worker.processar(*fila.proximo(timeout=0))
+    status = client.get(job['status_url']).get_json()
+    assert status['estado'] == 'erro' and status['erro'] == 'TimeoutError'
+
+def test_job_de_pdf_fila_cheia_e_worker_em_thread(client, memoria, fila_pdf):
+    fila, worker = fila_pdf
+    ids = [client.post('/gerar-plano', json=dict(RESPOSTAS_VALIDAS, nome=f'Ana {i}')).get_json()['session_id'] for i in range(3)]
+    jobs = [client.post(f'/api/pdf/{session_id}') for session_id in ids]
+    assert [r.status_code for r in jobs] == [202, 202, 503]
+    assert jobs[2].headers['Retry-After']
+
+    threads = worker.iniciar()
+    assert worker.iniciar() is threads  # uma vez por processo
+    for job in jobs[:2]:
+        for _ in range(200):
+            if client.get(job.get_json()['status_url']).get_json()['estado'] == 'pronto':
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail('job não terminou')
+
+@pytest.mark.parametrize('processos', [0, 2])
+def test_pdf_pool_aquecimento(processos):
+    import pdf_plano
+    pool = quiz.PdfPool(processos=processos, aquecer=True)
+    try:
+        relatorios = pool.iniciar()
+        assert len(relatorios) == max(processos, 1)
+        assert all(r['render_ms'] > 0 and r['total_ms'] >= r['render_ms'] for r in relatorios)
+        assert len({r['pid'] for r in relatorios}) == len(relatorios)
+        assert pool.info()['aquecimento'] == relatorios
+        assert pool.renderizar(pdf_plano.PLANO_AQUECIMENTO, pdf_plano.RESPOSTAS_AQUECIMENTO, {"alvo": 2000}).startswith(b'%PDF')
+    finally:
+        pool.fechar()
+
+def test_pdf_pool_herdado_do_fork_monta_o_proprio_executor():
+    # gunicorn --preload com PDF_WARMUP: o pool aquecido no mestre chega aos
+    # workers sem a thread que gerencia o executor
+    import pdf_plano
+    pool = quiz.PdfPool(processos=1, max_fila=0, aquecer=True)
+    try:
+        relatorios = pool.iniciar()
+        leitura, escrita = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                pdf = pool.renderizar(pdf_plano.PLANO_AQUECIMENTO, pdf_plano.RESPOSTAS_AQUECIMENTO, {"alvo": 2000}, timeout=20)
+                info = pool.info()
+                ok = (pdf.startswith(b'%PDF') and info['em_andamento'] == 0
+                      and [r['pid'] for r in info['aquecimento']] != [r['pid'] for r in relatorios])
+                pool._executor.shutdown()
+                os.write(escrita, b'1' if ok else b'0')
+            finally:
+                os._exit(0)
+        for _ in range(600):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            pytest.fail('o filho travou no executor herdado')
+        assert os.read(leitura, 1) == b'1'
+        assert pool.renderizar(pdf_plano.PLANO_AQUECIMENTO, pdf_plano.RESPOSTAS_AQUECIMENTO, {"alvo": 2000}).startswith(b'%PDF')
+    finally:
+        pool.fechar()
+
+def test_quiz_importa_sem_reportlab_nem_numpy():
+    import tempo_import
+    resultado = tempo_import.medir('quiz')
+    assert resultado['total_ms'] > 0 and 'flask' in resultado['pacotes']
+    assert not any(nome.split('.')[0] in ('reportlab', 'numpy') for nome in resultado['importados'])
+    assert 'reportlab' in tempo_import.medir('pdf_plano')['pacotes']
+
+def test_exportar_pdfs_zip_com_erros_e_retomada(tmp_path):
+    import io, zipfile
+    from cache import ByteCache
+    import exportar_pdfs
+
+    dados = quiz.dados_pdf(RESPOSTAS_VALIDAS)
+    carregar = {'a': dados, 'c': quiz.dados_pdf(dict(RESPOSTAS_VALIDAS, nome='Bia'))}.get
+    progresso = []
+    cache = ByteCache(max_bytes=0, diretorio=str(tmp_path))
+    pedacos = list(exportar_pdfs.gerar_zip(['a', 'b', 'c', 'a'], carregar, 2, cache, lambda *p: progresso.append(p)))
+    assert len(pedacos) == 3 and all(pedacos)  # um por PDF + diretório central
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(pedacos))) as zf:
+        assert zf.namelist() == ['a.pdf', 'c.pdf', 'erros.json']
+        assert zf.read('a.pdf').startswith(b'%PDF')
+        assert 'b' in json.loads(zf.read('erros.json'))
+    assert [p[:2] for p in progresso] == [(1, 3), (2, 3), (3, 3)] and progresso[1][3]
+
+    # Segunda rodada (retomada): os PDFs já renderizados vêm do cache em disco
+    cache = ByteCache(max_bytes=0, diretorio=str(tmp_path))
+    b''.join(exportar_pdfs.gerar_zip(['a', 'c'], carregar, 1, cache))
+    assert cache.info()['hits_disco'] == 2 and cache.info()['misses'] == 0
+
+    assert exportar_pdfs.ler_ids(['x\n', '\n', 'y']) == ['x', 'y']
+    assert exportar_pdfs.ler_ids(['nome,session_id', 'Ana,x', 'Bia,']) == ['x']
+
+def test_exportar_pdfs_endpoint_admin(client, memoria, monkeypatch, tmp_path):
+    import io, zipfile
+    from cache import ByteCache
+    from sessoes import FileSessionStore
+    monkeypatch.setattr(quiz, 'pdf_cache', ByteCache())
+    monkeypatch.setattr(quiz, 'session_store', FileSessionStore(str(tmp_path)))
+    ids = [client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id'] for _ in range(2)]
+    assert client.post('/api/admin/exportar-pdfs', json={"session_ids": ids}).status_code == 403
+
+    monkeypatch.setattr(quiz, 'ADMIN_TOKEN', 'segredo')
+    auth = {'Authorization': 'Bearer segredo'}
+    assert client.post('/api/admin/exportar-pdfs', json={"session_ids": ids}, headers={'Authorization': 'Bearer x'}).status_code == 403
+    response = client.post('/api/admin/exportar-pdfs', data='\n'.join(ids), headers=auth)
+    assert response.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        assert sorted(zf.namelist()) == sorted(f'{i}.pdf' for i in ids)
+    estado = client.get(f"/api/admin/exportar-pdfs/{response.headers['X-Exportacao-Id']}", headers=auth).get_json()
+    assert estado == {"feitos": 2, "total": 2, "erros": {}, "concluido": True}
+    # Outro worker (outro store sobre o mesmo diretório) vê o mesmo progresso
+    monkeypatch.setattr(quiz, 'session_store', FileSessionStore(str(tmp_path)))
+    assert client.get(f"/api/admin/exportar-pdfs/{response.headers['X-Exportacao-Id']}", headers=auth).get_json() == estado
+    assert client.get('/api/admin/exportar-pdfs/..', headers=auth).status_code == 404
+
+    # Uma exportação por vez: a vaga só volta quando a resposta é fechada
+    ocupado = client.post('/api/admin/exportar-pdfs', json={"session_ids": ids}, headers=auth)
+    assert ocupado.status_code == 503 and ocupado.headers['Retry-After']
+    response.close()
+    with client.post('/api/admin/exportar-pdfs', json={"session_ids": ids}, headers=auth) as response:
+        assert response.status_code == 200
+
+def test_pdf_renderizado_no_disco_e_enviado_em_blocos(client, memoria, monkeypatch, tmp_path):
+    from cache import ByteCache
+    cache = ByteCache(diretorio=str(tmp_path))
+    pool = quiz.PdfPool(processos=1)
+    monkeypatch.setattr(quiz, 'pdf_cache', cache)
+    monkeypatch.setattr(quiz, 'pdf_pool', pool)
+    session_id = client.post('/gerar-plano', json=RESPOSTAS_VALIDAS).get_json()['session_id']
+    try:
+        response = client.get(f'/gerar-pdf/{session_id}')
+        chave = response.headers['ETag'].strip('"')
+        assert response.is_streamed and response.get_data().startswith(b'%PDF')
+        assert open(cache.caminho(chave), 'rb').read() == response.get_data()
+        assert len(cache) == 0  # o worker web não guardou o PDF na memória
+
+        parcial = client.get(f'/gerar-pdf/{session_id}', headers={'Range': 'bytes=0-3'})
+        assert parcial.status_code == 206 and parcial.get_data() == b'%PDF'
+        assert pool.info()['renderizados'] == 1 and cache.info()['hits_disco'] == 1
+        assert cache.info()['misses'] == 1
+    finally:
+        pool.fechar()
+
+def _renderizar_lento(plano, respostas, metas):
+    # Substitui pdf_plano.renderizar nos processos do pool (herdado pelo fork)
+    time.sleep(0.5)
+    return b'%PDF lento', 0.5
+
+def test_pdf_pool_recria_pool_quebrado():
+    import pdf_plano
+    pool = quiz.PdfPool(processos=1)
+    args = (pdf_plano.PLANO_AQUECIMENTO, pdf_plano.RESPOSTAS_AQUECIMENTO, {"alvo": 2000})
+    try:
+        assert pool.renderizar(*args).startswith(b'%PDF')
+        antigo = pool._executor
+        for processo in list(antigo._processes.values()):
+            processo.kill()
+            processo.join()
+        assert pool.renderizar(*args).startswith(b'%PDF')
+        assert pool.renderizar(*args).startswith(b'%PDF')
+        assert pool._executor is not antigo and pool.info()['em_andamento'] == 0
+    finally:
+        pool.fechar()
+
+def test_pdf_pool_timeout_mantem_a_vaga_ate_o_fim(monkeypatch):
+    import pdf_plano
+    monkeypatch.setattr(pdf_plano, 'renderizar', _renderizar_lento)
+    pool = quiz.PdfPool(processos=1, max_fila=0)
+    try:
+        with pytest.raises(quiz.FuturoTimeout):
+            pool.renderizar({}, {}, {}, timeout=0.05)
+        with pytest.raises(quiz.PdfPoolSaturado):
+            pool.renderizar({}, {}, {})
+        assert pool.info()['em_andamento'] == 1
+        time.sleep(0.7)
+        assert pool.renderizar({}, {}, {}) == b'%PDF lento'
+    finally:
+        pool.fechar()
+
 if __name__ == '__main__':
     pytest.main([__file__])
\ No newline at end of file